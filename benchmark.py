@@ -0,0 +1,543 @@
+import argparse
+import bisect
+import concurrent.futures
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Generator, List, Tuple, Union
+from database import Database
+from engine import Engine
+
+
+
+#######################   data start   #########################
+
+
+def key_sampler(key_cardinality: int, skew: float, rng: random.Random) -> Callable:
+    '''
+    Create a function that draws keys from 1 to key_cardinality, following a Zipf distribution with the given skew.
+
+    Args:
+        key_cardinality: int, the number of distinct keys.
+        skew: float, the Zipf exponent, 0 for uniform keys; the larger it is, the more often the first keys are drawn.
+        rng: random.Random, the random number generator.
+
+    Returns:
+        sample: Callable, which takes no arguments and returns a key.
+    '''
+    if skew == 0:
+        return lambda: rng.randint(1, key_cardinality)
+    cumulative_weights = list(itertools.accumulate(1 / key ** skew for key in range(1, key_cardinality + 1)))
+    total = cumulative_weights[-1]
+    return lambda: bisect.bisect_left(cumulative_weights, rng.random() * total) + 1
+
+
+def generate_attributes(rows: int, key_cardinality: int, skew: float, seed: int) -> Generator:
+    '''
+    Generate records of the Attribute table of the iris schema, with measurements around the ones of the iris data set.
+
+    Args:
+        rows: int, the number of records.
+        key_cardinality: int, the number of distinct values of Attribute.id.
+        skew: float, the skew of Attribute.id (see key_sampler).
+        seed: int, the random seed.
+
+    Returns:
+        table_out: Generator, which generate the records.
+    '''
+    rng = random.Random(seed)
+    sample = key_sampler(key_cardinality, skew, rng)
+    for _ in range(rows):
+        yield {
+            'Attribute.id': sample(),
+            'Attribute.sepalLengthCm': round(rng.gauss(5.8, 0.8), 1),
+            'Attribute.sepalWidthCm': round(rng.gauss(3.1, 0.4), 1),
+            'Attribute.petalLengthCm': round(rng.gauss(3.8, 1.8), 1),
+            'Attribute.petalWidthCm': round(rng.gauss(1.2, 0.8), 1),
+        }
+
+
+def generate_kinds(key_cardinality: int, species: int) -> Generator:
+    '''
+    Generate records of the Kind table of the iris schema, one per Kind.id from 1 to key_cardinality.
+
+    Args:
+        key_cardinality: int, the number of records.
+        species: int, the number of distinct values of Kind.species.
+
+    Returns:
+        table_out: Generator, which generate the records.
+    '''
+    names = ['Iris-setosa', 'Iris-versicolor', 'Iris-virginica']
+    names += [f'Iris-{i}' for i in range(len(names), species)]
+    for key in range(1, key_cardinality + 1):
+        yield {'Kind.id': key, 'Kind.species': names[key % species]}
+
+
+def generate_database(database_name: str, rows: int, key_cardinality: int, skew: float, species: int, seed: int) -> None:
+    '''
+    Create a database with scaled versions of the Attribute and Kind tables of the iris database, replacing it if it exists.
+
+    Args:
+        database_name: str, the database.
+        rows: int, the number of records of Attribute.
+        key_cardinality: int, the number of records of Kind, which is also the number of distinct values of Attribute.id.
+        skew: float, the skew of Attribute.id (see key_sampler).
+        species: int, the number of distinct values of Kind.species.
+        seed: int, the random seed.
+
+    Returns:
+        None.
+    '''
+    if os.path.exists(os.path.join('databases', database_name)):
+        shutil.rmtree(os.path.join('databases', database_name))
+    Engine().create_database(database_name)
+    database = Database(database_name)
+    database.create_table('Attribute', {'Attribute.id': 'int', 'Attribute.sepalLengthCm': 'float', 'Attribute.sepalWidthCm': 'float', 'Attribute.petalLengthCm': 'float', 'Attribute.petalWidthCm': 'float'})
+    database.create_table('Kind', {'Kind.id': 'int', 'Kind.species': 'str'})
+    database.bulk_insert('Attribute', generate_attributes(rows, key_cardinality, skew, seed))
+    database.bulk_insert('Kind', generate_kinds(key_cardinality, species))
+
+
+#######################   data end   #########################
+
+
+
+#######################   benchmark start   #########################
+
+
+def benchmark_select(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Select the records of Attribute with Attribute.sepalLengthCm > 5.8.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    table = database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl'))
+    rows_out = sum(1 for _ in database.select(table, [engine.parser_condition('Attribute.sepalLengthCm > 5.8')]))
+    return options['rows'], rows_out
+
+
+def benchmark_project(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Project Attribute on Attribute.id and Attribute.petalWidthCm.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    table = database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl'))
+    rows_out = sum(1 for _ in database.project(table, ['Attribute.id', 'Attribute.petalWidthCm']))
+    return options['rows'], rows_out
+
+
+def benchmark_cross_product(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Cross the first join_sample records of Attribute with the first join_sample records of Kind.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of pairs of records compared and the number of records generated.
+    '''
+    table_left = database.limit(database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl')), options['join_sample'])
+    table_right = database.limit(database.read_table(os.path.join('databases', database.database_name, 'Kind.jsonl')), options['join_sample'])
+    rows_out = sum(1 for _ in database.cross_product(table_left, table_right))
+    return min(options['rows'], options['join_sample']) * min(options['key_cardinality'], options['join_sample']), rows_out
+
+
+def benchmark_theta_inner_join(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Join the first join_sample records of Attribute and of Kind on Attribute.id < Kind.id (a block nested-loop join).
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of pairs of records compared and the number of records generated.
+    '''
+    table_left = database.limit(database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl')), options['join_sample'])
+    table_right = database.limit(database.read_table(os.path.join('databases', database.database_name, 'Kind.jsonl')), options['join_sample'])
+    rows_out = sum(1 for _ in database.theta_inner_join(table_left, table_right, [engine.parser_condition('Attribute.id < Kind.id')]))
+    return min(options['rows'], options['join_sample']) * min(options['key_cardinality'], options['join_sample']), rows_out
+
+
+def benchmark_hash_inner_join(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Join Attribute and Kind on Attribute.id == Kind.id with a hash join.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    table_left = database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl'))
+    table_right = database.read_table(os.path.join('databases', database.database_name, 'Kind.jsonl'))
+    rows_out = sum(1 for _ in database.hash_inner_join(table_left, table_right, 'Attribute.id', 'Kind.id', []))
+    return options['rows'] + options['key_cardinality'], rows_out
+
+
+def benchmark_sort_merge_join(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Join Attribute and Kind on Attribute.id == Kind.id with a sort-merge join.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    table_left = database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl'))
+    table_right = database.read_table(os.path.join('databases', database.database_name, 'Kind.jsonl'))
+    rows_out = sum(1 for _ in database.sort_merge_join(table_left, table_right, 'Attribute.id', 'Kind.id', []))
+    return options['rows'] + options['key_cardinality'], rows_out
+
+
+def benchmark_group_by_and_aggregate(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Group Attribute by Attribute.id, with an avg, a count_distinct and a percentile_50.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    table = database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl'))
+    rows_out = sum(1 for _ in database.group_by_and_aggregate(table, ['Attribute.id'], {'Attribute.sepalLengthCm': 'avg', 'Attribute.petalWidthCm': 'count_distinct', 'Attribute.petalLengthCm': 'percentile_50'}))
+    return options['rows'], rows_out
+
+
+def benchmark_sort_merge(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Sort Attribute by Attribute.sepalLengthCm.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    table = database.read_table(os.path.join('databases', database.database_name, 'Attribute.jsonl'))
+    rows_out = sum(1 for _ in database.sort_merge(table, 'Attribute.sepalLengthCm', True))
+    return options['rows'], rows_out
+
+
+def benchmark_insert_record(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Insert mutations generated records into Attribute one by one.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    for record in generate_attributes(options['mutations'], options['key_cardinality'], options['skew'], options['seed'] + 1):
+        database.insert_record('Attribute', record)
+    return options['mutations'], options['mutations']
+
+
+def benchmark_bulk_insert(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Insert rows generated records into Attribute at once.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    rows_out = database.bulk_insert('Attribute', generate_attributes(options['rows'], options['key_cardinality'], options['skew'], options['seed'] + 1))
+    return options['rows'], rows_out
+
+
+def benchmark_update_record(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Run statements updates of the records of Attribute with a random Attribute.id.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    rng = random.Random(options['seed'])
+    for _ in range(options['statements']):
+        database.update_record('Attribute', {'Attribute.petalWidthCm': 0.0}, [engine.parser_condition(f"Attribute.id == {rng.randint(1, options['key_cardinality'])}")])
+    return options['rows'] * options['statements'], options['statements']
+
+
+def benchmark_delete_record(database: Database, engine: Engine, options: Dict) -> Tuple[int, int]:
+    '''
+    Run statements deletes of the records of Attribute with a random Attribute.id.
+
+    Args:
+        database: Database, the copy of the generated database.
+        engine: Engine, which parses conditions.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        rows_in, rows_out: Tuple[int, int], the number of records read and the number of records generated (or statements run).
+    '''
+    rng = random.Random(options['seed'])
+    for _ in range(options['statements']):
+        database.delete_record('Attribute', [engine.parser_condition(f"Attribute.id == {rng.randint(1, options['key_cardinality'])}")])
+    return options['rows'] * options['statements'], options['statements']
+
+
+benchmark_name_function_pairs = {
+    'select': benchmark_select,
+    'project': benchmark_project,
+    'cross_product': benchmark_cross_product,
+    'theta_inner_join': benchmark_theta_inner_join,
+    'hash_inner_join': benchmark_hash_inner_join,
+    'sort_merge_join': benchmark_sort_merge_join,
+    'group_by_and_aggregate': benchmark_group_by_and_aggregate,
+    'sort_merge': benchmark_sort_merge,
+    'insert_record': benchmark_insert_record,
+    'bulk_insert': benchmark_bulk_insert,
+    'update_record': benchmark_update_record,
+    'delete_record': benchmark_delete_record,
+}
+
+
+def watch_temp_files(stop: threading.Event, usage: Dict[str, int], interval: float = 0.005) -> None:
+    '''
+    Sample the temp files under tmp/ until stop is set, recording the peak of their total size and how many were created.
+
+    Args:
+        stop: threading.Event, which is set when the benchmark is done.
+        usage: Dict[str, int], where "peak_temp_bytes" and "temp_files" are recorded.
+        interval: float = 0.005, the seconds between samples.
+
+    Returns:
+        None.
+    '''
+    names = set(os.listdir('tmp'))
+    seen = set()
+    while True:
+        size = 0
+        for entry in os.scandir('tmp'):
+            if entry.name in names:
+                continue
+            seen.add(entry.name)
+            try:
+                size += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        usage['peak_temp_bytes'] = max(usage['peak_temp_bytes'], size)
+        usage['temp_files'] = len(seen)
+        if stop.wait(interval):
+            return
+
+
+def run_benchmark(name: str, database_name: str, options: Dict) -> Dict[str, Union[str, int, float]]:
+    '''
+    Run a benchmark on a fresh copy of the database, in a process of its own so that its peak RSS is its own.
+
+    Args:
+        name: str, the benchmark, a key of benchmark_name_function_pairs.
+        database_name: str, the generated database.
+        options: Dict, the parameters of the benchmarks (see the arguments of the command line).
+
+    Returns:
+        result: Dict[str, Union[str, int, float]], the rows read (pairs compared for joins without an equality) and generated, seconds, throughput (rows_in per second),
+            peak RSS of the process, and peak size and number of the temp files.
+    '''
+    copy_name = f'{database_name}_{name}'
+    if os.path.exists(os.path.join('databases', copy_name)):
+        shutil.rmtree(os.path.join('databases', copy_name))
+    shutil.copytree(os.path.join('databases', database_name), os.path.join('databases', copy_name))
+    try:
+        database = Database(copy_name, memory_budget=options['memory_budget'], workers=options['workers'], temp_codec=options['temp_codec'])
+        engine = Engine()
+        usage = {'peak_temp_bytes': 0, 'temp_files': 0}
+        stop = threading.Event()
+        watcher = threading.Thread(target=watch_temp_files, args=(stop, usage))
+        watcher.start()
+        start = time.perf_counter()
+        try:
+            rows_in, rows_out = benchmark_name_function_pairs[name](database, engine, options)
+        finally:
+            seconds = time.perf_counter() - start
+            stop.set()
+            watcher.join()
+            database.close_pool()
+    finally:
+        shutil.rmtree(os.path.join('databases', copy_name))
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'benchmark': name,
+        'rows_in': rows_in,
+        'rows_out': rows_out,
+        'seconds': round(seconds, 6),
+        'rows_per_second': round(rows_in / seconds, 1) if seconds else None,
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        'peak_rss_bytes': peak_rss if sys.platform == 'darwin' else peak_rss * 1024,
+        'peak_temp_bytes': usage['peak_temp_bytes'],
+        'temp_files': usage['temp_files'],
+    }
+
+
+def run_benchmarks(names: List[str], database_name: str, options: Dict) -> List[Dict[str, Union[str, int, float]]]:
+    '''
+    Run benchmarks one after another, each in a new process.
+
+    Args:
+        names: List[str], the benchmarks.
+        database_name: str, the generated database.
+        options: Dict, the parameters of the benchmarks.
+
+    Returns:
+        results: List[Dict[str, Union[str, int, float]]], one result per benchmark (see run_benchmark).
+    '''
+    results = []
+    for name in names:
+        with concurrent.futures.ProcessPoolExecutor(1) as pool:
+            results.append(pool.submit(run_benchmark, name, database_name, options).result())
+    return results
+
+
+def time_function(function: Callable) -> float:
+    '''
+    Time a function that runs a benchmark.
+
+    Args:
+        function: Callable, which takes no arguments.
+
+    Returns:
+        seconds: float, the wall-clock time of the call in seconds.
+    '''
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def benchmark_codecs(database_name: str, memory_budget: int) -> List[Dict]:
+    '''
+    Compare the temp codecs on the records of the Attribute table (numbered by a "benchmark.row" field): writing and
+    reading a temp file, and a sort, a grace hash join and a group by on "benchmark.row" that spill to temp files under
+    the memory budget.
+
+    Args:
+        database_name: str, the generated database.
+        memory_budget: int, the memory budget of the operators, small enough to make them spill.
+
+    Returns:
+        results: List[Dict], one dict per codec and benchmark, with the seconds and (for the temp file) its size in bytes.
+    '''
+    results = []
+    for temp_codec in ['jsonl', 'marshal']:
+        database = Database(database_name, memory_budget=memory_budget, temp_codec=temp_codec)
+        records = database.read_table(os.path.join('databases', database_name, 'Attribute.jsonl'))
+        records = [{**record, 'benchmark.row': i} for i, record in enumerate(records)]
+        fields = list(records[0])
+        fd, tmp_file_path = tempfile.mkstemp(prefix='benchmark_', suffix=database.temp_codec.suffix, dir='tmp')
+        os.close(fd)
+        results.append({'codec': temp_codec, 'benchmark': 'write_temp', 'seconds': time_function(lambda: database.write_temp(iter(records), tmp_file_path)), 'bytes': os.path.getsize(tmp_file_path)})
+        results.append({'codec': temp_codec, 'benchmark': 'read_temp', 'seconds': time_function(lambda: sum(1 for _ in database.read_temp(tmp_file_path)))})
+        database.buffer_pool.invalidate(tmp_file_path)
+        os.remove(tmp_file_path)
+        results.append({'codec': temp_codec, 'benchmark': 'sort_merge', 'seconds': time_function(lambda: sum(1 for _ in database.sort_merge(iter(records), fields[1], True)))})
+        results.append({'codec': temp_codec, 'benchmark': 'hash_inner_join', 'seconds': time_function(lambda: sum(1 for _ in database.hash_inner_join(iter(records), iter(records), 'benchmark.row', 'benchmark.row', [])))})
+        results.append({'codec': temp_codec, 'benchmark': 'group_by_and_aggregate', 'seconds': time_function(lambda: sum(1 for _ in database.group_by_and_aggregate(iter(records), ['benchmark.row'], {fields[0]: 'count'})))})
+    return results
+
+
+#######################   benchmark end   #########################
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Database operators on a generated, scaled version of the iris database.')
+    parser.add_argument('benchmarks', nargs='*', default=list(benchmark_name_function_pairs), help=f'the benchmarks to run, from {", ".join(benchmark_name_function_pairs)} (all by default)')
+    parser.add_argument('--database', default='benchmark', help='the name of the generated database')
+    parser.add_argument('--rows', type=int, default=100000, help='the number of records of Attribute')
+    parser.add_argument('--key-cardinality', type=int, default=None, help='the number of records of Kind and distinct values of Attribute.id (--rows by default)')
+    parser.add_argument('--skew', type=float, default=0.0, help='the Zipf exponent of Attribute.id, 0 for uniform')
+    parser.add_argument('--species', type=int, default=3, help='the number of distinct values of Kind.species')
+    parser.add_argument('--seed', type=int, default=0, help='the random seed')
+    parser.add_argument('--join-sample', type=int, default=1000, help='the number of records of each table in cross_product and theta_inner_join')
+    parser.add_argument('--mutations', type=int, default=1000, help='the number of records inserted by insert_record')
+    parser.add_argument('--statements', type=int, default=10, help='the number of statements of update_record and delete_record')
+    parser.add_argument('--memory-budget', type=int, default=100000, help='the memory budget of the operators')
+    parser.add_argument('--workers', type=int, default=1, help='the number of worker processes for parallel scans and sorts')
+    parser.add_argument('--temp-codec', default='marshal', choices=['jsonl', 'marshal'], help='the codec of temp files')
+    parser.add_argument('--codecs', action='store_true', help='also compare the codecs of temp files')
+    parser.add_argument('--output', default=None, help='the JSON file to write the results to, "-" for stdout')
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in benchmark_name_function_pairs:
+            parser.error(f'unknown benchmark: {name}')
+    options = {
+        'rows': args.rows,
+        'key_cardinality': args.key_cardinality or args.rows,
+        'skew': args.skew,
+        'species': args.species,
+        'seed': args.seed,
+        'join_sample': args.join_sample,
+        'mutations': args.mutations,
+        'statements': args.statements,
+        'memory_budget': args.memory_budget,
+        'workers': args.workers,
+        'temp_codec': args.temp_codec,
+    }
+    os.makedirs('tmp', exist_ok=True)
+    start = time.perf_counter()
+    generate_database(args.database, options['rows'], options['key_cardinality'], options['skew'], options['species'], options['seed'])
+    print(f'>>>Chenning_DBMS: database {args.database} generated in {time.perf_counter() - start:.3f} s.', file=sys.stderr)
+    results = run_benchmarks(args.benchmarks, args.database, options)
+    for result in results:
+        print(f"{result['benchmark']:<24}{result['seconds']:>10.3f} s{result['rows_per_second']:>14.0f} rows/s{result['peak_rss_bytes'] / 2**20:>10.1f} MiB RSS{result['peak_temp_bytes'] / 2**20:>10.1f} MiB temp", file=sys.stderr)
+    codec_results = benchmark_codecs(args.database, options['memory_budget'] // 5) if args.codecs else []
+    for result in codec_results:
+        print(f"{result['benchmark']:<24}{result['codec']:<10}{result['seconds']:>10.3f} s" + (f"{result['bytes']:>14} bytes" if 'bytes' in result else ''), file=sys.stderr)
+    report = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'options': options,
+        'results': results,
+        'codec_results': codec_results,
+    }
+    if args.output == '-':
+        print(json.dumps(report, indent=2))
+    elif args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(report, indent=2) + '\n')
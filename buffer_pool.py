@@ -0,0 +1,341 @@
+import collections
+import os
+from typing import Dict, Generator, List, Optional, Tuple, Union
+
+
+
+class BufferPool:
+    def __init__(self, capacity: int = 1024, page_size: int = 64 * 1024) -> None:
+        '''
+        Cache fixed-size pages of files in memory, shared by all the scans, index lookups and temp files of a database.
+        A page is the page_size bytes of a file starting at page_number * page_size, so table files keep their format.
+        Pages are evicted in least recently used order, except pinned pages, which are in use by a reader or writer.
+        Dirty pages (written through the pool but not yet to the file) are written back when evicted or flushed.
+
+        Args:
+            capacity: int = 1024, the maximum number of pages in the pool, unless more pages are pinned at the same time.
+            page_size: int = 64 * 1024, the size of a page in bytes.
+
+        Returns:
+            None.
+        '''
+        self.capacity = capacity
+        self.page_size = page_size
+        self.key_page_pairs = collections.OrderedDict()
+        self.path_identity_pairs = {}
+        self.path_size_pairs = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.write_backs = 0
+        self.bytes_read = 0
+
+
+    def check_file(self, path: str) -> None:
+        '''
+        Drop the pages of a file that has been changed outside the pool (appended to, rewritten or replaced) since they were read.
+        Files written through the pool are owned by it and are not checked.
+
+        Args:
+            path: str, the file.
+
+        Returns:
+            None.
+        '''
+        if path in self.path_size_pairs:
+            return
+        stat = os.stat(path)
+        identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if self.path_identity_pairs.get(path) != identity:
+            self.invalidate(path)
+            self.path_identity_pairs[path] = identity
+
+
+    def file_size(self, path: str) -> int:
+        '''
+        Get the size of a file, including the bytes written through the pool that are not in the file yet.
+
+        Args:
+            path: str, the file, which must have been checked by check_file.
+
+        Returns:
+            size: int, the size in bytes.
+        '''
+        if path in self.path_size_pairs:
+            return self.path_size_pairs[path]
+        return self.path_identity_pairs[path][1]
+
+
+    def pin_page(self, path: str, page_number: int) -> Union[bytes, bytearray]:
+        '''
+        Get a page, reading it from the file if it is not in the pool, and pin it until unpin_page is called.
+
+        Args:
+            path: str, the file.
+            page_number: int, the page.
+
+        Returns:
+            data: Union[bytes, bytearray], the bytes of the page, shorter than page_size for the last page of the file.
+        '''
+        key = (path, page_number)
+        page = self.key_page_pairs.get(key)
+        if page is None:
+            self.misses += 1
+            data = b''
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    f.seek(page_number * self.page_size)
+                    data = f.read(self.page_size)
+            self.bytes_read += len(data)
+            page = [data, 0, False]
+            self.key_page_pairs[key] = page
+            self.evict()
+        else:
+            self.hits += 1
+            self.key_page_pairs.move_to_end(key)
+        page[1] += 1
+        return page[0]
+
+
+    def unpin_page(self, path: str, page_number: int) -> None:
+        '''
+        Release a page pinned by pin_page, so that it can be evicted.
+
+        Args:
+            path: str, the file.
+            page_number: int, the page.
+
+        Returns:
+            None.
+        '''
+        page = self.key_page_pairs.get((path, page_number))
+        if page is not None:
+            page[1] -= 1
+
+
+    def evict(self) -> None:
+        '''
+        Evict unpinned pages in least recently used order until the pool is within its capacity, writing back dirty pages.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        '''
+        if len(self.key_page_pairs) <= self.capacity:
+            return
+        for key in list(self.key_page_pairs):
+            page = self.key_page_pairs[key]
+            if page[1] > 0:
+                continue
+            if page[2]:
+                self.write_back(key, page)
+            del self.key_page_pairs[key]
+            self.evictions += 1
+            if len(self.key_page_pairs) <= self.capacity:
+                return
+
+
+    def write_back(self, key: Tuple[str, int], page: List) -> None:
+        '''
+        Write a dirty page to its file.
+
+        Args:
+            key: Tuple[str, int], the file and the page number.
+            page: List, the page as [data, pin count, dirty].
+
+        Returns:
+            None.
+        '''
+        path, page_number = key
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(page_number * self.page_size)
+            f.write(page[0])
+        page[2] = False
+        self.write_backs += 1
+
+
+    def write(self, path: str, offset: int, data: bytes) -> None:
+        '''
+        Write bytes to a file through the pool. The pages written are dirty until they are evicted or flushed,
+        so a temp file that fits in the pool is read back without touching the disk.
+
+        Args:
+            path: str, the file, which is owned by the pool from now on until invalidate is called.
+            offset: int, where to write in the file.
+            data: bytes, the bytes to write.
+
+        Returns:
+            None.
+        '''
+        if path not in self.path_size_pairs:
+            self.path_size_pairs[path] = os.path.getsize(path) if os.path.exists(path) else 0
+            self.path_identity_pairs.pop(path, None)
+        position = 0
+        while position < len(data):
+            page_number, page_offset = divmod(offset + position, self.page_size)
+            length = min(self.page_size - page_offset, len(data) - position)
+            self.pin_page(path, page_number)
+            page = self.key_page_pairs[(path, page_number)]
+            if not isinstance(page[0], bytearray):
+                page[0] = bytearray(page[0])
+            if len(page[0]) < page_offset:
+                page[0].extend(bytes(page_offset - len(page[0])))
+            page[0][page_offset:page_offset+length] = data[position:position+length]
+            page[2] = True
+            page[1] -= 1
+            position += length
+        self.path_size_pairs[path] = max(self.path_size_pairs[path], offset + len(data))
+
+
+    def append(self, path: str, data: bytes) -> None:
+        '''
+        Append bytes to the end of a file through the pool.
+
+        Args:
+            path: str, the file.
+            data: bytes, the bytes to append.
+
+        Returns:
+            None.
+        '''
+        if path not in self.path_size_pairs:
+            self.path_size_pairs[path] = os.path.getsize(path) if os.path.exists(path) else 0
+            self.path_identity_pairs.pop(path, None)
+        self.write(path, self.path_size_pairs[path], data)
+
+
+    def flush(self, path: Optional[str] = None) -> None:
+        '''
+        Write back the dirty pages of a file, or of all files.
+
+        Args:
+            path: Optional[str] = None, the file, None for all files.
+
+        Returns:
+            None.
+        '''
+        for key, page in self.key_page_pairs.items():
+            if page[2] and (path is None or key[0] == path):
+                self.write_back(key, page)
+
+
+    def invalidate(self, path: str) -> None:
+        '''
+        Drop the pages of a file without writing them back, e.g. before the file is removed or after it changed on disk.
+
+        Args:
+            path: str, the file.
+
+        Returns:
+            None.
+        '''
+        for key in [key for key in self.key_page_pairs if key[0] == path]:
+            del self.key_page_pairs[key]
+        self.path_identity_pairs.pop(path, None)
+        self.path_size_pairs.pop(path, None)
+
+
+    def lines(self, path: str, start: int = 0, end: Optional[int] = None) -> Generator:
+        '''
+        Read the lines of a file page by page, pinning the page being read. A line that spans pages is joined from their parts.
+
+        Args:
+            path: str, the file, which must have been checked by check_file.
+            start: int = 0, the byte offset of the first line.
+            end: Optional[int] = None, the byte offset to stop at, which must be at a line boundary, None for the end of the file.
+
+        Returns:
+            lines: Generator, which generate (offset, line) pairs, the line without its newline.
+        '''
+        if end is None:
+            end = self.file_size(path)
+        page_number, position = divmod(start, self.page_size)
+        line_start, parts = start, []
+        while page_number * self.page_size < end:
+            data = self.pin_page(path, page_number)
+            try:
+                stop = min(len(data), end - page_number * self.page_size)
+                while position < stop:
+                    newline = data.find(b'\n', position, stop)
+                    if newline == -1:
+                        parts.append(bytes(data[position:stop]))
+                        break
+                    if parts:
+                        parts.append(bytes(data[position:newline]))
+                        line = b''.join(parts)
+                        parts = []
+                    else:
+                        line = bytes(data[position:newline])
+                    yield line_start, line
+                    position = newline + 1
+                    line_start = page_number * self.page_size + position
+            finally:
+                self.unpin_page(path, page_number)
+            if len(data) < self.page_size:
+                break
+            page_number, position = page_number + 1, 0
+        if parts:
+            yield line_start, b''.join(parts)
+
+
+    def pages(self, path: str) -> Generator:
+        '''
+        Read a file page by page, pinning the page being read.
+
+        Args:
+            path: str, the file, which must have been checked by check_file.
+
+        Returns:
+            pages: Generator, which generate the bytes of each page.
+        '''
+        size = self.file_size(path)
+        for page_number in range((size + self.page_size - 1) // self.page_size):
+            data = self.pin_page(path, page_number)
+            try:
+                remaining = size - page_number * self.page_size
+                yield data if len(data) <= remaining else data[:remaining]
+            finally:
+                self.unpin_page(path, page_number)
+
+
+    def read_line(self, path: str, offset: int) -> bytes:
+        '''
+        Read the line starting at a byte offset of a file.
+
+        Args:
+            path: str, the file, which must have been checked by check_file.
+            offset: int, the byte offset.
+
+        Returns:
+            line: bytes, the line without its newline.
+        '''
+        for _, line in self.lines(path, offset):
+            return line
+        return b''
+
+
+    def statistics(self) -> Dict[str, Union[int, float]]:
+        '''
+        Get the counters of the pool, to size it.
+
+        Args:
+            None.
+
+        Returns:
+            statistics: Dict[str, Union[int, float]], the hits, misses, hit rate, evictions, write-backs and bytes read from files since the pool was created,
+                and the number of pages (and dirty pages) in the pool.
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            'evictions': self.evictions,
+            'write_backs': self.write_backs,
+            'bytes_read': self.bytes_read,
+            'pages': len(self.key_page_pairs),
+            'dirty_pages': sum(page[2] for page in self.key_page_pairs.values()),
+            'capacity': self.capacity,
+            'page_size': self.page_size,
+        }
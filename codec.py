@@ -0,0 +1,127 @@
+import json
+import marshal
+import operator
+import struct
+from typing import Callable, Generator
+from buffer_pool import BufferPool
+
+
+
+class JsonlCodec:
+    '''
+    Encode the records of temp files as JSON lines, the same format as table files.
+    '''
+    name = 'jsonl'
+    suffix = '.jsonl'
+
+
+    def encoder(self, append: bool = False) -> Callable:
+        '''
+        Create a function that encodes the records of one temp file, in order.
+
+        Args:
+            append: bool = False, whether the records are appended to a temp file that already has records.
+
+        Returns:
+            encode: Callable, which takes a record and returns its bytes.
+        '''
+        return lambda record: (json.dumps(record) + '\n').encode()
+
+
+    def decode(self, buffer_pool: BufferPool, path: str) -> Generator:
+        '''
+        Read the records of a temp file written with an encoder of this codec.
+
+        Args:
+            buffer_pool: BufferPool, the buffer pool to read the pages of the file through.
+            path: str, the temp file, which must have been checked by BufferPool.check_file.
+
+        Returns:
+            table_out: Generator, which generate the records.
+        '''
+        for _, line in buffer_pool.lines(path):
+            yield json.loads(line)
+
+
+
+class MarshalCodec:
+    '''
+    Encode the records of temp files with marshal, each one as a frame of its length (4 bytes) and its marshal bytes.
+    The fields of the first record are written once in the first frame, and the records with the same fields are
+    written as tuples of their values. Other records (e.g. running states of group by) are written as they are.
+    Marshal keeps tuples and sets, and its format is only read back by the same Python version, which is fine for temp files.
+    '''
+    name = 'marshal'
+    suffix = '.marshal'
+    frame_header = struct.Struct('<I')
+
+
+    def encoder(self, append: bool = False) -> Callable:
+        '''
+        Create a function that encodes the records of one temp file, in order.
+
+        Args:
+            append: bool = False, whether the records are appended to a temp file that already has records, in which case
+                no fields frame is written and records are written as they are.
+
+        Returns:
+            encode: Callable, which takes a record and returns its bytes, with the fields frame before the first record.
+        '''
+        pack = self.frame_header.pack
+        fields = () if append else None
+        get_values = None
+
+        def encode(record) -> bytes:
+            nonlocal fields, get_values
+            if fields is None:
+                fields = tuple(record) if type(record) is dict else ()
+                if len(fields) == 1:
+                    get_values = lambda record: (record[fields[0]],)
+                elif fields:
+                    get_values = operator.itemgetter(*fields)
+                data = marshal.dumps(fields)
+                header = pack(len(data)) + data
+            else:
+                header = b''
+            if fields and type(record) is dict and len(record) == len(fields):
+                try:
+                    record = get_values(record)
+                except KeyError:
+                    pass
+            data = marshal.dumps(record)
+            return header + pack(len(data)) + data
+
+        return encode
+
+
+    def decode(self, buffer_pool: BufferPool, path: str) -> Generator:
+        '''
+        Read the records of a temp file written with an encoder of this codec.
+
+        Args:
+            buffer_pool: BufferPool, the buffer pool to read the pages of the file through.
+            path: str, the temp file, which must have been checked by BufferPool.check_file.
+
+        Returns:
+            table_out: Generator, which generate the records.
+        '''
+        unpack_from = self.frame_header.unpack_from
+        loads = marshal.loads
+        fields = None
+        buffer = b''
+        for page in buffer_pool.pages(path):
+            buffer = buffer + page if buffer else page
+            position = 0
+            while position + 4 <= len(buffer):
+                size, = unpack_from(buffer, position)
+                if position + 4 + size > len(buffer):
+                    break
+                record = loads(buffer[position+4:position+4+size])
+                position += 4 + size
+                if fields is None:
+                    fields = record
+                elif fields and type(record) is tuple:
+                    yield dict(zip(fields, record))
+                else:
+                    yield record
+            buffer = buffer[position:]
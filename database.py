@@ -1,137 +1,1529 @@
+import csv
 import json
-from typing import Generator, List, Callable, Dict, Union, Optional
-from functools import reduce
+from typing import Generator, List, Callable, Dict, Union, Optional, Tuple, Iterable
+import array
+import bisect
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import math
+import operator
 import os
+import shutil
 import tempfile
+import types
+from buffer_pool import BufferPool
+from codec import JsonlCodec, MarshalCodec
 
 
 
 class Database:
-    def __init__(self, database_name: str) -> None:
+    def __init__(self, database_name: str, memory_budget: int = 100000, batch_size: int = 4096, cache_entries: int = 64, cache_bytes: int = 64 * 1024 * 1024, workers: int = 1, buffer_pool_pages: int = 1024, temp_codec: str = 'marshal') -> None:
         '''
         Load the metadata of the database.
 
         Args:
             database_name: str, the name of the database to be used.
+            memory_budget: int = 100000, the maximum number of records an operator keeps in memory before spilling to temp files.
+            batch_size: int = 4096, the number of records in a batch in batch execution.
+            cache_entries: int = 64, the maximum number of query results in the result cache.
+            cache_bytes: int = 64 * 1024 * 1024, the maximum total size (in bytes of JSON) of the query results in the result cache.
+            workers: int = 1, the number of worker processes for parallel scans and sorts, 1 for working in the current process only.
+            buffer_pool_pages: int = 1024, the number of pages in the buffer pool, which caches pages of table, index and temp files.
+            temp_codec: str = 'marshal', how records are encoded in the temp files of joins, group by and sorts, "marshal" or "jsonl".
         
         Returns:
             None.
         '''
         self.database_name = database_name
+        self.memory_budget = memory_budget
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+        self.cache_bytes = cache_bytes
+        self.workers = workers
+        self.pool = None
         with open(os.path.join('databases', self.database_name, 'metadata.jsonl'), 'r') as f:
             self.table_name_field_data_type_pairs_pairs = json.loads(next(f).rstrip('\n'))
+        self.table_name_index_fields_pairs = {}
+        if os.path.exists(os.path.join('databases', self.database_name, 'indexes.jsonl')):
+            with open(os.path.join('databases', self.database_name, 'indexes.jsonl'), 'r') as f:
+                self.table_name_index_fields_pairs = json.loads(next(f).rstrip('\n'))
+        self.table_name_field_index_pairs = {}
+        self.table_name_statistics_pairs = {}
+        if os.path.exists(os.path.join('databases', self.database_name, 'statistics.jsonl')):
+            with open(os.path.join('databases', self.database_name, 'statistics.jsonl'), 'r') as f:
+                self.table_name_statistics_pairs = json.loads(next(f).rstrip('\n'))
+        self.buffer_pool = BufferPool(buffer_pool_pages)
+        self.temp_codec = {'jsonl': JsonlCodec, 'marshal': MarshalCodec}[temp_codec]()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.temp_files = 0
+        self.table_path_wal_pairs = {}
+        self.table_name_version_pairs = {}
+        self.key_result_pairs = collections.OrderedDict()
+        self.cache_size = 0
+        self.condition_texts_predicate_pairs = {}
+        for table_name in self.table_name_field_data_type_pairs_pairs:
+            self.finish_compaction(table_name)
 
 
 
 #######################   tool start   #########################
 
 
-    def read_table(self, table_path: str) -> Generator:
+    def read_table(self, table_path: str, fields: Optional[List[str]] = None, batch_size: Optional[int] = None) -> Generator:
         '''
         Read the table file and return the table as a generator.
+        Tables converted to columnar storage are read from their column files transparently, reading only the columns in fields.
+        Updates and deletes in the write-ahead log of a JSONL table are merged in.
 
         Args:
             table_path: str, where the table stores.
+            fields: Optional[List[str]] = None, the fields to read, None for all fields.
+            batch_size: Optional[int] = None, if given, generate batches (dicts from field to a list / array of values) of up to batch_size records instead of records.
         
         Returns:
-            table_out: Generator, which generate records from the table file.
+            table_out: Generator, which generate records (or batches of records) from the table file.
         '''
-        with open(table_path, 'r') as f:
+        if os.path.isdir(self.columns_path(table_path)):
+            if fields is not None and not fields and not batch_size:
+                # no column is read, but there is still one (empty) record per row, e.g. for a cross product with all the fields of this side projected away
+                yield from ({} for _ in range(self.read_row_count(self.columns_path(table_path))))
+                return
+            batches = self.read_columns(table_path, fields, batch_size or self.batch_size)
+            if batch_size:
+                yield from batches
+            else:
+                yield from self.unbatch_table(batches)
+            return
+        if batch_size:
+            yield from self.batch_table(self.read_table(table_path, fields), batch_size)
+            return
+        for record in self.scan_table(table_path, delta=self.read_wal(table_path)):
+            if fields is not None:
+                record = {field: record[field] for field in fields}
+            yield record
+
+
+    def scan_table(self, table_path: str, needles: Optional[List[bytes]] = None, delta: Optional[Dict[int, Optional[Dict]]] = None, with_offsets: bool = False, byte_range: Optional[Tuple[int, int]] = None) -> Generator:
+        '''
+        Read a JSONL table file through the buffer pool. Lines are split page by page, and a record is only decoded if its line
+        contains all the needles.
+
+        Args:
+            table_path: str, where the table stores.
+            needles: Optional[List[bytes]] = None, byte strings that a line must contain to be decoded, usually from prefilter_needles.
+            delta: Optional[Dict[int, Optional[Dict]]] = None, the updated records (None for deleted records) by offset, from read_wal.
+            with_offsets: bool = False, whether to generate (offset, record) pairs instead of records.
+            byte_range: Optional[Tuple[int, int]] = None, the (start, end) byte offsets of the part of the file to read, which must be at line boundaries, None for the whole file.
+        
+        Returns:
+            table_out: Generator, which generate records (or (offset, record) pairs) from the table file.
+        '''
+        self.buffer_pool.check_file(table_path)
+        start, end = byte_range or (0, None)
+        for offset, line in self.buffer_pool.lines(table_path, start, end):
+            if delta and offset in delta:
+                record = delta[offset]
+                if record is not None:
+                    yield (offset, record) if with_offsets else record
+            elif not needles or all(needle in line for needle in needles):
+                record = json.loads(line)
+                yield (offset, record) if with_offsets else record
+
+
+    def parallel_scan(self, table_name: str, conditions: List[Callable], fields: Optional[List[str]] = None, ordered: bool = True, min_range_bytes: int = 1 << 20) -> Generator:
+        '''
+        Select and project the records of a table in JSONL storage in worker processes. The table file is split into byte ranges
+        aligned to line boundaries, and each worker decodes, filters and projects a range with scan_range. At most two ranges per
+        worker are in flight, so results are generated while the remaining ranges are scanned. Conditions must be parsed by
+        Engine.parser_condition so that workers can rebuild them from their expressions; otherwise, or with a single worker or
+        a small table, the table is scanned in the current process.
+
+        Args:
+            table_name: str, the table to be scanned.
+            conditions: List[Callable], conditions parsed by Engine.parser_condition.
+            fields: Optional[List[str]] = None, the fields to keep, None for all fields.
+            ordered: bool = True, whether to generate records in the order of the table file, or as soon as their range is scanned.
+            min_range_bytes: int = 1 << 20, the minimum size of a byte range.
+        
+        Returns:
+            table_out: Generator, which generate records that match all the conditions.
+        '''
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        self.read_wal(table_path)
+        self.buffer_pool.check_file(table_path)
+        size = self.buffer_pool.file_size(table_path)
+        if self.workers <= 1 or size < 2 * min_range_bytes or any(not hasattr(condition, 'expression') for condition in conditions):
+            table = self.select(self.scan_table(table_path, self.prefilter_needles(table_name, conditions), self.read_wal(table_path)), conditions)
+            yield from self.project(table, fields) if fields is not None else table
+            return
+        range_bytes = max(min_range_bytes, size // (self.workers * 4))
+        boundaries = [0]
+        while boundaries[-1] < size:
+            start = min(boundaries[-1] + range_bytes, size - 1)
+            boundaries.append(min(size, start + len(self.buffer_pool.read_line(table_path, start)) + 1))
+        text_expression_pairs = [(getattr(condition, 'text', None), condition.expression) for condition in conditions]
+        needles = self.prefilter_needles(table_name, conditions)
+        byte_ranges = iter(zip(boundaries, boundaries[1:]))
+        futures = collections.deque()
+        for byte_range in itertools.islice(byte_ranges, 2 * self.workers):
+            futures.append(self.open_pool().submit(scan_range, table_path, byte_range, text_expression_pairs, needles, fields))
+        try:
+            while futures:
+                if ordered:
+                    future = futures.popleft()
+                else:
+                    future = next(concurrent.futures.as_completed(futures))
+                    futures.remove(future)
+                for byte_range in itertools.islice(byte_ranges, 1):
+                    futures.append(self.open_pool().submit(scan_range, table_path, byte_range, text_expression_pairs, needles, fields))
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+    def open_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        '''
+        Get the pool of worker processes for parallel scans and sorts, starting it the first time.
+
+        Args:
+            None.
+        
+        Returns:
+            pool: concurrent.futures.ProcessPoolExecutor, the pool.
+        '''
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=initialize_worker, initargs=(self.database_name, self.temp_codec.name))
+        return self.pool
+
+
+    def close_pool(self) -> None:
+        '''
+        Shut down the worker processes of parallel scans and sorts, if any.
+
+        Args:
+            None.
+        
+        Returns:
+            None.
+        '''
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+    def prefilter_needles(self, table_name: str, conditions: List[Callable]) -> List[bytes]:
+        '''
+        Find byte strings that every line matching the conditions must contain, so that scan_table can skip other lines before decoding them.
+        Only "field == constant" conditions on ints and plain ASCII strs are used, since their JSON text is the same whoever wrote the file,
+        and only when the field has the data type of the constant (a bool field stores 1 as true, a float field stores 1 as 1.0).
+
+        Args:
+            table_name: str, the table the conditions are on.
+            conditions: List[Callable], conditions parsed by Engine.parser_condition.
+        
+        Returns:
+            needles: List[bytes], the byte strings.
+        '''
+        field_data_type_pairs = self.table_name_field_data_type_pairs_pairs.get(table_name, {})
+        needles = []
+        for condition in conditions:
+            expression = getattr(condition, 'expression', None)
+            if expression is None or expression[1] != '==':
+                continue
+            (left_kind, left), _, (right_kind, right) = expression
+            if left_kind == 'field' and right_kind == 'value':
+                field, value = left, right
+            elif left_kind == 'value' and right_kind == 'field':
+                field, value = right, left
+            else:
+                continue
+            data_type = field_data_type_pairs.get(field)
+            if data_type == 'int' and type(value) is int:
+                needles.append(str(value).encode())
+            elif data_type == 'str' and type(value) is str and value.isascii() and value.isprintable() and '"' not in value and '\\' not in value and '/' not in value:
+                needles.append(json.dumps(value).encode())
+        return needles
+
+
+    def batch_table(self, table: Generator, batch_size: int) -> Generator:
+        '''
+        Group records of a table into batches of columns.
+
+        Args:
+            table: Generator.
+            batch_size: int, the maximum number of records in a batch.
+        
+        Returns:
+            table_out: Generator, which generate dicts from field to the list of values of the records in the batch.
+        '''
+        for records in iter(lambda: list(itertools.islice(table, batch_size)), []):
+            yield {field: [record[field] for record in records] for field in records[0]}
+
+
+    def convert_batches(self, table_name: str, table: Generator) -> Generator:
+        '''
+        Group records into batches of columns and convert each column to its data type in the table's schema.
+        Strings such as "False" or "0" (e.g. from a CSV file) are converted to False for bool fields.
+
+        Args:
+            table_name: str, the table that the records belong to.
+            table: Generator, the records to convert.
+        
+        Returns:
+            table_out: Generator, which generate dicts from each field of the schema to the list of converted values of the records in the batch.
+        '''
+        def convert_bool(value: Union[int, float, bool, str]) -> bool:
+            if isinstance(value, str):
+                return value.strip().lower() not in ('', 'false', '0', 'no')
+            return bool(value)
+
+        data_type_convert_pairs = {'int': int, 'float': float, 'bool': convert_bool, 'str': str}
+        field_data_type_pairs = self.table_name_field_data_type_pairs_pairs[table_name]
+        for records in iter(lambda: list(itertools.islice(table, self.batch_size)), []):
+            if any(len(record) != len(field_data_type_pairs) for record in records):
+                raise ValueError(f'records of table {table_name} must have exactly the fields {list(field_data_type_pairs)}')
+            batch = {}
+            for field, data_type in field_data_type_pairs.items():
+                try:
+                    batch[field] = list(map(data_type_convert_pairs[data_type], [record[field] for record in records]))
+                except KeyError:
+                    raise ValueError(f'records of table {table_name} must have exactly the fields {list(field_data_type_pairs)}')
+            yield batch
+
+
+    def write_table(self, table: Generator, table_path: str) -> None:
+        '''
+        Write a table Generator to the file.
+
+        Args:
+            table: Generator.
+            table_path: str, where the table stores.
+        
+        Returns:
+            None
+        '''
+        with open(table_path, 'w') as f:
+            for record in table:
+                line = json.dumps(record) + '\n'
+                f.write(line)
+
+
+    def match_record(self, record: Dict[str, Union[int, float, bool, str]], conditions: List[Callable]) -> bool:
+        '''
+        Judge whether a record matches all the conditions.
+
+        Args:
+            record: Dict[str, Union[int, float, bool, str]], the record to be judged.
+            conditions: List[Callable], the conditions to judge the record.
+        
+        Returns:
+            match_result: bool, whether a record matches all the conditions.
+        '''
+        match_result = all(condition(record) for condition in conditions)
+        return match_result
+
+
+    def create_temp_file(self, prefix: str) -> str:
+        '''
+        Create an empty temp file under tmp/ for the temp codec, counting it in temp_files.
+
+        Args:
+            prefix: str, the prefix of the file name, usually the operator that creates it.
+        
+        Returns:
+            tmp_file_path: str, the temp file.
+        '''
+        fd, tmp_file_path = tempfile.mkstemp(prefix=prefix, suffix=self.temp_codec.suffix, dir='tmp')
+        os.close(fd)
+        self.temp_files += 1
+        return tmp_file_path
+
+
+    def remove_temp_files(self, tmp_file_paths: List[str]) -> None:
+        '''
+        Remove temp files and drop their pages from the buffer pool, skipping those already removed. Operators call it in a
+        finally block, so that their temp files are removed even when they are closed before generating all their records.
+
+        Args:
+            tmp_file_paths: List[str], the temp files.
+        
+        Returns:
+            None.
+        '''
+        for tmp_file_path in tmp_file_paths:
+            self.buffer_pool.invalidate(tmp_file_path)
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+
+
+    def io_counters(self) -> Tuple[int, int, int]:
+        '''
+        Get the running totals of the I/O of this Database, which profiling takes differences of.
+        Work done in worker processes counts when its temp files are handed back, except the bytes that workers read.
+
+        Args:
+            None.
+        
+        Returns:
+            bytes_read, bytes_written, temp_files: Tuple[int, int, int], the bytes read from table, index and temp files
+                (through the buffer pool or from column files), the bytes written to temp files, and the temp files created.
+        '''
+        return self.bytes_read + self.buffer_pool.bytes_read, self.bytes_written, self.temp_files
+
+
+    def write_temp(self, table: Generator, tmp_file_path: str) -> int:
+        '''
+        Write a table Generator to a temp file, encoded with the temp codec.
+
+        Args:
+            table: Generator.
+            tmp_file_path: str, the temp file.
+        
+        Returns:
+            size: int, the number of bytes written.
+        '''
+        encode = self.temp_codec.encoder()
+        table = iter(table)
+        with open(tmp_file_path, 'wb') as f:
+            for records in iter(lambda: list(itertools.islice(table, self.batch_size)), []):
+                f.write(b''.join(map(encode, records)))
+            size = f.tell()
+        self.bytes_written += size
+        return size
+
+
+    def read_temp(self, tmp_file_path: str) -> Generator:
+        '''
+        Read a temp file written with the temp codec (by write_temp or another encoder of the codec) through the buffer pool.
+
+        Args:
+            tmp_file_path: str, the temp file.
+        
+        Returns:
+            table_out: Generator, which generate records from the temp file.
+        '''
+        self.buffer_pool.check_file(tmp_file_path)
+        yield from self.temp_codec.decode(self.buffer_pool, tmp_file_path)
+
+
+    def compile_conditions(self, conditions: List[Callable]) -> Callable:
+        '''
+        Compile conditions into a single predicate function, with constants inlined and conditions joined by "and" so that
+        evaluation stops at the first failing one. Conditions that are usually more selective and cheaper go first:
+        "field == constant", then other comparisons with constants, then "!=", then comparisons between two fields, then
+        conditions that were not parsed by Engine.parser_condition. Predicates are cached by the text of their conditions.
+
+        Args:
+            conditions: List[Callable], the conditions to compile.
+        
+        Returns:
+            predicate: Callable, which takes a record and returns whether it matches all the conditions.
+        '''
+        condition_texts = tuple(getattr(condition, 'text', None) for condition in conditions)
+        if None not in condition_texts and condition_texts in self.condition_texts_predicate_pairs:
+            return self.condition_texts_predicate_pairs[condition_texts]
+        namespace = {}
+        terms = self.condition_terms(conditions, namespace, lambda field: f'x[{field!r}]', 'x')
+        source = 'def predicate(x):\n    return ' + (' and '.join(terms) or 'True') + '\n'
+        exec(source, namespace)
+        predicate = namespace['predicate']
+        if None not in condition_texts:
+            self.condition_texts_predicate_pairs[condition_texts] = predicate
+        return predicate
+
+
+    def compile_join_conditions(self, conditions: List[Callable], fields_left: Tuple[str, ...], fields_right: Tuple[str, ...], compact_left: bool = False, compact_right: bool = False) -> Tuple[Callable, Callable]:
+        '''
+        Compile join conditions into a predicate on a pair of input records, so that pairs are tested before any joined record
+        is built, and a function that builds the joined record of a pair that passes. Either side may be compact rows (see
+        compact_records), whose fields are read by position. A field in both tables is taken from the right one, as in
+        {**record_left, **record_right}, and conditions that were not parsed by Engine.parser_condition get the joined record.
+
+        Args:
+            conditions: List[Callable], the conditions to compile.
+            fields_left: Tuple[str, ...], the fields of the left records.
+            fields_right: Tuple[str, ...], the fields of the right records.
+            compact_left: bool = False, whether left records are compact rows instead of dicts.
+            compact_right: bool = False, whether right records are compact rows instead of dicts.
+        
+        Returns:
+            predicate, join: Tuple[Callable, Callable], which take a left and a right record, and return whether they match all the conditions and their joined record respectively.
+        '''
+        condition_texts = tuple(getattr(condition, 'text', None) for condition in conditions)
+        key = (condition_texts, fields_left, fields_right, compact_left, compact_right)
+        if None not in condition_texts and key in self.condition_texts_predicate_pairs:
+            return self.condition_texts_predicate_pairs[key]
+        positions_left = {field: i for i, field in enumerate(fields_left)}
+        positions_right = {field: i for i, field in enumerate(fields_right)}
+
+        def field_operand(field: str) -> str:
+            if field in positions_right:
+                return f'r[{positions_right[field]}]' if compact_right else f'r[{field!r}]'
+            if field in positions_left:
+                return f'l[{positions_left[field]}]' if compact_left else f'l[{field!r}]'
+            return f'join(l, r)[{field!r}]'
+
+        namespace = {'fields_left': fields_left, 'fields_right': fields_right}
+        terms = self.condition_terms(conditions, namespace, field_operand, 'join(l, r)')
+        items_left = 'zip(fields_left, l)' if compact_left else 'l'
+        items_right = 'zip(fields_right, r)' if compact_right else 'r'
+        if compact_left or compact_right:
+            join_source = f'def join(l, r):\n    x = dict({items_left})\n    x.update({items_right})\n    return x\n'
+        else:
+            join_source = 'def join(l, r):\n    return {**l, **r}\n'
+        source = join_source + 'def predicate(l, r):\n    return ' + (' and '.join(terms) or 'True') + '\n'
+        exec(source, namespace)
+        predicate_join = (namespace['predicate'], namespace['join'])
+        if None not in condition_texts:
+            self.condition_texts_predicate_pairs[key] = predicate_join
+        return predicate_join
+
+
+    def condition_terms(self, conditions: List[Callable], namespace: Dict, field_operand: Callable, record_operand: str) -> List[str]:
+        '''
+        Turn conditions into Python expressions for a compiled predicate, in the order described in compile_conditions.
+
+        Args:
+            conditions: List[Callable], the conditions.
+            namespace: Dict, where values that cannot be inlined and unparsed conditions are put for the compiled code.
+            field_operand: Callable, which takes a field and returns the expression of its value.
+            record_operand: str, the expression of the whole record, for conditions that were not parsed by Engine.parser_condition.
+        
+        Returns:
+            terms: List[str], one expression per condition.
+        '''
+        def rank(condition: Callable) -> int:
+            expression = getattr(condition, 'expression', None)
+            if expression is None:
+                return 4
+            (left_kind, _), operator_str, (right_kind, _) = expression
+            if left_kind == 'field' and right_kind == 'field':
+                return 3
+            return {'==': 0, '!=': 2}.get(operator_str, 1)
+
+        terms = []
+        for i, condition in enumerate(sorted(conditions, key=rank)):
+            expression = getattr(condition, 'expression', None)
+            if expression is None:
+                namespace[f'condition_{i}'] = condition
+                terms.append(f'condition_{i}({record_operand})')
+                continue
+            (left_kind, left), operator_str, (right_kind, right) = expression
+            operands = []
+            for side, (kind, value) in enumerate([(left_kind, left), (right_kind, right)]):
+                if kind == 'field':
+                    operands.append(field_operand(value))
+                elif type(value) in (int, str, bool) or (type(value) is float and math.isfinite(value)):
+                    operands.append(repr(value))
+                else:
+                    namespace[f'value_{i}_{side}'] = value
+                    operands.append(f'value_{i}_{side}')
+            terms.append(f'({operands[0]} {operator_str} {operands[1]})')
+        return terms
+
+
+    def compact_records(self, records: List[Dict]) -> Tuple[Tuple[str, ...], List[Tuple]]:
+        '''
+        Turn records with the same fields into compact rows, tuples of their values in the order of the shared fields,
+        for operators that keep many records in memory.
+
+        Args:
+            records: List[Dict], the records.
+        
+        Returns:
+            fields, rows: Tuple[Tuple[str, ...], List[Tuple]], the fields (from the first record) and the rows.
+        '''
+        if not records:
+            return (), []
+        fields = tuple(records[0])
+        if not fields:
+            # e.g. a side of a join whose fields are all projected away
+            return fields, [()] * len(records)
+        if len(fields) == 1:
+            return fields, [(record[fields[0]],) for record in records]
+        return fields, list(map(operator.itemgetter(*fields), records))
+
+
+    def batch_condition(self, condition: Callable) -> Callable:
+        '''
+        Turn a condition on a record into a condition on a batch, which compares whole columns at once.
+
+        Args:
+            condition: Callable, a condition parsed by Engine.parser_condition.
+        
+        Returns:
+            batch_condition: Callable, which takes a batch and returns the list of results, one per record.
+        '''
+        expression = getattr(condition, 'expression', None)
+        if expression is None:
+            return lambda batch: [condition(dict(zip(batch.keys(), values))) for values in zip(*batch.values())]
+        (left_kind, left), operator_str, (right_kind, right) = expression
+        compare = {'==': operator.eq, '!=': operator.ne, '>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt}[operator_str]
+        if left_kind == 'field' and right_kind == 'value':
+            return lambda batch: list(map(compare, batch[left], itertools.repeat(right)))
+        elif left_kind == 'value' and right_kind == 'field':
+            return lambda batch: list(map(compare, itertools.repeat(left), batch[right]))
+        else:
+            return lambda batch: list(map(compare, batch[left], batch[right]))
+
+
+    def filter_batch(self, batch: Dict[str, Union[List, array.array]], mask: List[bool]) -> Dict[str, Union[List, array.array]]:
+        '''
+        Keep the records of a batch whose mask is True.
+
+        Args:
+            batch: Dict[str, Union[List, array.array]], the batch.
+            mask: List[bool], one value per record.
+        
+        Returns:
+            batch_out: Dict[str, Union[List, array.array]], the records that are kept, with arrays staying arrays.
+        '''
+        batch_out = {}
+        for field, values in batch.items():
+            if isinstance(values, array.array):
+                batch_out[field] = array.array(values.typecode, itertools.compress(values, mask))
+            else:
+                batch_out[field] = list(itertools.compress(values, mask))
+        return batch_out
+
+
+    def read_table_at(self, table_path: str, offsets: List[int]) -> Generator:
+        '''
+        Read the records starting at the given byte offsets of the table file, with updates and deletes in the write-ahead log merged in.
+
+        Args:
+            table_path: str, where the table stores.
+            offsets: List[int], the byte offsets of the records to read.
+        
+        Returns:
+            table_out: Generator, which generate records at the offsets.
+        '''
+        delta = self.read_wal(table_path)
+        self.buffer_pool.check_file(table_path)
+        for offset in offsets:
+            if offset in delta:
+                if delta[offset] is not None:
+                    yield delta[offset]
+                continue
+            yield json.loads(self.buffer_pool.read_line(table_path, offset))
+
+
+    def partition_table(self, table: Generator, field: str, num_partitions: int, depth: int, prefix: str) -> Tuple[List[str], List[int]]:
+        '''
+        Split a table into temp files (encoded with the temp codec) by the hash of a field, so that records with the same value end up in the same file.
+
+        Args:
+            table: Generator.
+            field: str, the field to partition by.
+            num_partitions: int, the number of temp files.
+            depth: int, mixed into the hash so that re-partitioning a partition splits it differently.
+            prefix: str, the prefix of temp file names.
+        
+        Returns:
+            tmp_file_paths, counts: Tuple[List[str], List[int]], the paths of the partitions and the number of records in each of them.
+        '''
+        tmp_file_paths = []
+        files = []
+        for _ in range(num_partitions):
+            tmp_file_path = self.create_temp_file(prefix)
+            tmp_file_paths.append(tmp_file_path)
+            files.append(open(tmp_file_path, 'wb'))
+        encoders = [self.temp_codec.encoder() for _ in range(num_partitions)]
+        counts = [0] * num_partitions
+        try:
+            for record in table:
+                i = hash((depth, record[field])) % num_partitions
+                files[i].write(encoders[i](record))
+                counts[i] += 1
+        except BaseException:
+            for f in files:
+                f.close()
+            self.remove_temp_files(tmp_file_paths)
+            raise
+        for f in files:
+            self.bytes_written += f.tell()
+            f.close()
+        return tmp_file_paths, counts
+
+
+#######################   tool end   #########################
+
+
+
+#######################   table start   #########################
+
+
+    def create_table(self, table_name: str, field_data_type_pairs: Dict[str, str]) -> None:
+        '''
+        Create a new table and update database's metadata.
+
+        Args:
+            table_name: str, the name of the new table to be created.
+            field_data_type_pairs: Dict[str, str], the fields of the table and their corresponding data types.
+        
+        Returns:
+            None.
+        '''
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        with open(table_path, 'w') as f:
+            pass
+        self.table_name_field_data_type_pairs_pairs[table_name] = field_data_type_pairs
+        with open(os.path.join('databases', self.database_name, 'metadata.jsonl'), 'w') as f:
+            f.write(json.dumps(self.table_name_field_data_type_pairs_pairs)+'\n')
+
+
+    def drop_table(self, table_name: str) -> None:
+        '''
+        Drop an existing table and update database's metadata.
+
+        Args:
+            table_name: str, the name of the existing table to be dropped.
+        
+        Returns:
+            None.
+        '''
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        if os.path.isdir(self.columns_path(table_path)):
+            shutil.rmtree(self.columns_path(table_path))
+        else:
+            os.remove(table_path)
+            self.remove_wal(table_path)
+        for field in list(self.table_name_index_fields_pairs.get(table_name, [])):
+            self.drop_index(table_name, field)
+        if table_name in self.table_name_statistics_pairs:
+            del self.table_name_statistics_pairs[table_name]
+            self.write_statistics()
+        del self.table_name_field_data_type_pairs_pairs[table_name]
+        self.bump_table_version(table_name)
+        with open(os.path.join('databases', self.database_name, 'metadata.jsonl'), 'w') as f:
+            f.write(json.dumps(self.table_name_field_data_type_pairs_pairs)+'\n')
+
+
+    def show_table_names(self) -> None:
+        '''
+        Show available table names in current database.
+
+        Args:
+            None.
+        
+        Returns:
+            None.
+        '''
+        for table_name in self.table_name_field_data_type_pairs_pairs.keys():
+            print(table_name)
+
+
+#######################   table end   #########################
+
+
+
+#######################   index start   #########################
+
+
+    def create_index(self, table_name: str, field: str) -> None:
+        '''
+        Create a sorted index on a field of a table, which maps each value of the field to the byte offsets of the records in the table file.
+        The index is stored next to the table file as <table_name>.<field>.index.jsonl, one [value, offset] pair per line.
+        Only tables in JSONL storage can be indexed.
+
+        Args:
+            table_name: str, the table to be indexed.
+            field: str, the field to be indexed.
+        
+        Returns:
+            None.
+        '''
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        if os.path.isdir(self.columns_path(table_path)):
+            raise ValueError(f'indexes are only supported on tables in JSONL storage, but table {table_name} is in columnar storage')
+        key_offset_pairs = []
+        for offset, record in self.scan_table(table_path, delta=self.read_wal(table_path), with_offsets=True):
+            key_offset_pairs.append([record[field], offset])
+        self.write_index(table_name, field, key_offset_pairs)
+        index_fields = self.table_name_index_fields_pairs.setdefault(table_name, [])
+        if field not in index_fields:
+            index_fields.append(field)
+        with open(os.path.join('databases', self.database_name, 'indexes.jsonl'), 'w') as f:
+            f.write(json.dumps(self.table_name_index_fields_pairs)+'\n')
+
+
+    def drop_index(self, table_name: str, field: str) -> None:
+        '''
+        Drop an existing index.
+
+        Args:
+            table_name: str, the table that the index belongs to.
+            field: str, the indexed field.
+        
+        Returns:
+            None.
+        '''
+        os.remove(os.path.join('databases', self.database_name, f'{table_name}.{field}.index.jsonl'))
+        self.table_name_field_index_pairs.pop((table_name, field), None)
+        self.table_name_index_fields_pairs[table_name].remove(field)
+        if not self.table_name_index_fields_pairs[table_name]:
+            del self.table_name_index_fields_pairs[table_name]
+        with open(os.path.join('databases', self.database_name, 'indexes.jsonl'), 'w') as f:
+            f.write(json.dumps(self.table_name_index_fields_pairs)+'\n')
+
+
+    def write_index(self, table_name: str, field: str, key_offset_pairs: List[List]) -> None:
+        '''
+        Sort the [value, offset] pairs of an index and store them, replacing the old index file.
+
+        Args:
+            table_name: str, the table that the index belongs to.
+            field: str, the indexed field.
+            key_offset_pairs: List[List], the [value, offset] pairs of all records in the table.
+        
+        Returns:
+            None.
+        '''
+        key_offset_pairs.sort(key=lambda x: x[0])
+        with open(os.path.join('databases', self.database_name, f'{table_name}.{field}.index.jsonl'), 'w') as f:
+            for key_offset_pair in key_offset_pairs:
+                f.write(json.dumps(key_offset_pair)+'\n')
+        self.table_name_field_index_pairs[(table_name, field)] = ([key for key, _ in key_offset_pairs], [offset for _, offset in key_offset_pairs])
+
+
+    def add_index_entry(self, table_name: str, field: str, key: Union[int, float, bool, str], offset: int) -> None:
+        '''
+        Add a [value, offset] pair to an index, by appending it to the index file.
+
+        Args:
+            table_name: str, the table that the index belongs to.
+            field: str, the indexed field.
+            key: Union[int, float, bool, str], the value of the field.
+            offset: int, the offset of the record in the table file.
+        
+        Returns:
+            None.
+        '''
+        with open(os.path.join('databases', self.database_name, f'{table_name}.{field}.index.jsonl'), 'a') as f:
+            f.write(json.dumps([key, offset])+'\n')
+        if (table_name, field) in self.table_name_field_index_pairs:
+            keys, offsets = self.table_name_field_index_pairs[(table_name, field)]
+            i = bisect.bisect_right(keys, key)
+            keys.insert(i, key)
+            offsets.insert(i, offset)
+
+
+    def add_index_entries(self, table_name: str, field: str, key_offset_pairs: List[Tuple[Union[int, float, bool, str], int]]) -> None:
+        '''
+        Add [value, offset] pairs to an index, by appending them to the index file and syncing it to disk.
+
+        Args:
+            table_name: str, the table that the index belongs to.
+            field: str, the indexed field.
+            key_offset_pairs: List[Tuple[Union[int, float, bool, str], int]], the values of the field and the offsets of their records in the table file.
+        
+        Returns:
+            None.
+        '''
+        if not key_offset_pairs:
+            return
+        with open(os.path.join('databases', self.database_name, f'{table_name}.{field}.index.jsonl'), 'a') as f:
+            f.write(''.join(json.dumps([key, offset])+'\n' for key, offset in key_offset_pairs))
+            f.flush()
+            os.fsync(f.fileno())
+        self.table_name_field_index_pairs.pop((table_name, field), None)
+
+
+    def read_index(self, table_name: str, field: str) -> Tuple[List, List[int]]:
+        '''
+        Load an index into memory (once per Database), as a sorted list of values and the list of their offsets.
+        Inserted records are appended to the end of the index file, so the pairs are sorted again when loading.
+
+        Args:
+            table_name: str, the table that the index belongs to.
+            field: str, the indexed field.
+        
+        Returns:
+            keys, offsets: Tuple[List, List[int]], the sorted values and their corresponding offsets.
+        '''
+        try:
+            return self.table_name_field_index_pairs[(table_name, field)]
+        except KeyError:
+            pass
+        key_offset_pairs = list(self.scan_table(os.path.join('databases', self.database_name, f'{table_name}.{field}.index.jsonl')))
+        key_offset_pairs.sort(key=lambda x: x[0])
+        index = ([key for key, _ in key_offset_pairs], [offset for _, offset in key_offset_pairs])
+        self.table_name_field_index_pairs[(table_name, field)] = index
+        return index
+
+
+    def index_scan(self, table_name: str, field: str, low: Optional[Union[int, float, bool, str]] = None, high: Optional[Union[int, float, bool, str]] = None, low_inclusive: bool = True, high_inclusive: bool = True, ordered: bool = False) -> Generator:
+        '''
+        Read the records whose indexed field is between low and high, seeking straight to them in the table file.
+
+        Args:
+            table_name: str, the table to be read.
+            field: str, the indexed field.
+            low: Optional[Union[int, float, bool, str]] = None, the lower bound, None for no lower bound.
+            high: Optional[Union[int, float, bool, str]] = None, the upper bound, None for no upper bound.
+            low_inclusive: bool = True, whether records equal to low are included.
+            high_inclusive: bool = True, whether records equal to high are included.
+            ordered: bool = False, whether to generate the records in ascending order of the field instead of the order they are stored in the table file.
+        
+        Returns:
+            table_out: Generator, which generate the records in the range.
+        '''
+        keys, offsets = self.read_index(table_name, field)
+        start = 0
+        end = len(keys)
+        if low is not None:
+            start = bisect.bisect_left(keys, low) if low_inclusive else bisect.bisect_right(keys, low)
+        if high is not None:
+            end = bisect.bisect_right(keys, high) if high_inclusive else bisect.bisect_left(keys, high)
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        if ordered:
+            delta = self.read_wal(table_path)
+            # an update to a value the record already had adds a second entry for the same key
+            key_offset_pairs = sorted({(key, offset) for key, offset in zip(keys[start:end], offsets[start:end]) if delta.get(offset, True) is not None})
+            records = self.read_table_at(table_path, [offset for _, offset in key_offset_pairs])
+            # the entry of an updated record for its old value is skipped
+            yield from (record for (key, _), record in zip(key_offset_pairs, records) if record[field] == key)
+            return
+        # an updated record has an entry for its old value and one for its new value
+        yield from self.read_table_at(table_path, sorted(set(offsets[start:end])))
+
+
+    def index_select(self, table_name: str, conditions: List[Callable], fields: Optional[List[str]] = None, ordered: bool = True) -> Generator:
+        '''
+        Select records of a stored table which match all of the conditions, using an index when a condition compares an indexed field with a constant
+        of its data type. Conditions on the same field are combined into one range, and point lookups (==) are preferred over ranges.
+
+        Args:
+            table_name: str, the table to be selected from.
+            conditions: List[Callable], conditions parsed by Engine.parser_condition.
+            fields: Optional[List[str]] = None, the fields to keep, which must include the fields the conditions read, None for all fields.
+            ordered: bool = True, whether a parallel scan generates records in the order of the table file, or as soon as their range is scanned.
+        
+        Returns:
+            table_out: Generator, which generate records that match all the conditions.
+        '''
+        index_fields = self.table_name_index_fields_pairs.get(table_name, [])
+        field_bounds_pairs = {}
+        for condition in conditions:
+            expression = getattr(condition, 'expression', None)
+            if expression is None:
+                continue
+            (left_kind, left), operator_str, (right_kind, right) = expression
+            if left_kind == 'field' and right_kind == 'value':
+                field, value = left, right
+            elif left_kind == 'value' and right_kind == 'field':
+                field, value = right, left
+                operator_str = {'==': '==', '!=': '!=', '>': '<', '<': '>', '>=': '<=', '<=': '>='}[operator_str]
+            else:
+                continue
+            if field not in index_fields or operator_str == '!=':
+                continue
+            # a constant of another type cannot be compared with the sorted keys, so the condition is left to the scan
+            data_type = self.table_name_field_data_type_pairs_pairs[table_name].get(field)
+            if not isinstance(value, {'int': (int, float), 'float': (int, float), 'bool': (bool, int), 'str': (str,)}.get(data_type, ())):
+                continue
+            low, low_inclusive, high, high_inclusive = field_bounds_pairs.get(field, (None, True, None, True))
+            if operator_str in ['==', '>', '>=']:
+                if low is None or value > low or (value == low and operator_str == '>'):
+                    low, low_inclusive = value, operator_str != '>'
+            if operator_str in ['==', '<', '<=']:
+                if high is None or value < high or (value == high and operator_str == '<'):
+                    high, high_inclusive = value, operator_str != '<'
+            field_bounds_pairs[field] = (low, low_inclusive, high, high_inclusive)
+
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        if os.path.isdir(self.columns_path(table_path)):
+            if fields is not None and not fields:
+                # batches without columns do not carry their number of records, so records are read instead
+                yield from self.select(self.read_table(table_path, fields), conditions)
+                return
+            batches = self.read_table(table_path, fields, self.batch_size)
+            yield from self.unbatch_table(self.select_batches(batches, conditions))
+            return
+        if field_bounds_pairs:
+            field = next((field for field, (low, _, high, _) in field_bounds_pairs.items() if low is not None and low == high), next(iter(field_bounds_pairs)))
+            low, low_inclusive, high, high_inclusive = field_bounds_pairs[field]
+            table = self.index_scan(table_name, field, low, high, low_inclusive, high_inclusive)
+        elif self.workers > 1:
+            yield from self.parallel_scan(table_name, conditions, fields, ordered)
+            return
+        else:
+            table = self.scan_table(table_path, self.prefilter_needles(table_name, conditions), self.read_wal(table_path))
+        table = self.select(table, conditions)
+        if fields is not None:
+            table = self.project(table, fields)
+        yield from table
+
+
+#######################   index end   #########################
+
+
+
+#######################   statistics start   #########################
+
+
+    def analyze_table(self, table_name: str) -> None:
+        '''
+        Collect statistics of a table for the query planner: the number of records, and the number of distinct values, the
+        minimum and the maximum of every field. They are stored in statistics.jsonl next to metadata.jsonl.
+
+        Args:
+            table_name: str, the table to be analyzed.
+        
+        Returns:
+            None.
+        '''
+        field_data_type_pairs = self.table_name_field_data_type_pairs_pairs[table_name]
+        field_values_pairs = {field: set() for field in field_data_type_pairs}
+        rows = 0
+        for record in self.read_table(os.path.join('databases', self.database_name, table_name+'.jsonl')):
+            rows += 1
+            for field, values in field_values_pairs.items():
+                values.add(record[field])
+        statistics = {'rows': rows, 'fields': {}}
+        for field, values in field_values_pairs.items():
+            statistics['fields'][field] = {'distinct': len(values), 'min': min(values) if values else None, 'max': max(values) if values else None}
+        self.table_name_statistics_pairs[table_name] = statistics
+        self.write_statistics()
+
+
+    def adjust_statistics(self, table_name: str, rows_delta: int, field_value_pairs: Dict[str, Union[int, float, bool, str]], field_max_pairs: Optional[Dict[str, Union[int, float, bool, str]]] = None) -> None:
+        '''
+        Keep the statistics of an analyzed table roughly up to date after a modification, without scanning the table again:
+        the number of records is adjusted, and the minimum / maximum are widened to include new values.
+
+        Args:
+            table_name: str, the modified table.
+            rows_delta: int, the change of the number of records.
+            field_value_pairs: Dict[str, Union[int, float, bool, str]], the new values written to the table, or the smallest of them if field_max_pairs is given.
+            field_max_pairs: Optional[Dict[str, Union[int, float, bool, str]]] = None, the largest of the new values, None if field_value_pairs holds the only ones.
+        
+        Returns:
+            None.
+        '''
+        if table_name not in self.table_name_statistics_pairs:
+            return
+        statistics = self.table_name_statistics_pairs[table_name]
+        if field_max_pairs is None:
+            field_max_pairs = field_value_pairs
+        statistics['rows'] = max(statistics['rows'] + rows_delta, 0)
+        for field, field_statistics in statistics['fields'].items():
+            if field in field_value_pairs:
+                value = field_value_pairs[field]
+                field_statistics['min'] = value if field_statistics['min'] is None else min(field_statistics['min'], value)
+            if field in field_max_pairs:
+                value = field_max_pairs[field]
+                field_statistics['max'] = value if field_statistics['max'] is None else max(field_statistics['max'], value)
+            field_statistics['distinct'] = max(min(field_statistics['distinct'], statistics['rows']), 1 if statistics['rows'] else 0)
+        self.write_statistics()
+
+
+    def write_statistics(self) -> None:
+        '''
+        Store the statistics of all tables.
+
+        Args:
+            None.
+        
+        Returns:
+            None.
+        '''
+        with open(os.path.join('databases', self.database_name, 'statistics.jsonl'), 'w') as f:
+            f.write(json.dumps(self.table_name_statistics_pairs)+'\n')
+
+
+#######################   statistics end   #########################
+
+
+
+#######################   storage start   #########################
+
+
+    def columns_path(self, table_path: str) -> str:
+        '''
+        Get the folder where the columns of a table in columnar storage are stored.
+
+        Args:
+            table_path: str, where the table stores in JSONL storage, e.g. databases/iris/Kind.jsonl.
+        
+        Returns:
+            columns_path: str, e.g. databases/iris/Kind.columns.
+        '''
+        return os.path.splitext(table_path)[0] + '.columns'
+
+
+    def convert_table_storage(self, table_name: str, storage: str) -> None:
+        '''
+        Convert a table between JSONL storage (one JSON record per line) and columnar storage (one typed binary file per field).
+        In columnar storage, int and float fields are stored as arrays of 8-byte numbers, bool fields as bitmaps, and str fields as
+        an array of end offsets plus a blob of UTF-8 text. Indexes are only kept for tables in JSONL storage, so they are dropped.
+
+        Args:
+            table_name: str, the table to be converted.
+            storage: str, "columnar" or "jsonl".
+        
+        Returns:
+            None.
+        '''
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        columns_path = self.columns_path(table_path)
+        if storage == 'columnar' and not os.path.isdir(columns_path):
+            for field in list(self.table_name_index_fields_pairs.get(table_name, [])):
+                self.drop_index(table_name, field)
+            tmp_columns_path = tempfile.mkdtemp(prefix='convert_table_storage_', suffix='.columns', dir='tmp')
+            self.write_columns(self.read_table(table_path), tmp_columns_path, self.table_name_field_data_type_pairs_pairs[table_name])
+            os.rename(tmp_columns_path, columns_path)
+            os.remove(table_path)
+            self.remove_wal(table_path)
+        elif storage == 'jsonl' and os.path.isdir(columns_path):
+            _, tmp_file_path = tempfile.mkstemp(prefix='convert_table_storage_', suffix='.jsonl', dir='tmp', text=True)
+            self.write_table(self.read_table(table_path), tmp_file_path)
+            os.rename(tmp_file_path, table_path)
+            shutil.rmtree(columns_path)
+
+
+    def write_columns(self, table: Generator, columns_path: str, field_data_type_pairs: Dict[str, str], batch_size: int = 4096) -> None:
+        '''
+        Write a table Generator to a folder of column files, appending to them if they exist.
+
+        Args:
+            table: Generator.
+            columns_path: str, the folder where the column files store.
+            field_data_type_pairs: Dict[str, str], the fields of the table and their corresponding data types.
+            batch_size: int = 4096, the number of records buffered in memory before writing.
+        
+        Returns:
+            None.
+        '''
+        row_count = self.read_row_count(columns_path)
+        for field, data_type in field_data_type_pairs.items():
+            open(os.path.join(columns_path, field+'.data'), 'ab').close()
+            if data_type == 'str':
+                open(os.path.join(columns_path, field+'.offsets'), 'ab').close()
+        for batch in self.batch_table(table, batch_size):
+            count = len(next(iter(batch.values())))
+            for field, data_type in field_data_type_pairs.items():
+                data_path = os.path.join(columns_path, field+'.data')
+                values = batch[field]
+                if data_type == 'int' or data_type == 'float':
+                    with open(data_path, 'ab') as f:
+                        array.array('q' if data_type == 'int' else 'd', values).tofile(f)
+                elif data_type == 'bool':
+                    bitmap = bytearray()
+                    if row_count % 8:
+                        # the last byte of the bitmap is not full yet, so it is rewritten together with the new bits
+                        with open(data_path, 'rb+') as f:
+                            f.seek(-1, os.SEEK_END)
+                            bitmap += f.read(1)
+                            f.seek(-1, os.SEEK_END)
+                            f.truncate()
+                    for i, value in enumerate(values, row_count % 8):
+                        if i >> 3 == len(bitmap):
+                            bitmap.append(0)
+                        if value:
+                            bitmap[i >> 3] |= 1 << (i & 7)
+                    with open(data_path, 'ab') as f:
+                        f.write(bitmap)
+                elif data_type == 'str':
+                    offsets_path = os.path.join(columns_path, field+'.offsets')
+                    end = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+                    offsets = array.array('Q')
+                    blob = bytearray()
+                    for value in values:
+                        blob += value.encode()
+                        offsets.append(end + len(blob))
+                    with open(data_path, 'ab') as f:
+                        f.write(blob)
+                    with open(offsets_path, 'ab') as f:
+                        offsets.tofile(f)
+            row_count += count
+        with open(os.path.join(columns_path, 'metadata.jsonl'), 'w') as f:
+            f.write(json.dumps({'rows': row_count})+'\n')
+
+
+    def replace_columns(self, table: Generator, table_name: str) -> None:
+        '''
+        Replace all the records of a table in columnar storage with the records of a table Generator.
+
+        Args:
+            table: Generator, the new records, which may be read from the table itself.
+            table_name: str, the table to be replaced.
+        
+        Returns:
+            None.
+        '''
+        columns_path = self.columns_path(os.path.join('databases', self.database_name, table_name+'.jsonl'))
+        tmp_columns_path = tempfile.mkdtemp(prefix='replace_columns_', suffix='.columns', dir='tmp')
+        self.write_columns(table, tmp_columns_path, self.table_name_field_data_type_pairs_pairs[table_name])
+        shutil.rmtree(columns_path)
+        os.rename(tmp_columns_path, columns_path)
+
+
+    def read_row_count(self, columns_path: str) -> int:
+        '''
+        Get the number of records of a table in columnar storage.
+
+        Args:
+            columns_path: str, the folder where the column files store.
+        
+        Returns:
+            row_count: int, the number of records, 0 if the table has no column files yet.
+        '''
+        if not os.path.exists(os.path.join(columns_path, 'metadata.jsonl')):
+            return 0
+        with open(os.path.join(columns_path, 'metadata.jsonl'), 'r') as f:
+            return json.loads(next(f).rstrip('\n'))['rows']
+
+
+    def read_columns(self, table_path: str, fields: Optional[List[str]], batch_size: int) -> Generator:
+        '''
+        Read the given column files of a table in columnar storage batch by batch.
+
+        Args:
+            table_path: str, where the table stores in JSONL storage, e.g. databases/iris/Kind.jsonl.
+            fields: Optional[List[str]], the fields to read, None for all fields.
+            batch_size: int, the maximum number of records in a batch, rounded up to a multiple of 8 to align with bitmaps.
+        
+        Returns:
+            table_out: Generator, which generate dicts from field to an array (int / float) or a list (bool / str) of values.
+        '''
+        columns_path = self.columns_path(table_path)
+        table_name = os.path.splitext(os.path.basename(table_path))[0]
+        field_data_type_pairs = self.table_name_field_data_type_pairs_pairs[table_name]
+        if fields is None:
+            fields = list(field_data_type_pairs.keys())
+        batch_size = (batch_size + 7) // 8 * 8
+        row_count = self.read_row_count(columns_path)
+        files = {}
+        try:
+            for field in fields:
+                files[field] = open(os.path.join(columns_path, field+'.data'), 'rb')
+                if field_data_type_pairs[field] == 'str':
+                    files[field+'.offsets'] = open(os.path.join(columns_path, field+'.offsets'), 'rb')
+            start_offsets = {field: 0 for field in fields}
+            size_read = 0
+            for start in range(0, row_count, batch_size):
+                count = min(batch_size, row_count - start)
+                batch = {}
+                for field in fields:
+                    data_type = field_data_type_pairs[field]
+                    if data_type == 'int' or data_type == 'float':
+                        values = array.array('q' if data_type == 'int' else 'd')
+                        values.frombytes(files[field].read(count * values.itemsize))
+                    elif data_type == 'bool':
+                        bitmap = files[field].read((count + 7) // 8)
+                        values = [bool(bitmap[i >> 3] >> (i & 7) & 1) for i in range(count)]
+                    elif data_type == 'str':
+                        end_offsets = array.array('Q')
+                        end_offsets.frombytes(files[field+'.offsets'].read(count * end_offsets.itemsize))
+                        blob = files[field].read(end_offsets[-1] - start_offsets[field])
+                        values = []
+                        begin = start_offsets[field]
+                        for end in end_offsets:
+                            values.append(blob[begin - start_offsets[field]:end - start_offsets[field]].decode())
+                            begin = end
+                        start_offsets[field] = end_offsets[-1]
+                    batch[field] = values
+                size = sum(f.tell() for f in files.values())
+                self.bytes_read += size - size_read
+                size_read = size
+                yield batch
+        finally:
+            for f in files.values():
+                f.close()
+
+
+#######################   storage end   #########################
+
+
+
+#######################   write-ahead log start   #########################
+
+
+    def wal_path(self, table_path: str) -> str:
+        '''
+        Get the write-ahead log of a table in JSONL storage.
+
+        Args:
+            table_path: str, where the table stores, e.g. databases/iris/Kind.jsonl.
+        
+        Returns:
+            wal_path: str, e.g. databases/iris/Kind.wal.jsonl.
+        '''
+        return os.path.splitext(table_path)[0] + '.wal.jsonl'
+
+
+    def read_wal(self, table_path: str) -> Dict[int, Optional[Dict]]:
+        '''
+        Read the committed entries of the write-ahead log of a table. The first line of the log records the inode of the table file
+        it belongs to, then every update or delete statement appends one entry per record, {"txn": t, "offset": o, "record": r}
+        (r is null for a deleted record), followed by {"commit": t}. Entries after the last commit were left by a crash partway
+        through a statement, so they are truncated; a log whose inode does not match the table file belongs to a table file
+        that compact_table has replaced, so it is removed.
+
+        Args:
+            table_path: str, where the table stores.
+        
+        Returns:
+            delta: Dict[int, Optional[Dict]], the latest record (None for a deleted record) by offset in the table file.
+        '''
+        wal_path = self.wal_path(table_path)
+        if not os.path.exists(wal_path):
+            return {}
+        stat = os.stat(wal_path)
+        key = (stat.st_size, stat.st_mtime_ns, os.stat(table_path).st_ino)
+        if table_path in self.table_path_wal_pairs and self.table_path_wal_pairs[table_path][0] == key:
+            return self.table_path_wal_pairs[table_path][1]
+        delta = {}
+        txn = 0
+        count = 0
+        pending = []
+        committed_size = 0
+        with open(wal_path, 'rb') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = None
+            if header is None or header['inode'] != os.stat(table_path).st_ino:
+                self.remove_wal(table_path)
+                return {}
+            committed_size = f.tell()
             for line in f:
-                record = json.loads(line.rstrip('\n'))
-                yield record
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                if 'commit' in entry:
+                    for offset, record in pending:
+                        delta[offset] = record
+                    count += len(pending)
+                    pending = []
+                    txn = entry['commit']
+                    committed_size = f.tell()
+                else:
+                    pending.append((entry['offset'], entry['record']))
+        if committed_size < stat.st_size:
+            os.truncate(wal_path, committed_size)
+            stat = os.stat(wal_path)
+            key = (stat.st_size, stat.st_mtime_ns, key[2])
+        self.table_path_wal_pairs[table_path] = (key, delta, txn, count)
+        return delta
+
+
+    def append_wal(self, table_name: str, offset_record_pairs: List[Tuple[int, Optional[Dict]]]) -> None:
+        '''
+        Append the updated records (None for deleted records) of one statement to the write-ahead log of a table as one transaction,
+        and sync it to disk. The log is compacted into the table file once it holds more entries than the memory budget.
+
+        Args:
+            table_name: str, the table that the records belong to.
+            offset_record_pairs: List[Tuple[int, Optional[Dict]]], the offsets of the records in the table file and their new records.
+        
+        Returns:
+            None.
+        '''
+        if not offset_record_pairs:
+            return
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        wal_path = self.wal_path(table_path)
+        delta = self.read_wal(table_path)
+        _, _, txn, count = self.table_path_wal_pairs.get(table_path, (None, delta, 0, 0))
+        txn += 1
+        with open(wal_path, 'a') as f:
+            if f.tell() == 0:
+                f.write(json.dumps({'inode': os.stat(table_path).st_ino})+'\n')
+            for offset, record in offset_record_pairs:
+                f.write(json.dumps({'txn': txn, 'offset': offset, 'record': record})+'\n')
+            f.write(json.dumps({'commit': txn})+'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        for offset, record in offset_record_pairs:
+            delta[offset] = record
+        count += len(offset_record_pairs)
+        stat = os.stat(wal_path)
+        self.table_path_wal_pairs[table_path] = ((stat.st_size, stat.st_mtime_ns, os.stat(table_path).st_ino), delta, txn, count)
+        if count > self.memory_budget:
+            self.compact_table(table_name)
+
+
+    def remove_wal(self, table_path: str) -> None:
+        '''
+        Remove the write-ahead log of a table if it exists.
 
+        Args:
+            table_path: str, where the table stores.
+        
+        Returns:
+            None.
+        '''
+        if os.path.exists(self.wal_path(table_path)):
+            os.remove(self.wal_path(table_path))
+        self.table_path_wal_pairs.pop(table_path, None)
 
-    def write_table(self, table: Generator, table_path: str) -> None:
+
+    def compact_table(self, table_name: str) -> None:
         '''
-        Write a table Generator to the file.
+        Fold the write-ahead log of a table in JSONL storage into the table file, rebuilding its indexes.
+        The new table file and index files are written next to the old ones first, then a journal of the renames that swap them in
+        is written, so that finish_compaction can complete the swap of all of them if a crash interrupts it.
 
         Args:
-            table: Generator.
-            table_path: str, where the table stores.
+            table_name: str, the table to be compacted.
         
         Returns:
-            None
+            None.
         '''
-        with open(table_path, 'w') as f:
-            for record in table:
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        if os.path.isdir(self.columns_path(table_path)) or not os.path.exists(self.wal_path(table_path)):
+            return
+        index_fields = self.table_name_index_fields_pairs.get(table_name, [])
+        index_key_offset_pairs = [[] for _ in index_fields]
+        offset = 0
+        source_target_pairs = [(table_path+'.compact', table_path)]
+        with open(table_path+'.compact', 'w') as f:
+            for record in self.read_table(table_path):
                 line = json.dumps(record) + '\n'
                 f.write(line)
-
-
-    def match_record(self, record: Dict[str, Union[int, float, bool, str]], conditions: List[Callable]) -> bool:
+                for field, key_offset_pairs in zip(index_fields, index_key_offset_pairs):
+                    key_offset_pairs.append([record[field], offset])
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        for field, key_offset_pairs in zip(index_fields, index_key_offset_pairs):
+            key_offset_pairs.sort(key=lambda x: x[0])
+            index_path = os.path.join('databases', self.database_name, f'{table_name}.{field}.index.jsonl')
+            with open(index_path+'.compact', 'w') as f:
+                for key_offset_pair in key_offset_pairs:
+                    f.write(json.dumps(key_offset_pair)+'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            source_target_pairs.append((index_path+'.compact', index_path))
+        journal_path = os.path.join('databases', self.database_name, table_name+'.compact.jsonl')
+        with open(journal_path+'.tmp', 'w') as f:
+            f.write(json.dumps(source_target_pairs)+'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(journal_path+'.tmp', journal_path)
+        self.finish_compaction(table_name)
+        for field, key_offset_pairs in zip(index_fields, index_key_offset_pairs):
+            self.table_name_field_index_pairs[(table_name, field)] = ([key for key, _ in key_offset_pairs], [offset for _, offset in key_offset_pairs])
+
+
+    def finish_compaction(self, table_name: str) -> None:
         '''
-        Judge whether a record matches all the conditions.
+        Swap the files written by compact_table into place as listed in its journal, skipping those already swapped, and remove
+        the write-ahead log and the journal. Without a journal, compact_table has either not started swapping or finished.
 
         Args:
-            record: Dict[str, Union[int, float, bool, str]], the record to be judged.
-            conditions: List[Callable], the conditions to judge the record.
+            table_name: str, the table being compacted.
         
         Returns:
-            match_result: bool, whether a record matches all the conditions.
+            None.
         '''
-        match_result = all([condition(record) for condition in conditions])
-        return match_result
+        journal_path = os.path.join('databases', self.database_name, table_name+'.compact.jsonl')
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, 'r') as f:
+            source_target_pairs = json.loads(next(f).rstrip('\n'))
+        for source, target in source_target_pairs:
+            if os.path.exists(source):
+                os.replace(source, target)
+        self.remove_wal(os.path.join('databases', self.database_name, table_name+'.jsonl'))
+        os.remove(journal_path)
+        for field in self.table_name_index_fields_pairs.get(table_name, []):
+            self.table_name_field_index_pairs.pop((table_name, field), None)
 
 
-#######################   tool end   #########################
+#######################   write-ahead log end   #########################
 
 
 
-#######################   table start   #########################
+#######################   result cache start   #########################
 
 
-    def create_table(self, table_name: str, field_data_type_pairs: Dict[str, str]) -> None:
+    def table_version(self, table_name: str) -> int:
         '''
-        Create a new table and update database's metadata.
+        Get the version of a table, which is bumped by every modification of the table.
 
         Args:
-            table_name: str, the name of the new table to be created.
-            field_data_type_pairs: Dict[str, str], the fields of the table and their corresponding data types.
+            table_name: str, the table.
         
         Returns:
-            None.
+            version: int, the version.
         '''
-        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
-        with open(table_path, 'w') as f:
-            pass
-        self.table_name_field_data_type_pairs_pairs[table_name] = field_data_type_pairs
-        with open(os.path.join('databases', self.database_name, 'metadata.jsonl'), 'w') as f:
-            f.write(json.dumps(self.table_name_field_data_type_pairs_pairs)+'\n')
+        return self.table_name_version_pairs.get(table_name, 0)
 
 
-    def drop_table(self, table_name: str) -> None:
+    def bump_table_version(self, table_name: str) -> None:
         '''
-        Drop an existing table and update database's metadata.
+        Bump the version of a modified table and evict the cached query results that read it.
 
         Args:
-            table_name: str, the name of the existing table to be dropped.
+            table_name: str, the modified table.
         
         Returns:
             None.
         '''
-        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
-        os.remove(table_path)
-        del self.table_name_field_data_type_pairs_pairs[table_name]
-        with open(os.path.join('databases', self.database_name, 'metadata.jsonl'), 'w') as f:
-            f.write(json.dumps(self.table_name_field_data_type_pairs_pairs)+'\n')
+        self.table_name_version_pairs[table_name] = self.table_version(table_name) + 1
+        for key in [key for key, (table_versions, _, _) in self.key_result_pairs.items() if table_name in dict(table_versions)]:
+            self.cache_size -= self.key_result_pairs.pop(key)[2]
 
 
-    def show_table_names(self) -> None:
+    def cache_table(self, key: Tuple, table_names: List[str], table_function: Callable, limit: Optional[int] = None) -> Generator:
         '''
-        Show available table names in current database.
+        Generate the result of a query from the result cache, or from table_function and store it in the cache once it is
+        generated to the end. Results are keyed by the query and the versions of the tables it reads, and the least recently
+        used results are evicted when there are more than cache_entries results or they are larger than cache_bytes.
+        The result of a query that ends with a limit of n records is complete once n records are generated, so it is stored
+        before the n-th record is generated, as readers such as show stop reading right after it.
 
         Args:
-            None.
+            key: Tuple, the normalized query, which includes the limit if there is one.
+            table_names: List[str], the tables that the query reads.
+            table_function: Callable, which returns a Generator of the query result when the result is not cached.
+            limit: Optional[int] = None, the number of records the query is limited to, None for no limit.
         
         Returns:
-            None.
+            table_out: Generator, which generate the records of the query result.
         '''
-        for table_name in self.table_name_field_data_type_pairs_pairs.keys():
-            print(table_name)
+        table_versions = tuple((table_name, self.table_version(table_name)) for table_name in sorted(set(table_names)))
+        key = (key, table_versions)
+        if key in self.key_result_pairs:
+            self.key_result_pairs.move_to_end(key)
+            yield from map(dict, self.key_result_pairs[key][1])
+            return
+        records = []
+        size = 0
+
+        def store() -> None:
+            if records is None or table_versions != tuple((table_name, self.table_version(table_name)) for table_name, _ in table_versions):
+                return
+            self.key_result_pairs[key] = (table_versions, records, size)
+            self.cache_size += size
+            while len(self.key_result_pairs) > self.cache_entries or self.cache_size > self.cache_bytes:
+                self.cache_size -= self.key_result_pairs.popitem(last=False)[1][2]
+
+        for record in table_function():
+            if records is not None:
+                size += len(json.dumps(record))
+                if size > self.cache_bytes:
+                    records = None
+                else:
+                    records.append(dict(record))
+                    if len(records) == limit:
+                        store()
+                        records = None
+            yield record
+        store()
 
 
-#######################   table end   #########################
+#######################   result cache end   #########################
 
 
 
@@ -150,14 +1542,119 @@ class Database:
             None.
         '''
         table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        self.adjust_statistics(table_name, 1, record)
+        self.bump_table_version(table_name)
+        if os.path.isdir(self.columns_path(table_path)):
+            self.write_columns(iter([record]), self.columns_path(table_path), self.table_name_field_data_type_pairs_pairs[table_name])
+            return
+        offset = os.path.getsize(table_path)
         with open(table_path, 'a') as f:
             line = json.dumps(record) + '\n'
             f.write(line)
+        for field in self.table_name_index_fields_pairs.get(table_name, []):
+            self.add_index_entry(table_name, field, record[field], offset)
+
+
+    def bulk_insert(self, table_name: str, table: Iterable[Dict[str, Union[int, float, bool, str]]]) -> int:
+        '''
+        Insert many records into a table at once. Records are validated and converted against the table's schema in batches,
+        written through a large buffer with the table file opened only once, and the indexes and statistics are updated once at the end.
+        If a record fails to convert, the table files are cut back to what they were, so a failed insert changes nothing.
+
+        Args:
+            table_name: str, the table to be inserted into.
+            table: Iterable[Dict[str, Union[int, float, bool, str]]], the records to insert.
+        
+        Returns:
+            count: int, the number of inserted records.
+        '''
+        table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
+        self.bump_table_version(table_name)
+        analyzed = table_name in self.table_name_statistics_pairs
+        field_min_pairs = {}
+        field_max_pairs = {}
+        count = 0
+
+        def track(batches: Generator) -> Generator:
+            nonlocal count
+            for batch in batches:
+                count += len(next(iter(batch.values())))
+                if analyzed:
+                    for field, values in batch.items():
+                        field_min_pairs[field] = min(values) if field not in field_min_pairs else min(field_min_pairs[field], min(values))
+                        field_max_pairs[field] = max(values) if field not in field_max_pairs else max(field_max_pairs[field], max(values))
+                yield batch
+
+        batches = track(self.convert_batches(table_name, iter(table)))
+        columns_path = self.columns_path(table_path)
+        if os.path.isdir(columns_path):
+            # the last byte of a bool column is rewritten when appending to it, so it is kept to be restored as well
+            path_size_tail_pairs = {}
+            for file_name in os.listdir(columns_path):
+                with open(os.path.join(columns_path, file_name), 'rb') as f:
+                    size = f.seek(0, os.SEEK_END)
+                    f.seek(max(size - 1, 0))
+                    path_size_tail_pairs[os.path.join(columns_path, file_name)] = (size, f.read(1))
+            try:
+                self.write_columns(self.unbatch_table(batches), columns_path, self.table_name_field_data_type_pairs_pairs[table_name], self.batch_size)
+            except Exception:
+                for file_name in os.listdir(columns_path):
+                    path = os.path.join(columns_path, file_name)
+                    if path not in path_size_tail_pairs:
+                        os.remove(path)
+                        continue
+                    size, tail = path_size_tail_pairs[path]
+                    with open(path, 'rb+') as f:
+                        f.truncate(size)
+                        f.seek(size - len(tail))
+                        f.write(tail)
+                raise
+        else:
+            index_fields = self.table_name_index_fields_pairs.get(table_name, [])
+            index_key_offset_pairs = [[] for _ in index_fields]
+            size = offset = os.path.getsize(table_path)
+            try:
+                with open(table_path, 'a', buffering=1 << 20) as f:
+                    for batch in batches:
+                        lines = [json.dumps(dict(zip(batch.keys(), values))) + '\n' for values in zip(*batch.values())]
+                        offsets = list(itertools.accumulate(map(len, lines), initial=offset))
+                        offset = offsets.pop()
+                        for field, key_offset_pairs in zip(index_fields, index_key_offset_pairs):
+                            key_offset_pairs.extend(zip(batch[field], offsets))
+                        f.write(''.join(lines))
+            except Exception:
+                os.truncate(table_path, size)
+                raise
+            for field, key_offset_pairs in zip(index_fields, index_key_offset_pairs):
+                with open(os.path.join('databases', self.database_name, f'{table_name}.{field}.index.jsonl'), 'a', buffering=1 << 20) as f:
+                    f.write(''.join(json.dumps(key_offset_pair)+'\n' for key_offset_pair in key_offset_pairs))
+                self.table_name_field_index_pairs.pop((table_name, field), None)
+        if count:
+            self.adjust_statistics(table_name, count, field_min_pairs, field_max_pairs)
+        return count
+
+
+    def load_table(self, table_name: str, file_path: str) -> int:
+        '''
+        Insert all the records of a CSV file (with a header line of field names) or a JSONL file into a table with bulk_insert.
+
+        Args:
+            table_name: str, the table to be inserted into.
+            file_path: str, the .csv or .jsonl file to load.
+        
+        Returns:
+            count: int, the number of inserted records.
+        '''
+        with open(file_path, 'r', newline='') as f:
+            if os.path.splitext(file_path)[1].lower() == '.csv':
+                return self.bulk_insert(table_name, csv.DictReader(f))
+            return self.bulk_insert(table_name, (json.loads(line) for line in f if line.strip()))
 
 
     def update_record(self, table_name: str, field_value_pairs: Dict[str, Union[int, float, bool, str]], conditions: List[Callable]) -> None:
         '''
         Update records matching all the conditions in a table.
+        For a JSONL table, the updated records are appended to the table's write-ahead log instead of rewriting the table.
 
         Args:
             table_name: str, the table to be updated records.
@@ -169,20 +1666,30 @@ class Database:
         '''
         table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
         table = self.read_table(table_path)
-        _, tmp_file_path = tempfile.mkstemp(prefix='update_record_', suffix='.jsonl', dir='tmp/', text=True)
-        with open(tmp_file_path, 'w') as f:
-            for record in table:
-                if self.match_record(record, conditions):
-                    for field, value in field_value_pairs.items():
-                        record[field] = value
-                line = json.dumps(record) + '\n'
-                f.write(line)
-        os.rename(tmp_file_path, table_path)
-                
+        self.adjust_statistics(table_name, 0, field_value_pairs)
+        self.bump_table_version(table_name)
+        if os.path.isdir(self.columns_path(table_path)):
+            predicate = self.compile_conditions(conditions)
+            table_update = ({**record, **field_value_pairs} if predicate(record) else record for record in table)
+            self.replace_columns(table_update, table_name)
+            return
+        predicate = self.compile_conditions(conditions)
+        offset_record_pairs = []
+        for offset, record in self.scan_table(table_path, delta=self.read_wal(table_path), with_offsets=True):
+            if predicate(record):
+                offset_record_pairs.append((offset, {**record, **field_value_pairs}))
+        # the index entries of the new values are synced before the transaction commits, and before append_wal may compact the
+        # table and move the offsets; an entry left by a crash before the commit is harmless, as index lookups check the records
+        for field in self.table_name_index_fields_pairs.get(table_name, []):
+            if field in field_value_pairs:
+                self.add_index_entries(table_name, field, [(field_value_pairs[field], offset) for offset, _ in offset_record_pairs])
+        self.append_wal(table_name, offset_record_pairs)
+
 
     def delete_record(self, table_name: str, conditions: List[Callable]) -> None:
         '''
         Delete records matching all the conditions in a table.
+        For a JSONL table, tombstones are appended to the table's write-ahead log instead of rewriting the table.
 
         Args:
             table_name: str, the table to be deleted records.
@@ -193,13 +1700,20 @@ class Database:
         '''
         table_path = os.path.join('databases', self.database_name, table_name+'.jsonl')
         table = self.read_table(table_path)
-        _, tmp_file_path = tempfile.mkstemp(prefix='delete_record_', suffix='.jsonl', dir='tmp/', text=True)
-        with open(tmp_file_path, 'w') as f:
-            for record in table:
-                if not self.match_record(record, conditions):
-                    line = json.dumps(record) + '\n'
-                    f.write(line)
-        os.rename(tmp_file_path, table_path)
+        self.bump_table_version(table_name)
+        if os.path.isdir(self.columns_path(table_path)):
+            predicate = self.compile_conditions(conditions)
+            row_count = self.read_row_count(self.columns_path(table_path))
+            self.replace_columns((record for record in table if not predicate(record)), table_name)
+            self.adjust_statistics(table_name, self.read_row_count(self.columns_path(table_path)) - row_count, {})
+            return
+        predicate = self.compile_conditions(conditions)
+        offset_record_pairs = []
+        for offset, record in self.scan_table(table_path, self.prefilter_needles(table_name, conditions), self.read_wal(table_path), True):
+            if predicate(record):
+                offset_record_pairs.append((offset, None))
+        self.append_wal(table_name, offset_record_pairs)
+        self.adjust_statistics(table_name, -len(offset_record_pairs), {})
 
 
 #######################   data modification end   #########################
@@ -247,8 +1761,9 @@ class Database:
         Returns:
             table_out: Generator, which generate records that match all the conditions.
         '''
+        predicate = self.compile_conditions(conditions)
         for record in table:
-            if self.match_record(record, conditions):
+            if predicate(record):
                 yield record
 
 
@@ -268,9 +1783,103 @@ class Database:
             yield record_project
 
 
+    def select_batches(self, batches: Generator, conditions: List[Callable]) -> Generator:
+        '''
+        Read a table as a Generator of batches, select records which match all of the conditions.
+        Each condition is evaluated on a whole column at a time, and only on the records that passed the previous conditions.
+
+        Args:
+            batches: Generator, which generate batches (dicts from field to a list / array of values).
+            conditions: List[Callable], conditions parsed by Engine.parser_condition.
+        
+        Returns:
+            table_out: Generator, which generate non-empty batches of records that match all the conditions.
+        '''
+        batch_conditions = [self.batch_condition(condition) for condition in conditions]
+        for batch in batches:
+            for batch_condition in batch_conditions:
+                mask = batch_condition(batch)
+                if not any(mask):
+                    break
+                if not all(mask):
+                    batch = self.filter_batch(batch, mask)
+            else:
+                yield batch
+
+
+    def project_batches(self, batches: Generator, fields: List[str]) -> Generator:
+        '''
+        Read a table as a Generator of batches, project the given fields of the records.
+
+        Args:
+            batches: Generator, which generate batches (dicts from field to a list / array of values).
+            fields: List[str], there are fields that we need in the list.
+        
+        Returns:
+            table_out: Generator, which generate batches that are projected.
+        '''
+        for batch in batches:
+            yield {field: batch[field] for field in fields}
+
+
+    def aggregate_batches(self, batches: Generator, aggregate_field_aggregate_function_pairs: Dict[str, str]) -> Dict[str, Union[int, float]]:
+        '''
+        Read a table as a Generator of batches, aggregate fields using built-in functions as reductions over whole columns.
+
+        Args:
+            batches: Generator, which generate batches (dicts from field to a list / array of values).
+            aggregate_field_aggregate_function_pairs: Dict[str, str], the fields needed to be aggregated and their corresponding functions ("sum", "count", "min", "max", "avg"; the other built-in aggregate functions go through group_by_and_aggregate).
+        
+        Returns:
+            record_aggregate: Dict[str, Union[int, float]], the result of each aggregation, None for min / max / avg of an empty table.
+        '''
+        sums = {field: 0 for field in aggregate_field_aggregate_function_pairs}
+        mins = {field: None for field in aggregate_field_aggregate_function_pairs}
+        maxs = {field: None for field in aggregate_field_aggregate_function_pairs}
+        count = 0
+        for batch in batches:
+            count += len(next(iter(batch.values())))
+            for field, function in aggregate_field_aggregate_function_pairs.items():
+                values = batch[field]
+                if function == 'sum' or function == 'avg':
+                    sums[field] += sum(values)
+                elif function == 'min':
+                    mins[field] = min(values) if mins[field] is None else min(mins[field], min(values))
+                elif function == 'max':
+                    maxs[field] = max(values) if maxs[field] is None else max(maxs[field], max(values))
+        record_aggregate = {}
+        for field, function in aggregate_field_aggregate_function_pairs.items():
+            if function == 'sum':
+                record_aggregate[field] = sums[field]
+            elif function == 'count':
+                record_aggregate[field] = count
+            elif function == 'min':
+                record_aggregate[field] = mins[field]
+            elif function == 'max':
+                record_aggregate[field] = maxs[field]
+            elif function == 'avg':
+                record_aggregate[field] = sums[field] / count if count else None
+        return record_aggregate
+
+
+    def unbatch_table(self, batches: Generator) -> Generator:
+        '''
+        Turn a Generator of batches back into a Generator of records.
+
+        Args:
+            batches: Generator, which generate batches (dicts from field to a list / array of values).
+        
+        Returns:
+            table_out: Generator, which generate records.
+        '''
+        for batch in batches:
+            for values in zip(*batch.values()):
+                yield dict(zip(batch.keys(), values))
+
+
     def cross_product(self, table_left: Generator, table_right: Generator) -> Generator:
         '''
-        Read two tables as Generators, do cross product between two tables.
+        Read two tables as Generators, do cross product between two tables with block_nested_loop_join.
 
         Args:
             table_left: Generator.
@@ -279,19 +1888,12 @@ class Database:
         Returns:
             table_out: Generator, each record is a possible combination of records from two input tables.
         '''
-        _, tmp_file_path = tempfile.mkstemp(prefix='cross_product_', suffix='.jsonl', dir='tmp/', text=True)
-        self.write_table(table_right, tmp_file_path)
-        for record_left in table_left:
-            table_right = self.read_table(tmp_file_path)
-            for record_right in table_right:
-                record_cross_product = {**record_left, **record_right}
-                yield record_cross_product
-        os.remove(tmp_file_path)
+        yield from self.block_nested_loop_join(table_left, table_right, [])
         
 
     def theta_inner_join(self, table_left: Generator, table_right: Generator, conditions: List[Callable]) -> Generator:
         '''
-        Read two tables as Generators, do theta inner join between two tables.
+        Read two tables as Generators, do theta inner join between two tables with block_nested_loop_join.
 
         Args:
             table_left: Generator.
@@ -301,76 +1903,520 @@ class Database:
         Returns:
             table_out: Generator, each record is a joined record which meets all of the conditions.
         '''
-        _, tmp_file_path = tempfile.mkstemp(prefix='theta_inner_join_', suffix='.jsonl', dir='tmp/', text=True)
-        self.write_table(table_right, tmp_file_path)
-        for record_left in table_left:
-            table_right = self.read_table(tmp_file_path)
-            for record_right in table_right:
-                record_theta_inner_join = {**record_left, **record_right}
-                if self.match_record(record_theta_inner_join, conditions): 
-                    yield record_theta_inner_join
-        os.remove(tmp_file_path)
+        yield from self.block_nested_loop_join(table_left, table_right, conditions)
+
+
+    def block_nested_loop_join(self, table_left: Generator, table_right: Generator, conditions: List[Callable]) -> Generator:
+        '''
+        Join every record of the left table with every record of the right table that meets all of the conditions.
+        If the right table fits in the memory budget, it is kept in memory as compact rows and the left table is read once.
+        Otherwise, the right table is written to a temp file through the buffer pool, the left table is read in blocks of memory
+        budget records (kept as compact rows), and the temp file is scanned once per block instead of once per left record; while
+        the temp file fits in the pool, its pages are never written to disk. Pairs are tested before their joined record is built.
+
+        Args:
+            table_left: Generator, the outer table.
+            table_right: Generator, the inner table.
+            conditions: List[Callable], only join two records when they meet all of the conditions.
+
+        Returns:
+            table_out: Generator, each record is a joined record which meets all of the conditions.
+        '''
+        table_right = iter(table_right)
+        records_right = list(itertools.islice(table_right, self.memory_budget + 1))
+        if len(records_right) <= self.memory_budget:
+            fields_right, rows_right = self.compact_records(records_right)
+            records_right = None
+            table_left = iter(table_left)
+            record_left = next(table_left, None)
+            if record_left is None or not rows_right:
+                return
+            predicate, join = self.compile_join_conditions(conditions, tuple(record_left), fields_right, compact_right=True)
+            for record_left in itertools.chain([record_left], table_left):
+                for row_right in rows_right:
+                    if predicate(record_left, row_right):
+                        yield join(record_left, row_right)
+            return
+        tmp_file_path = self.create_temp_file('block_nested_loop_join_')
+        try:
+            fields_right = tuple(records_right[0])
+            table_right = itertools.chain(records_right, table_right)
+            records_right = None
+            encode = self.temp_codec.encoder()
+            for records in iter(lambda: list(itertools.islice(table_right, self.batch_size)), []):
+                data = b''.join(map(encode, records))
+                self.buffer_pool.append(tmp_file_path, data)
+                self.bytes_written += len(data)
+            table_left = iter(table_left)
+            for records_left in iter(lambda: list(itertools.islice(table_left, self.memory_budget)), []):
+                fields_left, rows_left = self.compact_records(records_left)
+                records_left = None
+                predicate, join = self.compile_join_conditions(conditions, fields_left, fields_right, compact_left=True)
+                for record_right in self.read_temp(tmp_file_path):
+                    for row_left in rows_left:
+                        if predicate(row_left, record_right):
+                            yield join(row_left, record_right)
+        finally:
+            self.remove_temp_files([tmp_file_path])
+
+
+    def hash_inner_join(self, table_left: Generator, table_right: Generator, field_left: str, field_right: str, conditions: List[Callable], num_partitions: int = 16) -> Generator:
+        '''
+        Read two tables as Generators, do equi join (field_left == field_right) between two tables using hash join.
+        The right table is loaded into an in-memory hash table and probed with the left table. If the right table is larger
+        than the memory budget, both tables are partitioned into temp files by the join key (grace hash join), and each pair
+        of partitions is joined with the smaller partition as the build side.
+
+        Args:
+            table_left: Generator.
+            table_right: Generator.
+            field_left: str, the join key of the left table.
+            field_right: str, the join key of the right table.
+            conditions: List[Callable], other conditions that joined records should also meet.
+            num_partitions: int = 16, the number of partitions to use when the right table does not fit in memory.
+
+        Returns:
+            table_out: Generator, each record is a joined record which meets all of the conditions.
+        '''
+        yield from self.hash_join(table_right, table_left, field_right, field_left, False, conditions, num_partitions, 0)
+
+
+    def hash_join(self, table_build: Generator, table_probe: Generator, field_build: str, field_probe: str, build_is_left: bool, conditions: List[Callable], num_partitions: int, depth: int) -> Generator:
+        '''
+        Build a hash table of compact rows on one table and probe it with the other, spilling both tables to partitions when the build table does not fit in memory.
+
+        Args:
+            table_build: Generator, the table to build the hash table on.
+            table_probe: Generator, the table to probe the hash table with.
+            field_build: str, the join key of the build table.
+            field_probe: str, the join key of the probe table.
+            build_is_left: bool, whether the build table is the left table, which decides the field order of joined records.
+            conditions: List[Callable], other conditions that joined records should also meet.
+            num_partitions: int, the number of partitions to use when the build table does not fit in memory.
+            depth: int, how many times the tables have been partitioned.
+
+        Returns:
+            table_out: Generator, each record is a joined record which meets all of the conditions.
+        '''
+        table_build = iter(table_build)
+        records_build = list(itertools.islice(table_build, self.memory_budget + 1))
+        # after a few levels the partition is made of (almost) one key, so re-partitioning will not help
+        if len(records_build) <= self.memory_budget or depth >= 4:
+            records_build.extend(table_build)
+            fields_build, rows_build = self.compact_records(records_build)
+            records_build = None
+            hash_table = {}
+            position_build = fields_build.index(field_build) if rows_build else 0
+            for row_build in rows_build:
+                hash_table.setdefault(row_build[position_build], []).append(row_build)
+            rows_build = None
+            table_probe = iter(table_probe)
+            record_probe = next(table_probe, None)
+            if record_probe is None or not hash_table:
+                return
+            if build_is_left:
+                predicate, join = self.compile_join_conditions(conditions, fields_build, tuple(record_probe), compact_left=True)
+            else:
+                predicate, join = self.compile_join_conditions(conditions, tuple(record_probe), fields_build, compact_right=True)
+            for record_probe in itertools.chain([record_probe], table_probe):
+                for row_build in hash_table.get(record_probe[field_probe], ()):
+                    if build_is_left:
+                        if predicate(row_build, record_probe):
+                            yield join(row_build, record_probe)
+                    elif predicate(record_probe, row_build):
+                        yield join(record_probe, row_build)
+            return
+
+        table_build = itertools.chain(records_build, table_build)
+        records_build = None
+        tmp_file_paths_build, counts_build = self.partition_table(table_build, field_build, num_partitions, depth, 'hash_join_build_')
+        tmp_file_paths_probe = []
+        try:
+            tmp_file_paths_probe, counts_probe = self.partition_table(table_probe, field_probe, num_partitions, depth, 'hash_join_probe_')
+            for i in range(num_partitions):
+                if counts_build[i] and counts_probe[i]:
+                    partition_build = self.read_temp(tmp_file_paths_build[i])
+                    partition_probe = self.read_temp(tmp_file_paths_probe[i])
+                    if counts_build[i] <= counts_probe[i]:
+                        yield from self.hash_join(partition_build, partition_probe, field_build, field_probe, build_is_left, conditions, num_partitions, depth+1)
+                    else:
+                        yield from self.hash_join(partition_probe, partition_build, field_probe, field_build, not build_is_left, conditions, num_partitions, depth+1)
+                self.remove_temp_files([tmp_file_paths_build[i], tmp_file_paths_probe[i]])
+        finally:
+            self.remove_temp_files(tmp_file_paths_build + tmp_file_paths_probe)
+
+
+    def sort_merge_join(self, table_left: Generator, table_right: Generator, field_left: str, field_right: str, conditions: List[Callable], left_sorted: bool = False, right_sorted: bool = False, chunk_size: Optional[int] = None) -> Generator:
+        '''
+        Join two tables on field_left == field_right by sorting both of them on their join keys with sort_merge, then merging
+        them in one streaming pass. The records of the right table with the same key are kept in memory as compact rows while
+        they are joined with the records of the left table with that key.
 
+        Args:
+            table_left: Generator, the left table.
+            table_right: Generator, the right table.
+            field_left: str, the join key of the left table.
+            field_right: str, the join key of the right table.
+            conditions: List[Callable], other conditions that joined records should also meet.
+            left_sorted: bool = False, whether the left table is already in ascending order of field_left, so it is not sorted again.
+            right_sorted: bool = False, whether the right table is already in ascending order of field_right, so it is not sorted again.
+            chunk_size: Optional[int] = None, the size of each small table when sorting, None to choose it from the memory budget.
 
-    def aggregate(self, table: Generator, field: str, function: Callable) -> Union[int, float, bool, str]:
+        Returns:
+            table_out: Generator, each record is a joined record which meets all of the conditions.
+        '''
+        if not left_sorted:
+            table_left = self.sort_merge(table_left, field_left, True, chunk_size)
+        if not right_sorted:
+            table_right = self.sort_merge(table_right, field_right, True, chunk_size)
+        table_left, table_right = iter(table_left), iter(table_right)
+        try:
+            groups_right = itertools.groupby(table_right, key=operator.itemgetter(field_right))
+            group_right = next(groups_right, None)
+            rows_right = None
+            predicate = None
+            for key_left, records_left in itertools.groupby(table_left, key=operator.itemgetter(field_left)):
+                while group_right is not None and group_right[0] < key_left:
+                    group_right = next(groups_right, None)
+                    rows_right = None
+                if group_right is None:
+                    break
+                if group_right[0] != key_left:
+                    continue
+                if rows_right is None:
+                    fields_right, rows_right = self.compact_records(list(group_right[1]))
+                for record_left in records_left:
+                    if predicate is None:
+                        predicate, join = self.compile_join_conditions(conditions, tuple(record_left), fields_right, compact_right=True)
+                    for row_right in rows_right:
+                        if predicate(record_left, row_right):
+                            yield join(record_left, row_right)
+        finally:
+            # the sorts are closed whether or not they were read to the end, which removes their temp files
+            for table in (table_left, table_right):
+                if hasattr(table, 'close'):
+                    table.close()
+
+
+    def aggregate(self, table: Generator, field: str, function: Union[str, Callable]) -> Union[int, float, bool, str]:
         '''
         Read a table as a Generator, do the aggregation function on the field.
 
         Args:
             table: Generator.
             field: str, the field to be aggregated.
-            function: Callable, the aggregate function.
+            function: Union[str, Callable], a built-in aggregate function (see aggregate_initialize), or a lambda function used like functools.reduce.
         
         Returns:
             aggregate_result: Union[int, float, bool, str], the result of aggregation, usually a numeric value.
         '''
-        aggregate_result = reduce(function, (record[field] for record in table))
+        values = (record[field] for record in table)
+        state = self.aggregate_initialize(function, next(values))
+        for value in values:
+            state = self.aggregate_update(function, state, value)
+        aggregate_result = self.aggregate_result(function, state)
         return aggregate_result
 
 
-    def group_by_and_aggregate(self, table: Generator, group_by_fields: List[str], aggregate_field_aggregate_function_pairs: Dict[str, Callable]) -> Generator:
+    def is_builtin_aggregate(self, function: Union[str, Callable]) -> bool:
+        '''
+        Judge whether an aggregate function is a built-in one.
+
+        Args:
+            function: Union[str, Callable], the aggregate function.
+        
+        Returns:
+            is_builtin_aggregate: bool, whether it is "sum", "count", "min", "max", "avg", "count_distinct" or "percentile_<q>".
+        '''
+        if not isinstance(function, str):
+            return False
+        if function.startswith('percentile_'):
+            try:
+                return 0 <= float(function[len('percentile_'):]) <= 100
+            except ValueError:
+                return False
+        return function in ['sum', 'count', 'min', 'max', 'avg', 'count_distinct']
+
+
+    def aggregate_initialize(self, function: Union[str, Callable], value: Union[int, float, bool, str]) -> Union[int, float, bool, str, List, set]:
+        '''
+        Create the running state of an aggregate function from the first value of a group.
+        The built-in aggregate functions are "sum", "count", "min", "max", "avg", "count_distinct" (the number of distinct values)
+        and "percentile_<q>" (an approximate q-th percentile, e.g. "percentile_50" for the median, from a KLL-style sketch that
+        keeps fewer than 256 values per level, each value standing for twice as many values as one in the level below).
+
+        Args:
+            function: Union[str, Callable], a built-in aggregate function, or a lambda function used like functools.reduce.
+            value: Union[int, float, bool, str], the first value.
+        
+        Returns:
+            state: Union[int, float, bool, str, List, set], the running state.
+        '''
+        if function == 'count':
+            return 1
+        elif function == 'avg':
+            return [value, 1]
+        elif function == 'count_distinct':
+            return {value}
+        elif isinstance(function, str) and function.startswith('percentile_'):
+            return [[value]]
+        else:
+            return value
+
+
+    def aggregate_update(self, function: Union[str, Callable], state: Union[int, float, bool, str, List, set], value: Union[int, float, bool, str]) -> Union[int, float, bool, str, List, set]:
+        '''
+        Update the running state of an aggregate function with a new value.
+
+        Args:
+            function: Union[str, Callable], a built-in aggregate function, or a lambda function used like functools.reduce.
+            state: Union[int, float, bool, str, List, set], the running state.
+            value: Union[int, float, bool, str], the new value.
+        
+        Returns:
+            state: Union[int, float, bool, str, List, set], the updated running state.
+        '''
+        if function == 'sum':
+            return state + value
+        elif function == 'count':
+            return state + 1
+        elif function == 'min':
+            return min(state, value)
+        elif function == 'max':
+            return max(state, value)
+        elif function == 'avg':
+            state[0] += value
+            state[1] += 1
+            return state
+        elif function == 'count_distinct':
+            state.add(value)
+            return state
+        elif isinstance(function, str) and function.startswith('percentile_'):
+            state[0].append(value)
+            return self.compact_sketch(state) if len(state[0]) >= 256 else state
+        else:
+            return function(state, value)
+
+
+    def aggregate_merge(self, function: Union[str, Callable], state: Union[int, float, bool, str, List, set], state_other: Union[int, float, bool, str, List, set]) -> Union[int, float, bool, str, List, set]:
+        '''
+        Merge two running states of an aggregate function computed over different records of the same group, e.g. from
+        different partitions or workers. Lambda functions are applied to the two states, so they must be associative.
+
+        Args:
+            function: Union[str, Callable], a built-in aggregate function, or a lambda function used like functools.reduce.
+            state: Union[int, float, bool, str, List, set], a running state.
+            state_other: Union[int, float, bool, str, List, set], another running state.
+        
+        Returns:
+            state: Union[int, float, bool, str, List, set], the merged running state.
+        '''
+        if function in ['sum', 'count']:
+            return state + state_other
+        elif function == 'min':
+            return min(state, state_other)
+        elif function == 'max':
+            return max(state, state_other)
+        elif function == 'avg':
+            return [state[0] + state_other[0], state[1] + state_other[1]]
+        elif function == 'count_distinct':
+            state |= state_other
+            return state
+        elif isinstance(function, str) and function.startswith('percentile_'):
+            for level, values in enumerate(state_other):
+                if level == len(state):
+                    state.append([])
+                state[level].extend(values)
+            return self.compact_sketch(state)
+        else:
+            return function(state, state_other)
+
+
+    def compact_sketch(self, state: List[List]) -> List[List]:
+        '''
+        Compact the levels of a percentile sketch that hold 256 values or more: the values of such a level are sorted and every
+        other one is moved up a level, where it stands for two values.
+
+        Args:
+            state: List[List], the levels of the sketch, from the lowest.
+        
+        Returns:
+            state: List[List], the compacted sketch.
+        '''
+        for level in range(len(state)):
+            if len(state[level]) < 256:
+                continue
+            values = sorted(state[level])
+            # keep the odd one out at this level, and alternate which half moves up so that the error does not drift one way
+            state[level] = [values.pop()] if len(values) % 2 else []
+            if level + 1 == len(state):
+                state.append([])
+            state[level + 1].extend(values[(level + len(state[level + 1])) % 2::2])
+        return state
+
+
+    def aggregate_result(self, function: Union[str, Callable], state: Union[int, float, bool, str, List, set]) -> Union[int, float, bool, str]:
+        '''
+        Turn the running state of an aggregate function into its result.
+
+        Args:
+            function: Union[str, Callable], a built-in aggregate function, or a lambda function used like functools.reduce.
+            state: Union[int, float, bool, str, List, set], the running state.
+        
+        Returns:
+            aggregate_result: Union[int, float, bool, str], the result of aggregation.
+        '''
+        if function == 'avg':
+            return state[0] / state[1]
+        elif function == 'count_distinct':
+            return len(state)
+        elif isinstance(function, str) and function.startswith('percentile_'):
+            value_weight_pairs = sorted((value, 2 ** level) for level, values in enumerate(state) for value in values)
+            target = float(function[len('percentile_'):]) / 100 * sum(weight for _, weight in value_weight_pairs)
+            cumulative_weight = 0
+            for value, weight in value_weight_pairs:
+                cumulative_weight += weight
+                if cumulative_weight >= target:
+                    return value
+            return value_weight_pairs[-1][0]
+        else:
+            return state
+
+
+    def group_by_and_aggregate(self, table: Generator, group_by_fields: List[str], aggregate_field_aggregate_function_pairs: Dict[str, Union[str, Callable]], num_partitions: int = 16, depth: int = 0) -> Generator:
         '''
         Read a table as a Generator, group it by a list of fields used for group, then aggregate fields using corresponding functions.
+        All the aggregate functions are computed in one pass, with each group keeping running states of them in memory
+        (hash aggregation). Once there are more groups than the memory budget, the running states of all the groups are
+        spilled to temp files partitioned by group, and the partial states of each group are merged afterwards.
 
         Args:
         table: Generator
         group_by_fields: List[str], the fields used for group
-        aggregate_field_aggregate_function_pairs: Dict[str, Callable], the fields needed to be aggregated and their corresponding functions.
+        aggregate_field_aggregate_function_pairs: Dict[str, Union[str, Callable]], the fields needed to be aggregated and their corresponding functions (built-in aggregate functions, see aggregate_initialize, or lambda functions used like functools.reduce).
+        num_partitions: int = 16, the number of temp files to spill to when there are too many groups.
+        depth: int = 0, how many times the running states have been spilled.
 
         Returns:
             table_out: Generator, each record is a result of group by and aggregate.
 
         '''
-        group_str_tmp_file_path_pairs = {}
-        for record in table:
-            group = {}
-            for group_by_field in group_by_fields:
-                group[group_by_field] = record[group_by_field]
-            group_str = json.dumps(group)
-            try:
-                tmp_file_path = group_str_tmp_file_path_pairs[group_str]
-            except KeyError:
-                _, tmp_file_path = tempfile.mkstemp(prefix=f'group_by_and_aggregate_{group_str}_', suffix='.jsonl', dir='tmp', text=True)
-                group_str_tmp_file_path_pairs[group_str] = tmp_file_path
-            with open(tmp_file_path, 'a') as f:
-                line = json.dumps(record) + '\n'
-                f.write(line)
-        
-        for group_str, tmp_file_path in group_str_tmp_file_path_pairs.items():
-            group = json.loads(group_str)
-            aggregate_field_aggregate_result_pairs = {}
-            for aggregate_field, aggregate_function in aggregate_field_aggregate_function_pairs.items():
-                table_group = self.read_table(tmp_file_path)
-                aggregate_result = self.aggregate(table_group, aggregate_field, aggregate_function)
-                aggregate_field_aggregate_result_pairs[aggregate_field] = aggregate_result
-            record_group_by_and_aggregate = {**group, **aggregate_field_aggregate_result_pairs}
-            yield record_group_by_and_aggregate
-            os.remove(tmp_file_path)
+        if not group_by_fields and all(function in ['sum', 'count', 'min', 'max', 'avg'] for function in aggregate_field_aggregate_function_pairs.values()):
+            batches = self.batch_table(table, self.batch_size)
+            batch = next(batches, None)
+            # no records make no groups, as in hash aggregation below
+            if batch is None:
+                return
+            yield self.aggregate_batches(itertools.chain([batch], batches), aggregate_field_aggregate_function_pairs)
+            return
+        aggregate_fields = list(aggregate_field_aggregate_function_pairs)
+        aggregate_functions = list(aggregate_field_aggregate_function_pairs.values())
+        group_states_pairs = {}
+        spill_file_paths = []
+        try:
+            for record in table:
+                group = tuple(record[group_by_field] for group_by_field in group_by_fields)
+                try:
+                    states = group_states_pairs[group]
+                except KeyError:
+                    if len(group_states_pairs) >= self.memory_budget:
+                        spill_file_paths = self.spill_states(group_states_pairs, aggregate_functions, num_partitions, depth, spill_file_paths)
+                        group_states_pairs = {}
+                    group_states_pairs[group] = [self.aggregate_initialize(aggregate_function, record[aggregate_field]) for aggregate_field, aggregate_function in zip(aggregate_fields, aggregate_functions)]
+                    continue
+                for i, (aggregate_field, aggregate_function) in enumerate(zip(aggregate_fields, aggregate_functions)):
+                    states[i] = self.aggregate_update(aggregate_function, states[i], record[aggregate_field])
+            yield from self.aggregate_states(group_states_pairs, group_by_fields, aggregate_field_aggregate_function_pairs, num_partitions, depth, spill_file_paths)
+        finally:
+            self.remove_temp_files(spill_file_paths)
+
+
+    def spill_states(self, group_states_pairs: Dict[Tuple, List], aggregate_functions: List[Union[str, Callable]], num_partitions: int, depth: int, spill_file_paths: List[str]) -> List[str]:
+        '''
+        Append the running states of groups to temp files (encoded with the temp codec) partitioned by group, one [group, states] record per group.
+
+        Args:
+            group_states_pairs: Dict[Tuple, List], the running states of each group.
+            aggregate_functions: List[Union[str, Callable]], the aggregate functions of the states.
+            num_partitions: int, the number of temp files.
+            depth: int, how many times the running states have been spilled, which changes how groups are partitioned.
+            spill_file_paths: List[str], the temp files to append to, empty to create them.
+
+        Returns:
+            spill_file_paths: List[str], the temp files.
+        '''
+        if not spill_file_paths:
+            for _ in range(num_partitions):
+                spill_file_paths.append(self.create_temp_file('group_by_and_aggregate_'))
+        spill_files = [open(tmp_file_path, 'ab') for tmp_file_path in spill_file_paths]
+        sizes = [f.tell() for f in spill_files]
+        encoders = [self.temp_codec.encoder(size > 0) for size in sizes]
+        for group, states in group_states_pairs.items():
+            states = [list(state) if aggregate_function == 'count_distinct' else state for aggregate_function, state in zip(aggregate_functions, states)]
+            i = hash((depth, group)) % num_partitions
+            spill_files[i].write(encoders[i]([list(group), states]))
+        for f, size in zip(spill_files, sizes):
+            self.bytes_written += f.tell() - size
+            f.close()
+        return spill_file_paths
+
+
+    def aggregate_states(self, group_states_pairs: Dict[Tuple, List], group_by_fields: List[str], aggregate_field_aggregate_function_pairs: Dict[str, Union[str, Callable]], num_partitions: int, depth: int, spill_file_paths: List[str]) -> Generator:
+        '''
+        Generate the result of each group from its running states. If running states have been spilled, the ones in memory
+        are spilled too, and then the partial states of the groups in each temp file are merged (spilling again, partitioned
+        differently, if a temp file has more groups than the memory budget).
+
+        Args:
+            group_states_pairs: Dict[Tuple, List], the running states of each group in memory.
+            group_by_fields: List[str], the fields used for group.
+            aggregate_field_aggregate_function_pairs: Dict[str, Union[str, Callable]], the fields needed to be aggregated and their corresponding functions.
+            num_partitions: int, the number of temp files to spill to when there are too many groups.
+            depth: int, how many times the running states have been spilled.
+            spill_file_paths: List[str], the temp files that running states have been spilled to, empty if none.
+
+        Returns:
+            table_out: Generator, each record is a result of group by and aggregate.
+        '''
+        aggregate_fields = list(aggregate_field_aggregate_function_pairs)
+        aggregate_functions = list(aggregate_field_aggregate_function_pairs.values())
+        if not spill_file_paths:
+            for group, states in group_states_pairs.items():
+                record_group_by_and_aggregate = dict(zip(group_by_fields, group))
+                for aggregate_field, aggregate_function, state in zip(aggregate_fields, aggregate_functions, states):
+                    record_group_by_and_aggregate[aggregate_field] = self.aggregate_result(aggregate_function, state)
+                yield record_group_by_and_aggregate
+            return
+        spill_file_paths_partition = []
+        try:
+            self.spill_states(group_states_pairs, aggregate_functions, num_partitions, depth, spill_file_paths)
+            group_states_pairs = None
+            for tmp_file_path in spill_file_paths:
+                group_states_pairs_partition = {}
+                spill_file_paths_partition = []
+                for group, states in self.read_temp(tmp_file_path):
+                    group = tuple(group)
+                    states = [set(state) if aggregate_function == 'count_distinct' else state for aggregate_function, state in zip(aggregate_functions, states)]
+                    states_partition = group_states_pairs_partition.get(group)
+                    if states_partition is None:
+                        if len(group_states_pairs_partition) >= self.memory_budget:
+                            spill_file_paths_partition = self.spill_states(group_states_pairs_partition, aggregate_functions, num_partitions, depth+1, spill_file_paths_partition)
+                            group_states_pairs_partition = {}
+                        group_states_pairs_partition[group] = states
+                        continue
+                    for i, aggregate_function in enumerate(aggregate_functions):
+                        states_partition[i] = self.aggregate_merge(aggregate_function, states_partition[i], states[i])
+                self.remove_temp_files([tmp_file_path])
+                yield from self.aggregate_states(group_states_pairs_partition, group_by_fields, aggregate_field_aggregate_function_pairs, num_partitions, depth+1, spill_file_paths_partition)
+        finally:
+            self.remove_temp_files(spill_file_paths + spill_file_paths_partition)
 
 
     def sort(self, table: Generator, sort_field: str, ascending: bool, chunk_size: int) -> List[str]:
         '''
-        Split table into small tables, sort them separately and store them to temp files.
+        Split table into small tables, sort them separately and store them to temp files (encoded with the temp codec).
+        With more than one worker, small tables are sorted and written by worker processes while the next ones are read,
+        with at most one small table per worker in flight.
 
         Args:
             table: Generator, the large table to be sorted.
@@ -381,133 +2427,207 @@ class Database:
         Returns:
             tmp_file_paths: List[str], the path where temp files of sorted small tables store.
         '''
-        count = 0
-        current_run = []
+        table = iter(table)
         tmp_file_paths = []
-        for record in table:
-            count += 1
-            current_run.append(record)
-            if count % chunk_size == 0:
-                if ascending:
-                    current_run = sorted(current_run, key=lambda x: x[sort_field])
-                else:
-                    current_run = sorted(current_run, key=lambda x: x[sort_field], reverse=True)
-                _, tmp_file_path = tempfile.mkstemp(prefix='sort_', suffix='.jsonl', dir='tmp', text=True)
-                self.write_table(current_run, tmp_file_path)
-                current_run = []
+        futures = collections.deque()
+        try:
+            for current_run in iter(lambda: list(itertools.islice(table, chunk_size)), []):
+                tmp_file_path = self.create_temp_file('sort_')
                 tmp_file_paths.append(tmp_file_path)
-        if current_run:
-            if ascending:
-                current_run = sorted(current_run, key=lambda x: x[sort_field])
-            else:
-                current_run = sorted(current_run, key=lambda x: x[sort_field], reverse=True)
-            _, tmp_file_path = tempfile.mkstemp(prefix='sort_', suffix='.jsonl', dir='tmp', text=True)
-            self.write_table(current_run, tmp_file_path)
-            current_run = []
-            tmp_file_paths.append(tmp_file_path)
+                if self.workers > 1:
+                    futures.append(self.open_pool().submit(sort_run, current_run, sort_field, ascending, tmp_file_path, self.temp_codec))
+                    if len(futures) >= self.workers:
+                        self.bytes_written += futures.popleft().result()
+                else:
+                    self.bytes_written += sort_run(current_run, sort_field, ascending, tmp_file_path, self.temp_codec)
+            for future in futures:
+                self.bytes_written += future.result()
+        except BaseException:
+            concurrent.futures.wait(futures)
+            self.remove_temp_files(tmp_file_paths)
+            raise
         return tmp_file_paths
 
 
-    def merge(self, tmp_file_path_1: str, tmp_file_path_2: str, sort_field: str, ascending: bool) -> str:
+    def top_n(self, table: Generator, sort_field: str, ascending: bool, n: int) -> Generator:
         '''
-        Merge 2 small tables into one large table in order and store it.
+        Generate the first n records of a table in sorted order, keeping only n records in a heap and no temp files.
+        Records with the same key keep their order in the table, as in sort_merge.
 
         Args:
-            tmp_file_path_1: str, the path where small table 1 stores.
-            tmp_file_path_2: str, the path where small table 2 stores.
+            table: Generator, the table to be sorted.
             sort_field: str, the key of sorting.
             ascending: bool, determine whether sorting in ascending or descending order.
+            n: int, the number of records.
         
         Returns:
-            tmp_file_path_merge: the path where merged table stores.
-        '''
-        run_1 = self.read_table(tmp_file_path_1)
-        run_2 = self.read_table(tmp_file_path_2)
-        _, tmp_file_path_merge = tempfile.mkstemp(prefix='merge_', suffix='.jsonl', dir='tmp', text=True)
-        with open(tmp_file_path_merge, 'w') as f:
-            record_1 = next(run_1)
-            record_2 = next(run_2)
-            while True:
-                if ascending:
-                    if record_1[sort_field] <= record_2[sort_field]:
-                        line = json.dumps(record_1) + '\n'
-                        f.write(line)
-                        try:
-                            record_1 = next(run_1)
-                        except:
-                            line = json.dumps(record_2) + '\n'
-                            f.write(line)
-                            for record_2 in run_2:
-                                line = json.dumps(record_2) + '\n'
-                                f.write(line)
-                            break
-                    else:
-                        line = json.dumps(record_2) + '\n'
-                        f.write(line)
-                        try:
-                            record_2 = next(run_2)
-                        except:
-                            line = json.dumps(record_1) + '\n'
-                            f.write(line)
-                            for record_1 in run_1:
-                                line = json.dumps(record_1) + '\n'
-                                f.write(line)
-                            break
-                else:
-                    if record_1[sort_field] >= record_2[sort_field]:
-                        line = json.dumps(record_1) + '\n'
-                        f.write(line)
-                        try:
-                            record_1 = next(run_1)
-                        except:
-                            line = json.dumps(record_2) + '\n'
-                            f.write(line)
-                            for record_2 in run_2:
-                                line = json.dumps(record_2) + '\n'
-                                f.write(line)
-                            break
-                    else:
-                        line = json.dumps(record_2) + '\n'
-                        f.write(line)
-                        try:
-                            record_2 = next(run_2)
-                        except:
-                            line = json.dumps(record_1) + '\n'
-                            f.write(line)
-                            for record_1 in run_1:
-                                line = json.dumps(record_1) + '\n'
-                                f.write(line)
-                            break
-        os.remove(tmp_file_path_1)
-        os.remove(tmp_file_path_2)
-        return tmp_file_path_merge
-
-
-    def sort_merge(self, table: Generator, sort_field: str, ascending: bool, chunk_size: int) -> Generator:
+            table_out: Generator, the first n records of the sorted table.
+        '''
+        if ascending:
+            yield from heapq.nsmallest(n, table, key=operator.itemgetter(sort_field))
+        else:
+            yield from heapq.nlargest(n, table, key=operator.itemgetter(sort_field))
+
+
+    def limit(self, table: Generator, n: int) -> Generator:
+        '''
+        Generate the first n records of a table, and then close the table so that the scans under it stop early.
+
+        Args:
+            table: Generator.
+            n: int, the number of records.
+        
+        Returns:
+            table_out: Generator, the first n records.
+        '''
+        table = iter(table)
+        try:
+            yield from itertools.islice(table, n)
+        finally:
+            if hasattr(table, 'close'):
+                table.close()
+
+
+    def merge(self, tmp_file_paths: List[str], sort_field: str, ascending: bool) -> Generator:
+        '''
+        Merge sorted small tables into one large table in order using a heap (k-way merge), and remove them afterwards,
+        or when the merge is closed early.
+
+        Args:
+            tmp_file_paths: List[str], the paths where sorted small tables store.
+            sort_field: str, the key of sorting.
+            ascending: bool, determine whether sorting in ascending or descending order.
+        
+        Returns:
+            table_out: Generator, the merged table.
+        '''
+        runs = [self.read_temp(tmp_file_path) for tmp_file_path in tmp_file_paths]
+        merged = heapq.merge(*runs, key=lambda x: x[sort_field], reverse=not ascending)
+        try:
+            yield from merged
+        finally:
+            merged.close()
+            for run in runs:
+                run.close()
+            self.remove_temp_files(tmp_file_paths)
+
+
+    def sort_merge(self, table: Generator, sort_field: str, ascending: bool, chunk_size: Optional[int] = None, max_open_files: int = 64) -> Generator:
         '''
         Sort a large table using merge-sort.
+        If there are more sorted small tables than max_open_files, they are merged group by group into larger temp files
+        first (by worker processes in parallel when there is more than one worker), until all the remaining ones can be
+        merged in one pass straight to the output.
 
         Args:
             table: Generator, the large table to be sorted.
             sort_field: str, the key of sorting.
             ascending: bool, determine whether sorting in ascending or descending order.
-            chunk_size: int, the size of each small table.
+            chunk_size: Optional[int] = None, the size of each small table, None to split the memory budget between the
+                small tables being sorted at the same time.
+            max_open_files: int = 64, the maximum number of small tables to merge at the same time.
         
         Returns:
             table_out: Generator, the sorted large table.
         '''
+        if chunk_size is None:
+            chunk_size = max(self.memory_budget // (self.workers + 1), 1)
         tmp_file_paths = self.sort(table, sort_field, ascending, chunk_size)
-        current_tmp_file_path = tmp_file_paths[0]
-        for tmp_file_path in tmp_file_paths[1:]:
-            current_tmp_file_path = self.merge(current_tmp_file_path, tmp_file_path, sort_field, ascending)
-        table_sort_merge = self.read_table(current_tmp_file_path)
-        for record_sort_merge in table_sort_merge:
-            yield record_sort_merge
-        os.remove(current_tmp_file_path)
+        tmp_file_paths_merge = []
+        try:
+            while len(tmp_file_paths) > max_open_files:
+                tmp_file_paths_merge = []
+                futures = []
+                for i in range(0, len(tmp_file_paths), max_open_files):
+                    tmp_file_path_merge = self.create_temp_file('merge_')
+                    tmp_file_paths_merge.append(tmp_file_path_merge)
+                    if self.workers > 1:
+                        futures.append(self.open_pool().submit(merge_runs, tmp_file_paths[i:i+max_open_files], sort_field, ascending, tmp_file_path_merge))
+                    else:
+                        self.write_temp(self.merge(tmp_file_paths[i:i+max_open_files], sort_field, ascending), tmp_file_path_merge)
+                for future in futures:
+                    self.bytes_written += future.result()
+                tmp_file_paths = tmp_file_paths_merge
+            yield from self.merge(tmp_file_paths, sort_field, ascending)
+        finally:
+            self.remove_temp_files(tmp_file_paths + tmp_file_paths_merge)
 
 
 #######################   data query end   #########################
 
 
 
-
+worker_database = None
+
+
+def initialize_worker(database_name: str, temp_codec: str) -> None:
+    '''
+    Load the database in a worker process of parallel scans and sorts.
+
+    Args:
+        database_name: str, the name of the database.
+        temp_codec: str, the temp codec of the database, so that workers read and write the same temp files.
+    
+    Returns:
+        None.
+    '''
+    global worker_database
+    worker_database = Database(database_name, temp_codec=temp_codec)
+
+
+def scan_range(table_path: str, byte_range: Tuple[int, int], text_expression_pairs: List[Tuple], needles: List[bytes], fields: Optional[List[str]]) -> List[Dict]:
+    '''
+    Select and project the records in a byte range of a table file, in a worker process of Database.parallel_scan.
+
+    Args:
+        table_path: str, where the table stores.
+        byte_range: Tuple[int, int], the (start, end) byte offsets of the range, at line boundaries.
+        text_expression_pairs: List[Tuple], the text and expression of each condition.
+        needles: List[bytes], byte strings that a line must contain to be decoded, from Database.prefilter_needles.
+        fields: Optional[List[str]], the fields to keep, None for all fields.
+    
+    Returns:
+        table_out: List[Dict], the records in the range that match all the conditions.
+    '''
+    conditions = [types.SimpleNamespace(text=text, expression=expression) for text, expression in text_expression_pairs]
+    predicate = worker_database.compile_conditions(conditions)
+    table = worker_database.scan_table(table_path, needles, worker_database.read_wal(table_path), False, byte_range)
+    if fields is None:
+        return [record for record in table if predicate(record)]
+    return [{field: record[field] for field in fields} for record in table if predicate(record)]
+
+
+def sort_run(table: List[Dict], sort_field: str, ascending: bool, tmp_file_path: str, temp_codec: Union[JsonlCodec, MarshalCodec]) -> int:
+    '''
+    Sort a small table and write it to a temp file, in the current process or a worker process of Database.sort.
+
+    Args:
+        table: List[Dict], the small table.
+        sort_field: str, the key of sorting.
+        ascending: bool, determine whether sorting in ascending or descending order.
+        tmp_file_path: str, the temp file.
+        temp_codec: Union[JsonlCodec, MarshalCodec], the codec to encode the records with.
+    
+    Returns:
+        size: int, the number of bytes written.
+    '''
+    table.sort(key=operator.itemgetter(sort_field), reverse=not ascending)
+    with open(tmp_file_path, 'wb') as f:
+        f.write(b''.join(map(temp_codec.encoder(), table)))
+        return f.tell()
+
+
+def merge_runs(tmp_file_paths: List[str], sort_field: str, ascending: bool, tmp_file_path_merge: str) -> int:
+    '''
+    Merge sorted small tables into a temp file and remove them, in a worker process of Database.sort_merge.
+
+    Args:
+        tmp_file_paths: List[str], the paths where sorted small tables store.
+        sort_field: str, the key of sorting.
+        ascending: bool, determine whether sorting in ascending or descending order.
+        tmp_file_path_merge: str, the temp file of the merged table.
+    
+    Returns:
+        size: int, the number of bytes written.
+    '''
+    return worker_database.write_temp(worker_database.merge(tmp_file_paths, sort_field, ascending), tmp_file_path_merge)
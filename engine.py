@@ -1,14 +1,19 @@
 import json
-from typing import List, Callable, Dict, Union
+from typing import List, Callable, Dict, Union, Optional, Tuple
+import operator
 import os
+import re
 import shutil
 from database import Database
+from planner import Planner
 
 
 
 class Engine:
-    def __init__(self) -> None:
+    def __init__(self, workers: int = 1) -> None:
         self.current_database = None
+        self.workers = workers
+        self.text_condition_pairs = {}
 
 
 
@@ -69,7 +74,9 @@ class Engine:
         Returns:
             None.
         '''
-        self.current_database = Database(database_name)
+        if self.current_database is not None:
+            self.current_database.close_pool()
+        self.current_database = Database(database_name, workers=self.workers)
 
 
 #######################   database end   #########################
@@ -87,6 +94,8 @@ class Engine:
         while True:
             response = input('>>>Chenning_DBMS: Please enter which function about database do you want to use? Options include: "1" for "create database", "2" for "drop database", "3" for "show database names", "4" for "use database". Enter "exit" to finish process.\nYour input: ')
             if response == 'exit':
+                if self.current_database is not None:
+                    self.current_database.close_pool()
                 shutil.rmtree('tmp')
                 return
             self.parser_database(response)
@@ -115,8 +124,8 @@ class Engine:
             if response == 'exit':
                 return
             database_name = response
-            self.current_database = Database(database_name)
-            response = input('>>>Chenning_DBMS: Please enter which function about table do you want to use? Options include: "1" for "create table", "2" for "drop table", "3" for "show table names", "4" for "use table". Enter "exit" to return to main menu.\nYour input: ')
+            self.use_database(database_name)
+            response = input('>>>Chenning_DBMS: Please enter which function about table do you want to use? Options include: "1" for "create table", "2" for "drop table", "3" for "show table names", "4" for "use table", "5" for "create index", "6" for "drop index", "7" for "convert table storage", "8" for "analyze table", "9" for "compact table". Enter "exit" to return to main menu.\nYour input: ')
             if response == 'exit':
                 return
             self.parser_table(response)
@@ -145,11 +154,60 @@ class Engine:
             self.current_database.show_table_names()
 
         elif response == '4':
-            response = input('>>>Chenning_DBMS: Please enter which function about record do you want to use? Options include: "1" for "insert record", "2" for "update record", "3" for "delete record", "4" for "query record". Enter "exit" to return to main menu.\nYour input: ')
+            response = input('>>>Chenning_DBMS: Please enter which function about record do you want to use? Options include: "1" for "insert record", "2" for "update record", "3" for "delete record", "4" for "query record", "5" for "load records". Enter "exit" to return to main menu.\nYour input: ')
             if response == 'exit':
                 return
             self.parser_record(response)
 
+        elif response == '5':
+            response = input('>>>Chenning_DBMS: Please enter the name of the table you want to create index on. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            table_name = response
+            response = input('>>>Chenning_DBMS: Please enter the field you want to create index on. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            field = response
+            self.current_database.create_index(table_name, field)
+
+        elif response == '6':
+            response = input('>>>Chenning_DBMS: Please enter the name of the table you want to drop index from. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            table_name = response
+            response = input('>>>Chenning_DBMS: Please enter the field whose index you want to drop. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            field = response
+            self.current_database.drop_index(table_name, field)
+
+        elif response == '7':
+            response = input('>>>Chenning_DBMS: Please enter the name of the table you want to convert storage. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            table_name = response
+            response = input('>>>Chenning_DBMS: Please enter the storage you want to convert to. Enter "c" for columnar storage. Enter "j" for JSONL storage. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            elif response == 'c':
+                self.current_database.convert_table_storage(table_name, 'columnar')
+            elif response == 'j':
+                self.current_database.convert_table_storage(table_name, 'jsonl')
+
+        elif response == '8':
+            response = input('>>>Chenning_DBMS: Please enter the name of the table you want to analyze. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            table_name = response
+            self.current_database.analyze_table(table_name)
+
+        elif response == '9':
+            response = input('>>>Chenning_DBMS: Please enter the name of the table you want to compact. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            table_name = response
+            self.current_database.compact_table(table_name)
+
 
     def parser_record(self, response: str) -> None:
         if response == '1':
@@ -194,6 +252,17 @@ class Engine:
         elif response == '4':
             self.parser_query()
 
+        elif response == '5':
+            response = input('>>>Chenning_DBMS: Please enter the name of the table you want to load records into. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            table_name = response
+            response = input('>>>Chenning_DBMS: Please enter the path of the CSV or JSONL file you want to load. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            count = self.current_database.load_table(table_name, response)
+            print(f'>>>Chenning_DBMS: {count} records loaded.')
+
 
     def parser_query(self) -> None:
         # read_table
@@ -201,7 +270,7 @@ class Engine:
         if response == 'exit':
             return
         table_name = response
-        current_table = self.current_database.read_table(os.path.join('databases', self.current_database.database_name, table_name+'.jsonl'))
+        current_plan = {'operator': 'scan', 'table_name': table_name, 'fields': None}
         
         # cross_product
         response = input('>>>Chenning_DBMS: Do you want to do cross product? Enter "y" for yes. Enter "n" for no. Enter "exit" to return to main menu.\nYour input: ')
@@ -216,8 +285,8 @@ class Engine:
                     break
                 else:
                     table_name = response
-                    new_table = self.current_database.read_table(os.path.join('databases', self.current_database.database_name, table_name+'.jsonl'))
-                    current_table = self.current_database.cross_product(current_table, new_table)
+                    new_plan = {'operator': 'scan', 'table_name': table_name, 'fields': None}
+                    current_plan = {'operator': 'cross_product', 'left': current_plan, 'right': new_plan}
         elif response == 'n':
             pass
         
@@ -234,12 +303,12 @@ class Engine:
                     break
                 else:
                     table_name = response
-                    new_table = self.current_database.read_table(os.path.join('databases', self.current_database.database_name, table_name+'.jsonl'))
+                    new_plan = {'operator': 'scan', 'table_name': table_name, 'fields': None}
                     response = self.parser_conditions('>>>Chenning_DBMS: Please enter conditions one at a time to decide how to do theta inner join. Enter "stop" to stop adding conditions. Enter "exit" to return to main menu.\nYour input: ')
                     if response == 'exit':
                         return
                     conditions = response
-                    current_table = self.current_database.theta_inner_join(current_table, new_table, conditions)
+                    current_plan = {'operator': 'theta_inner_join', 'conditions': conditions, 'left': current_plan, 'right': new_plan}
         elif response == 'n':
             pass
         
@@ -252,7 +321,7 @@ class Engine:
             if response == 'exit':
                 return
             conditions = response
-            current_table = self.current_database.select(current_table, conditions)
+            current_plan = {'operator': 'select', 'conditions': conditions, 'child': current_plan}
         elif response == 'n':
             pass
         
@@ -271,12 +340,16 @@ class Engine:
             aggregate_fields = response.split()
             aggregate_field_aggregate_function_pairs = {}
             for aggregate_field in aggregate_fields:
-                response = input(f'>>>Chenning_DBMS: Please enter the lambda function that you want to use to aggregate "{aggregate_field}". Enter "exit" to return to main menu.\nYour input: ')
+                response = input(f'>>>Chenning_DBMS: Please enter the aggregate function ("sum", "count", "min", "max", "avg", "count_distinct", "percentile_<q>" such as "percentile_50") or the lambda function that you want to use to aggregate "{aggregate_field}". Enter "exit" to return to main menu.\nYour input: ')
                 if response == 'exit':
                     return
-                aggregate_function = eval(response)
+                elif self.current_database.is_builtin_aggregate(response):
+                    aggregate_function = response
+                else:
+                    aggregate_function = eval(response)
+                    aggregate_function.text = response
                 aggregate_field_aggregate_function_pairs[aggregate_field] = aggregate_function
-            current_table = self.current_database.group_by_and_aggregate(current_table, group_by_fields, aggregate_field_aggregate_function_pairs)
+            current_plan = {'operator': 'group_by_and_aggregate', 'group_by_fields': group_by_fields, 'aggregate_field_aggregate_function_pairs': aggregate_field_aggregate_function_pairs, 'child': current_plan}
         elif response == 'n':
             pass
 
@@ -289,7 +362,7 @@ class Engine:
             if response == 'exit':
                 return
             fields = response.split()
-            current_table = self.current_database.project(current_table, fields)
+            current_plan = {'operator': 'project', 'fields': fields, 'child': current_plan}
         elif response == 'n':
             pass
 
@@ -306,33 +379,45 @@ class Engine:
             if response == 'exit':
                 return
             elif response == 'a':
-                response = input('>>>Chenning_DBMS: Please enter the chunk size when using sort merge algorithm. Enter "exit" to return to main menu.\nYour input: ')
+                response = input('>>>Chenning_DBMS: Please enter the chunk size when using sort merge algorithm. Enter "auto" to choose it from the memory budget. Enter "exit" to return to main menu.\nYour input: ')
                 if response == 'exit':
                     return
-                chunk_size = int(response)
-                current_table = self.current_database.sort_merge(current_table, sort_field, True, chunk_size)
+                chunk_size = None if response == 'auto' else int(response)
+                current_plan = {'operator': 'sort_merge', 'sort_field': sort_field, 'ascending': True, 'chunk_size': chunk_size, 'child': current_plan}
             elif response == 'd':
-                response = input('>>>Chenning_DBMS: Please enter the chunk size when using sort merge algorithm. Enter "exit" to return to main menu.\nYour input: ')
+                response = input('>>>Chenning_DBMS: Please enter the chunk size when using sort merge algorithm. Enter "auto" to choose it from the memory budget. Enter "exit" to return to main menu.\nYour input: ')
                 if response == 'exit':
                     return
-                chunk_size = int(response)
-                current_table = self.current_database.sort_merge(current_table, sort_field, False, chunk_size)
+                chunk_size = None if response == 'auto' else int(response)
+                current_plan = {'operator': 'sort_merge', 'sort_field': sort_field, 'ascending': False, 'chunk_size': chunk_size, 'child': current_plan}
         elif response == 'n':
             pass
 
         # show
-        response = input('>>>Chenning_DBMS: Do you want to show the query result? Enter "y" for yes. Enter "n" for no. Enter "exit" to return to main menu.\nYour input: ')
+        response = input('>>>Chenning_DBMS: Do you want to show the query result? Enter "y" for yes. Enter "a" for yes and profile every operator of the query (EXPLAIN ANALYZE). Enter "n" for no. Enter "exit" to return to main menu.\nYour input: ')
         if response == 'exit':
             return
+        elif response == 'a':
+            response = input('>>>Chenning_DBMS: Please enter the number of records that you want to show. Enter "all" to show all records. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            head_n = 0 if response == 'all' else int(response)
+            if head_n:
+                current_plan = {'operator': 'limit', 'n': head_n, 'child': current_plan}
+            response = input('>>>Chenning_DBMS: Please enter the path of a file to write the profile to as a JSON trace. Enter "none" to only print it. Enter "exit" to return to main menu.\nYour input: ')
+            if response == 'exit':
+                return
+            self.explain_analyze(current_plan, head_n, None if response == 'none' else response)
         elif response == 'y':
             response = input('>>>Chenning_DBMS: Please enter the number of records that you want to show. Enter "all" to show all records. Enter "exit" to return to main menu.\nYour input: ')
             if response == 'exit':
                 return
-            elif response == 'all':
-                self.current_database.show(current_table)
-            else:
-                head_n = int(response)
-                self.current_database.show(current_table, head_n)
+            head_n = 0 if response == 'all' else int(response)
+            if head_n:
+                current_plan = {'operator': 'limit', 'n': head_n, 'child': current_plan}
+            planner = Planner(self.current_database)
+            current_table = planner.run(current_plan)
+            self.current_database.show(current_table, head_n or None)
         elif response == 'n':
             pass
 
@@ -341,6 +426,295 @@ class Engine:
 
 
 
+#######################   query language start   #########################
+
+
+    def run_script(self, script: str) -> None:
+        '''
+        Run a script of statements end to end without interaction, e.g. from a file or stdin.
+
+        Args:
+            script: str, statements separated by ";". Lines starting with "--" are comments.
+        
+        Returns:
+            None.
+        '''
+        if not os.path.exists('databases'):
+            os.mkdir('databases')
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+        try:
+            for statement in self.split_statements(script):
+                self.execute_statement(statement)
+        finally:
+            if self.current_database is not None:
+                self.current_database.close_pool()
+            shutil.rmtree('tmp')
+
+
+    def split_statements(self, script: str) -> List[str]:
+        '''
+        Split a script into statements on the ";" outside quotes, dropping comment lines and empty statements.
+
+        Args:
+            script: str, the script.
+        
+        Returns:
+            statements: List[str], the statements.
+        '''
+        script = '\n'.join(line for line in script.splitlines() if not line.strip().startswith('--'))
+        statements = re.findall(r'''(?:'[^']*'|"[^"]*"|[^;'"])+''', script)
+        return [statement.strip() for statement in statements if statement.strip()]
+
+
+    def execute_statement(self, statement: str) -> Optional[List[Dict[str, Union[int, float, bool, str]]]]:
+        '''
+        Execute one statement of the query language. The statements are:
+            CREATE DATABASE <database> / DROP DATABASE <database> / SHOW DATABASES / USE <database>
+            CREATE TABLE <table> <field-data_type pairs> / DROP TABLE <table> / SHOW TABLES / SHOW BUFFER POOL
+            CREATE INDEX <table> <field> / DROP INDEX <table> <field>
+            CONVERT TABLE <table> TO COLUMNAR|JSONL / ANALYZE TABLE <table> / COMPACT TABLE <table>
+            INSERT INTO <table> <record> / LOAD <table> FROM <path>
+            UPDATE <table> SET <field-value pairs> [WHERE <conditions>] / DELETE FROM <table> [WHERE <conditions>]
+            FROM <table> <query clauses> (see parse_query)
+            EXPLAIN ANALYZE [TRACE <path>] FROM <table> <query clauses> (runs the query and prints the profile of every operator)
+        Field-data_type pairs, records and field-value pairs are Python dicts, and conditions are joined by AND.
+
+        Args:
+            statement: str, the statement.
+        
+        Returns:
+            table: Optional[List[Dict[str, Union[int, float, bool, str]]]], the result of a query that is not shown, otherwise None.
+        '''
+        tokens = self.tokenize(statement)
+        keywords = [token.upper() for token in tokens]
+        if keywords[:2] == ['CREATE', 'DATABASE']:
+            self.create_database(tokens[2])
+        elif keywords[:2] == ['DROP', 'DATABASE']:
+            self.drop_database(tokens[2])
+        elif keywords[:2] == ['SHOW', 'DATABASES']:
+            self.show_database_names()
+        elif keywords[0] == 'USE':
+            self.use_database(tokens[1])
+        elif keywords[:2] == ['CREATE', 'TABLE']:
+            self.current_database.create_table(tokens[2], eval(' '.join(tokens[3:])))
+        elif keywords[:2] == ['DROP', 'TABLE']:
+            self.current_database.drop_table(tokens[2])
+        elif keywords[:2] == ['SHOW', 'TABLES']:
+            self.current_database.show_table_names()
+        elif keywords[:3] == ['SHOW', 'BUFFER', 'POOL']:
+            print(f'>>>Chenning_DBMS: {json.dumps(self.current_database.buffer_pool.statistics())}')
+        elif keywords[:2] == ['CREATE', 'INDEX']:
+            self.current_database.create_index(tokens[2], tokens[3])
+        elif keywords[:2] == ['DROP', 'INDEX']:
+            self.current_database.drop_index(tokens[2], tokens[3])
+        elif keywords[:2] == ['CONVERT', 'TABLE']:
+            self.current_database.convert_table_storage(tokens[2], keywords[4].lower())
+        elif keywords[:2] == ['ANALYZE', 'TABLE']:
+            self.current_database.analyze_table(tokens[2])
+        elif keywords[:2] == ['COMPACT', 'TABLE']:
+            self.current_database.compact_table(tokens[2])
+        elif keywords[:2] == ['INSERT', 'INTO']:
+            record = self.convert_data_type(tokens[2], eval(' '.join(tokens[3:])))
+            self.current_database.insert_record(tokens[2], record)
+        elif keywords[0] == 'LOAD':
+            self.current_database.load_table(tokens[1], self.unquote(tokens[3]))
+        elif keywords[0] == 'UPDATE':
+            where = keywords.index('WHERE') if 'WHERE' in keywords else len(tokens)
+            field_value_pairs = self.convert_data_type(tokens[1], eval(' '.join(tokens[3:where])))
+            self.current_database.update_record(tokens[1], field_value_pairs, self.parse_conditions(tokens[where+1:]))
+        elif keywords[:2] == ['DELETE', 'FROM']:
+            self.current_database.delete_record(tokens[2], self.parse_conditions(tokens[4:]))
+        elif keywords[:2] == ['EXPLAIN', 'ANALYZE']:
+            trace_path = None
+            start = 2
+            if keywords[2:3] == ['TRACE'] and len(tokens) > 3:
+                trace_path = self.unquote(tokens[3])
+                start = 4
+            if keywords[start:start+1] != ['FROM']:
+                raise ValueError(f'unknown statement: {statement}')
+            plan, head_n = self.parse_query(tokens[start:])
+            if head_n:
+                plan = {'operator': 'limit', 'n': head_n, 'child': plan}
+            self.explain_analyze(plan, head_n, trace_path)
+        elif keywords[0] == 'FROM':
+            plan, head_n = self.parse_query(tokens)
+            if head_n:
+                plan = {'operator': 'limit', 'n': head_n, 'child': plan}
+            planner = Planner(self.current_database)
+            table = planner.run(plan)
+            if head_n is None:
+                return list(table)
+            self.current_database.show(table, head_n or None)
+        else:
+            raise ValueError(f'unknown statement: {statement}')
+
+
+    def explain_analyze(self, plan: Dict, head_n: Optional[int], trace_path: Optional[str]) -> None:
+        '''
+        Run a query with every operator profiled (see Planner.analyze) and print the profile tree after its result.
+
+        Args:
+            plan: Dict, the logical plan.
+            head_n: Optional[int], the number of records to show (0 for all records), None if the result is not shown.
+            trace_path: Optional[str], the file to write the profile tree to as JSON, None to only print it.
+        
+        Returns:
+            None.
+        '''
+        planner = Planner(self.current_database)
+        profile = planner.analyze(plan, head_n)
+        print(planner.explain_analyze(profile))
+        if trace_path is not None:
+            with open(trace_path, 'w') as f:
+                json.dump(profile, f, indent=4)
+            print(f'>>>Chenning_DBMS: Profile written to {trace_path}.')
+
+
+    def parse_query(self, tokens: List[str]) -> Tuple[Dict, Optional[int]]:
+        '''
+        Parse a query into a logical plan. A query starts with FROM <table> and is followed by clauses applied in the order written:
+            CROSS <table>
+            JOIN <table> ON <conditions>
+            WHERE <conditions>
+            [GROUP BY <field> ...] AGGREGATE <function> <field>, ...
+            PROJECT <field> ...
+            SORT BY <field> [ASC|DESC] [CHUNK <chunk size>] (the chunk size is chosen from the memory budget by default)
+            SHOW [<n>|ALL]
+        An aggregate function is "sum", "count", "min", "max", "avg", "count_distinct", "percentile_<q>" (e.g. "percentile_50")
+        or a lambda function in parentheses.
+
+        Args:
+            tokens: List[str], the tokens of the query.
+        
+        Returns:
+            plan: Dict, the logical plan (see Planner).
+            head_n: Optional[int], the number of records to show (0 for all records), None if the result is not shown.
+        '''
+        clause_keywords = ['FROM', 'CROSS', 'JOIN', 'WHERE', 'GROUP', 'AGGREGATE', 'PROJECT', 'SORT', 'SHOW']
+        clauses = []
+        for token in tokens:
+            if token.upper() in clause_keywords:
+                clauses.append((token.upper(), []))
+            else:
+                clauses[-1][1].append(token)
+        plan = None
+        head_n = None
+        group_by_fields = []
+        for keyword, arguments in clauses:
+            if keyword == 'FROM':
+                plan = {'operator': 'scan', 'table_name': arguments[0], 'fields': None}
+            elif keyword == 'CROSS':
+                plan = {'operator': 'cross_product', 'left': plan, 'right': {'operator': 'scan', 'table_name': arguments[0], 'fields': None}}
+            elif keyword == 'JOIN':
+                conditions = self.parse_conditions(arguments[2:]) if len(arguments) > 1 and arguments[1].upper() == 'ON' else []
+                plan = {'operator': 'theta_inner_join', 'conditions': conditions, 'left': plan, 'right': {'operator': 'scan', 'table_name': arguments[0], 'fields': None}}
+            elif keyword == 'WHERE':
+                plan = {'operator': 'select', 'conditions': self.parse_conditions(arguments), 'child': plan}
+            elif keyword == 'GROUP':
+                group_by_fields = arguments[1:]
+            elif keyword == 'AGGREGATE':
+                aggregate_field_aggregate_function_pairs = {}
+                for item in self.split_items(' '.join(arguments)):
+                    function, aggregate_field = item.rsplit(None, 1)
+                    if not self.current_database.is_builtin_aggregate(function):
+                        text = function
+                        function = eval(function)
+                        function.text = text
+                    aggregate_field_aggregate_function_pairs[aggregate_field] = function
+                plan = {'operator': 'group_by_and_aggregate', 'group_by_fields': group_by_fields, 'aggregate_field_aggregate_function_pairs': aggregate_field_aggregate_function_pairs, 'child': plan}
+                group_by_fields = []
+            elif keyword == 'PROJECT':
+                plan = {'operator': 'project', 'fields': arguments, 'child': plan}
+            elif keyword == 'SORT':
+                options = [argument.upper() for argument in arguments[2:]]
+                chunk_size = int(options[options.index('CHUNK')+1]) if 'CHUNK' in options else None
+                plan = {'operator': 'sort_merge', 'sort_field': arguments[1], 'ascending': 'DESC' not in options, 'chunk_size': chunk_size, 'child': plan}
+            elif keyword == 'SHOW':
+                head_n = 0 if not arguments or arguments[0].upper() == 'ALL' else int(arguments[0])
+        return plan, head_n
+
+
+    def parse_conditions(self, tokens: List[str]) -> List[Callable]:
+        '''
+        Parse the tokens of conditions joined by AND.
+
+        Args:
+            tokens: List[str], the tokens of the conditions (an optional leading WHERE is skipped).
+        
+        Returns:
+            conditions: List[Callable], the converted lambda functions.
+        '''
+        if tokens and tokens[0].upper() == 'WHERE':
+            tokens = tokens[1:]
+        conditions = []
+        condition_tokens = []
+        for token in tokens + ['AND']:
+            if token.upper() == 'AND':
+                if condition_tokens:
+                    conditions.append(self.parser_condition(' '.join(condition_tokens)))
+                condition_tokens = []
+            else:
+                condition_tokens.append(token)
+        return conditions
+
+
+    def tokenize(self, statement: str) -> List[str]:
+        '''
+        Split a statement on white space outside quotes.
+
+        Args:
+            statement: str, the statement.
+        
+        Returns:
+            tokens: List[str], the tokens.
+        '''
+        return re.findall(r'''(?:'[^']*'|"[^"]*"|[^\s'"])+''', statement)
+
+
+    def split_items(self, text: str) -> List[str]:
+        '''
+        Split a text on the "," outside quotes and brackets.
+
+        Args:
+            text: str, the text.
+        
+        Returns:
+            items: List[str], the stripped items.
+        '''
+        items = ['']
+        depth = 0
+        for part in re.findall(r'''"[^"]*"|'[^']*'|[^'"]''', text):
+            if part in '([{':
+                depth += 1
+            elif part in ')]}':
+                depth -= 1
+            elif part == ',' and depth == 0:
+                items.append('')
+                continue
+            items[-1] += part
+        return [item.strip() for item in items if item.strip()]
+
+
+    def unquote(self, token: str) -> str:
+        '''
+        Remove the quotes around a token, if any.
+
+        Args:
+            token: str, the token.
+        
+        Returns:
+            token: str, the token without quotes.
+        '''
+        if len(token) >= 2 and token[0] == token[-1] and token[0] in '\'"':
+            return token[1:-1]
+        return token
+
+
+#######################   query language end   #########################
+
+
+
 #######################   tool start   #########################
 
 
@@ -376,90 +750,43 @@ class Engine:
         '''
         Parse a condition and convert it into a lambda function.
 
+        The returned lambda also carries an "expression" attribute, (left, operator, right), where left and right are
+        ("field", field_name) or ("value", constant), so that operators can inspect the condition (e.g. to pick a join algorithm),
+        and a "text" attribute with the condition string. Parsed conditions are cached by their text.
+
         Args:
             response: str, the condition string.
         
         Returns:
             condition: Callable, the converted lambda function.
         '''
-        if '==' in response:
-            left, right = response.split('==')
-            left = left.strip()
-            right = right.strip()
-            try:
-                left = eval(left)
-                return lambda x: left == x[right]
-            except:
-                try:
-                    right = eval(right)
-                    return lambda x: x[left] == right
-                except:
-                    return lambda x: x[left] == x[right]
-        elif '!=' in response:
-            left, right = response.split('!=')
-            left = left.strip()
-            right = right.strip()
-            try:
-                left = eval(left)
-                return lambda x: left != x[right]
-            except:
-                try:
-                    right = eval(right)
-                    return lambda x: x[left] != right
-                except:
-                    return lambda x: x[left] != x[right]
-        elif '>=' in response:
-            left, right = response.split('>=')
-            left = left.strip()
-            right = right.strip()
-            try:
-                left = eval(left)
-                return lambda x: left >= x[right]
-            except:
-                try:
-                    right = eval(right)
-                    return lambda x: x[left] >= right
-                except:
-                    return lambda x: x[left] >= x[right]
-        elif '<=' in response:
-            left, right = response.split('<=')
-            left = left.strip()
-            right = right.strip()
-            try:
-                left = eval(left)
-                return lambda x: left <= x[right]
-            except:
-                try:
-                    right = eval(right)
-                    return lambda x: x[left] <= right
-                except:
-                    return lambda x: x[left] <= x[right]
-        elif '>' in response:
-            left, right = response.split('>')
-            left = left.strip()
-            right = right.strip()
-            try:
-                left = eval(left)
-                return lambda x: left > x[right]
-            except:
-                try:
-                    right = eval(right)
-                    return lambda x: x[left] > right
-                except:
-                    return lambda x: x[left] > x[right]
-        elif '<' in response:
-            left, right = response.split('<')
-            left = left.strip()
-            right = right.strip()
+        text = response.strip()
+        if text in self.text_condition_pairs:
+            return self.text_condition_pairs[text]
+        for operator_str in ['==', '!=', '>=', '<=', '>', '<']:
+            if operator_str in response:
+                break
+        else:
+            return None
+        compare = {'==': operator.eq, '!=': operator.ne, '>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt}[operator_str]
+        left, right = response.split(operator_str)
+        left = left.strip()
+        right = right.strip()
+        try:
+            left = eval(left)
+            condition = lambda x: compare(left, x[right])
+            condition.expression = (('value', left), operator_str, ('field', right))
+        except:
             try:
-                left = eval(left)
-                return lambda x: left < x[right]
+                right = eval(right)
+                condition = lambda x: compare(x[left], right)
+                condition.expression = (('field', left), operator_str, ('value', right))
             except:
-                try:
-                    right = eval(right)
-                    return lambda x: x[left] < right
-                except:
-                    return lambda x: x[left] < x[right]
+                condition = lambda x: compare(x[left], x[right])
+                condition.expression = (('field', left), operator_str, ('field', right))
+        condition.text = text
+        self.text_condition_pairs[text] = condition
+        return condition
 
 
     def parser_conditions(self, hint: str) -> Union[List[Callable], str]:
@@ -1,11 +1,19 @@
+import argparse
+import sys
 from engine import Engine
 
 
 
 if __name__ == '__main__':
-    engine = Engine()
-    engine.run()
-
-
-
-
+    parser = argparse.ArgumentParser(description='Run the interactive menu, or a script of statements.')
+    parser.add_argument('script', nargs='?', help='the script file to run, or "-" for stdin')
+    parser.add_argument('--workers', type=int, default=1, help='the number of worker processes for parallel scans')
+    args = parser.parse_args()
+    engine = Engine(args.workers)
+    if args.script == '-':
+        engine.run_script(sys.stdin.read())
+    elif args.script is not None:
+        with open(args.script, 'r') as f:
+            engine.run_script(f.read())
+    else:
+        engine.run()
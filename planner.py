@@ -0,0 +1,841 @@
+import itertools
+import os
+import time
+from typing import Generator, List, Callable, Dict, Optional, Set, Tuple, Union
+from database import Database
+
+
+
+class Planner:
+    def __init__(self, database: Database) -> None:
+        '''
+        Plan queries on a database.
+
+        A logical plan is a tree of dicts, each with an "operator" key:
+            {"operator": "scan", "table_name": str, "fields": Optional[List[str]], "order_by": Optional[str]}
+            {"operator": "select", "conditions": List[Callable], "child": plan}
+            {"operator": "cross_product", "left": plan, "right": plan}
+            {"operator": "theta_inner_join", "conditions": List[Callable], "left": plan, "right": plan, "algorithm": Optional[str], "build": Optional[str], "left_sorted": Optional[bool], "right_sorted": Optional[bool]}
+            {"operator": "group_by_and_aggregate", "group_by_fields": List[str], "aggregate_field_aggregate_function_pairs": Dict[str, Union[str, Callable]], "child": plan}
+            {"operator": "project", "fields": List[str], "child": plan}
+            {"operator": "sort_merge", "sort_field": str, "ascending": bool, "chunk_size": Optional[int], "limit": Optional[int], "child": plan}
+            {"operator": "limit", "n": int, "child": plan}
+
+        Args:
+            database: Database, the database to query.
+
+        Returns:
+            None.
+        '''
+        self.database = database
+        self.profile_stack = None
+
+
+
+#######################   tool start   #########################
+
+
+    def fields_of(self, plan: Dict) -> Set[str]:
+        '''
+        Get the fields of the records that a plan generates.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            fields: Set[str], the fields.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            return set(self.database.table_name_field_data_type_pairs_pairs[plan['table_name']])
+        elif operator in ['cross_product', 'theta_inner_join']:
+            return self.fields_of(plan['left']) | self.fields_of(plan['right'])
+        elif operator == 'group_by_and_aggregate':
+            return set(plan['group_by_fields']) | set(plan['aggregate_field_aggregate_function_pairs'])
+        elif operator == 'project':
+            return set(plan['fields'])
+        else:
+            return self.fields_of(plan['child'])
+
+
+    def condition_fields(self, condition: Callable) -> Optional[Set[str]]:
+        '''
+        Get the fields that a condition reads.
+
+        Args:
+            condition: Callable, a condition parsed by Engine.parser_condition.
+
+        Returns:
+            fields: Optional[Set[str]], the fields, or None if the condition was not parsed by Engine.parser_condition and could read any field.
+        '''
+        expression = getattr(condition, 'expression', None)
+        if expression is None:
+            return None
+        (left_kind, left), _, (right_kind, right) = expression
+        return {value for kind, value in [(left_kind, left), (right_kind, right)] if kind == 'field'}
+
+
+    def equi_join_fields(self, plan: Dict) -> Optional[Tuple[str, str, List[Callable]]]:
+        '''
+        Find a "field == field" condition of a theta inner join that links its left and right inputs, so that hash join can be used.
+
+        Args:
+            plan: Dict, the logical plan of the theta inner join.
+
+        Returns:
+            equi_join_fields: Optional[Tuple[str, str, List[Callable]]], (left field, right field, remaining conditions), or None if there is no such condition.
+        '''
+        left_fields = self.fields_of(plan['left'])
+        right_fields = self.fields_of(plan['right'])
+        conditions = plan['conditions']
+        for i, condition in enumerate(conditions):
+            expression = getattr(condition, 'expression', None)
+            if expression is None:
+                continue
+            (left_kind, left), operator_str, (right_kind, right) = expression
+            if operator_str != '==' or left_kind != 'field' or right_kind != 'field':
+                continue
+            if left in left_fields and right in right_fields:
+                return left, right, conditions[:i] + conditions[i+1:]
+            if left in right_fields and right in left_fields:
+                return right, left, conditions[:i] + conditions[i+1:]
+        return None
+
+
+    def plan_key(self, plan: Union[Dict, List, str, int, float, bool, Callable, None]) -> Optional[Tuple]:
+        '''
+        Normalize a logical plan into a hashable key for the result cache. Conditions are keyed by their text regardless of
+        their order, and functions by their "text" attribute.
+
+        Args:
+            plan: Union[Dict, List, str, int, float, bool, Callable, None], the logical plan or a value in it.
+
+        Returns:
+            key: Optional[Tuple], the key, None if the plan has a function without text, which cannot be compared.
+        '''
+        if isinstance(plan, dict):
+            items = []
+            for key, value in sorted(plan.items()):
+                value = self.plan_key(value)
+                if value is None and plan[key] is not None:
+                    return None
+                if key == 'conditions':
+                    value = tuple(sorted(value))
+                items.append((key, value))
+            return tuple(items)
+        elif isinstance(plan, list):
+            values = tuple(self.plan_key(value) for value in plan)
+            return None if any(value is None for value in values) else values
+        elif callable(plan):
+            return getattr(plan, 'text', None)
+        return plan
+
+
+#######################   tool end   #########################
+
+
+
+#######################   optimization start   #########################
+
+
+    def optimize(self, plan: Dict) -> Dict:
+        '''
+        Rewrite a logical plan with rules: push selections down to the inputs whose fields they read, turn cross products
+        with conditions on both inputs into theta inner joins, order joins and choose join algorithms by estimated cost,
+        push projections down to the scans, and push a limit at the top of the plan into a sort.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            plan_optimize: Dict, the optimized logical plan, which generates the same records.
+        '''
+        if plan['operator'] == 'limit':
+            return self.push_down_limit(self.optimize(plan['child']), plan['n'])
+        plan_optimize = self.push_down_selections(plan)
+        plan_optimize = self.order_joins(plan_optimize)
+        plan_optimize = self.choose_join_algorithms(plan_optimize)
+        plan_optimize = self.push_down_projections(plan_optimize, None)
+        return plan_optimize
+
+
+    def push_down_selections(self, plan: Dict) -> Dict:
+        '''
+        Move the conditions of every select and theta inner join as close to the scans as possible.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            plan_out: Dict, the rewritten logical plan.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            return plan
+        elif operator == 'select':
+            return self.place_conditions(self.push_down_selections(plan['child']), plan['conditions'])
+        elif operator in ['cross_product', 'theta_inner_join']:
+            plan_cross_product = {'operator': 'cross_product', 'left': self.push_down_selections(plan['left']), 'right': self.push_down_selections(plan['right'])}
+            return self.place_conditions(plan_cross_product, plan.get('conditions', []))
+        else:
+            return {**plan, 'child': self.push_down_selections(plan['child'])}
+
+
+    def place_conditions(self, plan: Dict, conditions: List[Callable]) -> Dict:
+        '''
+        Apply conditions to a plan whose inputs have already been rewritten, placing each condition as low as it can go.
+
+        Args:
+            plan: Dict, the logical plan.
+            conditions: List[Callable], the conditions to apply.
+
+        Returns:
+            plan_out: Dict, the logical plan that generates the records of plan matching all the conditions.
+        '''
+        if not conditions:
+            return plan
+        operator = plan['operator']
+        if operator in ['cross_product', 'theta_inner_join']:
+            left_fields = self.fields_of(plan['left'])
+            right_fields = self.fields_of(plan['right'])
+            conditions_left, conditions_right, conditions_join = [], [], []
+            for condition in conditions:
+                fields = self.condition_fields(condition)
+                if fields is not None and fields <= left_fields:
+                    conditions_left.append(condition)
+                elif fields is not None and fields <= right_fields:
+                    conditions_right.append(condition)
+                else:
+                    conditions_join.append(condition)
+            left = self.place_conditions(plan['left'], conditions_left)
+            right = self.place_conditions(plan['right'], conditions_right)
+            conditions_join = plan.get('conditions', []) + conditions_join
+            if conditions_join:
+                return {'operator': 'theta_inner_join', 'conditions': conditions_join, 'left': left, 'right': right}
+            return {'operator': 'cross_product', 'left': left, 'right': right}
+        elif operator == 'select':
+            return {**plan, 'conditions': plan['conditions'] + conditions}
+        elif operator == 'sort_merge':
+            return {**plan, 'child': self.place_conditions(plan['child'], conditions)}
+        elif operator in ['project', 'group_by_and_aggregate']:
+            # conditions can only go below if they read fields that pass through unchanged
+            fields_pass = set(plan['fields'] if operator == 'project' else plan['group_by_fields'])
+            conditions_below = [condition for condition in conditions if self.condition_fields(condition) is not None and self.condition_fields(condition) <= fields_pass]
+            conditions_above = [condition for condition in conditions if condition not in conditions_below]
+            plan = {**plan, 'child': self.place_conditions(plan['child'], conditions_below)}
+            if conditions_above:
+                plan = {'operator': 'select', 'conditions': conditions_above, 'child': plan}
+            return plan
+        else:
+            return {'operator': 'select', 'conditions': conditions, 'child': plan}
+
+
+    def push_down_projections(self, plan: Dict, fields_required: Optional[Set[str]]) -> Dict:
+        '''
+        Make every scan read only the fields that are needed above it.
+
+        Args:
+            plan: Dict, the logical plan.
+            fields_required: Optional[Set[str]], the fields needed from the records that plan generates, None for all fields.
+
+        Returns:
+            plan_out: Dict, the rewritten logical plan.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            if fields_required is None:
+                return {**plan, 'fields': None}
+            field_data_type_pairs = self.database.table_name_field_data_type_pairs_pairs[plan['table_name']]
+            return {**plan, 'fields': [field for field in field_data_type_pairs if field in fields_required]}
+        elif operator in ['select', 'theta_inner_join']:
+            fields_conditions = [self.condition_fields(condition) for condition in plan['conditions']]
+            if fields_required is not None and None not in fields_conditions:
+                fields_required = fields_required.union(*fields_conditions)
+            else:
+                fields_required = None
+        elif operator == 'group_by_and_aggregate':
+            fields_required = set(plan['group_by_fields']) | set(plan['aggregate_field_aggregate_function_pairs'])
+        elif operator == 'project':
+            if fields_required is not None:
+                plan = {**plan, 'fields': [field for field in plan['fields'] if field in fields_required]}
+            fields_required = set(plan['fields'])
+        elif operator == 'sort_merge' and fields_required is not None:
+            fields_required = fields_required | {plan['sort_field']}
+
+        if operator in ['cross_product', 'theta_inner_join']:
+            left_fields_required = None if fields_required is None else fields_required & self.fields_of(plan['left'])
+            right_fields_required = None if fields_required is None else fields_required & self.fields_of(plan['right'])
+            return {**plan, 'left': self.push_down_projections(plan['left'], left_fields_required), 'right': self.push_down_projections(plan['right'], right_fields_required)}
+        return {**plan, 'child': self.push_down_projections(plan['child'], fields_required)}
+
+
+    def push_down_limit(self, plan: Dict, n: int) -> Dict:
+        '''
+        Push a limit of n records through projections, which keep the number and the order of records, into a sort,
+        which then only keeps the first n records in a bounded heap instead of sorting the whole table.
+
+        Args:
+            plan: Dict, the logical plan to be limited.
+            n: int, the maximum number of records.
+
+        Returns:
+            plan_out: Dict, the limited logical plan.
+        '''
+        if plan['operator'] == 'sort_merge':
+            return {**plan, 'limit': n if plan.get('limit') is None else min(plan['limit'], n)}
+        elif plan['operator'] == 'project':
+            return {**plan, 'child': self.push_down_limit(plan['child'], n)}
+        return {'operator': 'limit', 'n': n, 'child': plan}
+
+
+#######################   optimization end   #########################
+
+
+
+#######################   cost start   #########################
+
+
+    def field_statistics(self, field: str) -> Optional[Dict]:
+        '''
+        Find the statistics of a field collected by Database.analyze_table.
+
+        Args:
+            field: str, the field.
+
+        Returns:
+            field_statistics: Optional[Dict], {"distinct": int, "min": ..., "max": ...}, or None if the table of the field has not been analyzed.
+        '''
+        for table_name, statistics in self.database.table_name_statistics_pairs.items():
+            if field in statistics['fields']:
+                return statistics['fields'][field]
+        return None
+
+
+    def selectivity(self, condition: Callable) -> float:
+        '''
+        Estimate the fraction of records (or pairs of records, for join conditions) that match a condition.
+
+        Args:
+            condition: Callable, a condition parsed by Engine.parser_condition.
+
+        Returns:
+            selectivity: float, between 0 and 1.
+        '''
+        expression = getattr(condition, 'expression', None)
+        if expression is None:
+            return 0.5
+        (left_kind, left), operator_str, (right_kind, right) = expression
+        if left_kind == 'field' and right_kind == 'field':
+            if operator_str != '==':
+                return 1 / 3
+            distincts = [field_statistics['distinct'] for field_statistics in [self.field_statistics(left), self.field_statistics(right)] if field_statistics]
+            return 1 / max(distincts + [10])
+        if left_kind == 'value':
+            left, right = right, left
+            operator_str = {'==': '==', '!=': '!=', '>': '<', '<': '>', '>=': '<=', '<=': '>='}[operator_str]
+        field_statistics = self.field_statistics(left) or {'distinct': 10, 'min': None, 'max': None}
+        distinct = max(field_statistics['distinct'], 1)
+        if operator_str == '==':
+            return 1 / distinct
+        elif operator_str == '!=':
+            return 1 - 1 / distinct
+        low, high = field_statistics['min'], field_statistics['max']
+        if not all(type(value) in (int, float) for value in [low, high, right]) or low == high:
+            return 1 / 3
+        fraction = (right - low) / (high - low)
+        if operator_str in ['>', '>=']:
+            fraction = 1 - fraction
+        return min(max(fraction, 1 / distinct), 1)
+
+
+    def estimate_rows(self, plan: Dict) -> float:
+        '''
+        Estimate the number of records that a plan generates, from the statistics of the tables (1000 records for a table without statistics).
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            rows: float, the estimated number of records.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            statistics = self.database.table_name_statistics_pairs.get(plan['table_name'])
+            return statistics['rows'] if statistics else 1000
+        elif operator in ['cross_product', 'theta_inner_join']:
+            rows = self.estimate_rows(plan['left']) * self.estimate_rows(plan['right'])
+            for condition in plan.get('conditions', []):
+                rows *= self.selectivity(condition)
+            return rows
+        rows = self.estimate_rows(plan['child'])
+        if operator == 'select':
+            for condition in plan['conditions']:
+                rows *= self.selectivity(condition)
+        elif operator == 'group_by_and_aggregate':
+            groups = 1
+            for field in plan['group_by_fields']:
+                field_statistics = self.field_statistics(field)
+                groups *= field_statistics['distinct'] if field_statistics else rows
+            rows = min(rows, groups)
+        return rows
+
+
+    def ordered_fields(self, plan: Dict) -> List[str]:
+        '''
+        Get the fields of the records that a plan generates, in the order they appear in the records.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            fields: List[str], the fields.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            return plan['fields'] or list(self.database.table_name_field_data_type_pairs_pairs[plan['table_name']])
+        elif operator in ['cross_product', 'theta_inner_join']:
+            return self.ordered_fields(plan['left']) + self.ordered_fields(plan['right'])
+        elif operator == 'group_by_and_aggregate':
+            return plan['group_by_fields'] + list(plan['aggregate_field_aggregate_function_pairs'])
+        elif operator == 'project':
+            return plan['fields']
+        else:
+            return self.ordered_fields(plan['child'])
+
+
+    def flatten_joins(self, plan: Dict) -> Tuple[List[Dict], List[Callable]]:
+        '''
+        Split a tree of cross products and theta inner joins into its inputs and all of its join conditions.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            inputs, conditions: Tuple[List[Dict], List[Callable]], the plans that are joined, in their original order, and the join conditions.
+        '''
+        if plan['operator'] not in ['cross_product', 'theta_inner_join']:
+            return [plan], []
+        inputs_left, conditions_left = self.flatten_joins(plan['left'])
+        inputs_right, conditions_right = self.flatten_joins(plan['right'])
+        return inputs_left + inputs_right, conditions_left + conditions_right + plan.get('conditions', [])
+
+
+    def order_joins(self, plan: Dict, max_inputs: int = 10) -> Dict:
+        '''
+        Reorder every tree of joins into the left-deep order with the lowest estimated cost, found by dynamic programming over
+        subsets of inputs. The cost of a join is the work of its algorithm (pairs compared for nested loop, records read for
+        hash join) plus the size of its result. Joins are only reordered when at least one input table has statistics.
+
+        Args:
+            plan: Dict, the logical plan, with selections already pushed down.
+            max_inputs: int = 10, trees with more inputs than this keep their order.
+
+        Returns:
+            plan_out: Dict, the logical plan, which generates records with the same fields in the same order.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            return plan
+        elif operator not in ['cross_product', 'theta_inner_join']:
+            return {**plan, 'child': self.order_joins(plan['child'], max_inputs)}
+        inputs, conditions = self.flatten_joins(plan)
+        inputs = [self.order_joins(plan_input, max_inputs) for plan_input in inputs]
+        inputs_fields = [self.ordered_fields(plan_input) for plan_input in inputs]
+        all_fields = [field for fields in inputs_fields for field in fields]
+        table_names = [plan_scan['table_name'] for plan_input in inputs for plan_scan in self.scans_of(plan_input)]
+        if len(inputs) > max_inputs or len(set(all_fields)) < len(all_fields) or not any(table_name in self.database.table_name_statistics_pairs for table_name in table_names):
+            plan_out = inputs[0]
+            for plan_input in inputs[1:]:
+                plan_out = {'operator': 'cross_product', 'left': plan_out, 'right': plan_input}
+            return self.place_conditions(plan_out, conditions)
+
+        conditions_fields = [self.condition_fields(condition) for condition in conditions]
+        # subset of inputs -> (cost, rows, plan, fields, indices of the conditions applied)
+        best = {frozenset([i]): (0, self.estimate_rows(plan_input), plan_input, set(inputs_fields[i]), frozenset()) for i, plan_input in enumerate(inputs)}
+        for size in range(2, len(inputs)+1):
+            for subset in itertools.combinations(range(len(inputs)), size):
+                # trying the last input first makes the original order win ties
+                for j in reversed(subset):
+                    cost_rest, rows_rest, plan_rest, fields_rest, applied_rest = best[frozenset(subset) - {j}]
+                    rows_j = self.estimate_rows(inputs[j])
+                    fields = fields_rest | set(inputs_fields[j])
+                    indices_join = [i for i, condition_fields in enumerate(conditions_fields) if condition_fields is not None and condition_fields <= fields and not condition_fields <= fields_rest]
+                    conditions_join = [conditions[i] for i in indices_join]
+                    rows = rows_rest * rows_j
+                    for condition in conditions_join:
+                        rows *= self.selectivity(condition)
+                    if conditions_join:
+                        plan_join = {'operator': 'theta_inner_join', 'conditions': conditions_join, 'left': plan_rest, 'right': inputs[j]}
+                    else:
+                        plan_join = {'operator': 'cross_product', 'left': plan_rest, 'right': inputs[j]}
+                    if self.equi_join_fields(plan_join) if conditions_join else None:
+                        cost = cost_rest + rows_rest + rows_j + rows
+                    else:
+                        cost = cost_rest + rows_rest * rows_j + rows
+                    if frozenset(subset) not in best or cost < best[frozenset(subset)][0]:
+                        best[frozenset(subset)] = (cost, rows, plan_join, fields, applied_rest | frozenset(indices_join))
+        _, _, plan_out, _, applied = best[frozenset(range(len(inputs)))]
+        # conditions that could read any field, or that no join applied (e.g. their fields are in none of the inputs), go on top
+        conditions_late = [condition for i, condition in enumerate(conditions) if i not in applied]
+        plan_out = self.place_conditions(plan_out, conditions_late)
+        if self.ordered_fields(plan_out) != all_fields:
+            plan_out = {'operator': 'project', 'fields': all_fields, 'child': plan_out}
+        return plan_out
+
+
+    def scans_of(self, plan: Dict) -> List[Dict]:
+        '''
+        Get the scans under a plan.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            scans: List[Dict], the plans of the scans.
+        '''
+        if plan['operator'] == 'scan':
+            return [plan]
+        elif plan['operator'] in ['cross_product', 'theta_inner_join']:
+            return self.scans_of(plan['left']) + self.scans_of(plan['right'])
+        return self.scans_of(plan['child'])
+
+
+    def ordered_input(self, plan: Dict, field: str) -> Optional[Dict]:
+        '''
+        Find out whether a plan can generate its records in ascending order of a field without sorting: it is a sort on the field,
+        or a scan of a table with an index on the field (which is then read in index order), under selections and projections.
+
+        Args:
+            plan: Dict, the logical plan.
+            field: str, the field.
+
+        Returns:
+            plan_out: Optional[Dict], the plan rewritten to generate records in order of the field, None if it cannot.
+        '''
+        operator = plan['operator']
+        if operator == 'sort_merge':
+            return plan if plan['sort_field'] == field and plan['ascending'] else None
+        elif operator == 'scan':
+            return {**plan, 'order_by': field} if field in self.database.table_name_index_fields_pairs.get(plan['table_name'], []) else None
+        elif operator in ['select', 'project']:
+            child = self.ordered_input(plan['child'], field)
+            return None if child is None else {**plan, 'child': child}
+        return None
+
+
+    def choose_join_algorithms(self, plan: Dict) -> Dict:
+        '''
+        Choose the algorithm of every theta inner join when there is a "field == field" condition between the inputs:
+        sort-merge join when both inputs can generate their records in order of the join keys, or when one of them can and
+        neither is estimated to fit in the memory budget, and hash join, building the hash table on the input with fewer
+        estimated records, otherwise. Joins without such a condition use nested loop join.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            plan_out: Dict, the logical plan with "algorithm" and "build" (or "left_sorted" and "right_sorted") set on theta inner joins.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            return plan
+        elif operator == 'cross_product':
+            return {**plan, 'left': self.choose_join_algorithms(plan['left']), 'right': self.choose_join_algorithms(plan['right'])}
+        elif operator == 'theta_inner_join':
+            plan = {**plan, 'left': self.choose_join_algorithms(plan['left']), 'right': self.choose_join_algorithms(plan['right'])}
+            equi_join_fields = self.equi_join_fields(plan)
+            if equi_join_fields:
+                field_left, field_right, _ = equi_join_fields
+                rows_left = self.estimate_rows(plan['left'])
+                rows_right = self.estimate_rows(plan['right'])
+                ordered_left = self.ordered_input(plan['left'], field_left)
+                ordered_right = self.ordered_input(plan['right'], field_right)
+                if (ordered_left and ordered_right) or ((ordered_left or ordered_right) and min(rows_left, rows_right) > self.database.memory_budget):
+                    return {**plan, 'left': ordered_left or plan['left'], 'right': ordered_right or plan['right'], 'algorithm': 'sort_merge', 'build': None, 'left_sorted': ordered_left is not None, 'right_sorted': ordered_right is not None}
+                build = 'left' if rows_left < rows_right else 'right'
+                return {**plan, 'algorithm': 'hash_join', 'build': build}
+            return {**plan, 'algorithm': 'nested_loop', 'build': None}
+        return {**plan, 'child': self.choose_join_algorithms(plan['child'])}
+
+
+#######################   cost end   #########################
+
+
+
+#######################   execution start   #########################
+
+
+    def execute(self, plan: Dict) -> Generator:
+        '''
+        Turn a logical plan into a pipeline of Database operators (see execute_operator), instrumenting every operator
+        with a profile node when a query is being analyzed (see analyze).
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            table_out: Generator, which generate the records of the query result.
+        '''
+        if self.profile_stack is None:
+            return self.execute_operator(plan)
+        profile = {'operator': plan['operator'], 'details': self.profile_details(plan), 'rows_in': None, 'rows_out': 0, 'seconds': 0.0, 'self_seconds': 0.0,
+                   'bytes_read': 0, 'bytes_written': 0, 'temp_files': 0, 'children': []}
+        if self.profile_stack:
+            self.profile_stack[-1]['children'].append(profile)
+        self.profile_stack.append(profile)
+        start, io_start = time.perf_counter(), self.database.io_counters()
+        try:
+            table = self.execute_operator(plan)
+        finally:
+            self.profile_stack.pop()
+            self.add_profile_time(profile, start, io_start)
+        return self.instrument(table, profile)
+
+
+    def execute_operator(self, plan: Dict) -> Generator:
+        '''
+        Turn the root operator of a logical plan into a Database operator, executing its inputs with execute.
+        A select right above a scan goes through Database.index_select (unless the scan is read in index order), and a theta
+        inner join uses the algorithm chosen by choose_join_algorithms (hash join by default when there is a "field == field"
+        condition between its inputs). The build input of a hash join and the input of a group by are read in any order (see unordered).
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            table_out: Generator, which generate the records of the query result.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            if plan.get('order_by') is not None:
+                table = self.database.index_scan(plan['table_name'], plan['order_by'], ordered=True)
+                return table if plan['fields'] is None else self.database.project(table, plan['fields'])
+            table_path = os.path.join('databases', self.database.database_name, plan['table_name']+'.jsonl')
+            return self.database.read_table(table_path, plan['fields'])
+        elif operator == 'select':
+            if plan['child']['operator'] == 'scan' and plan['child'].get('order_by') is None:
+                return self.database.index_select(plan['child']['table_name'], plan['conditions'], plan['child']['fields'], plan.get('ordered', True))
+            return self.database.select(self.execute(plan['child']), plan['conditions'])
+        elif operator == 'cross_product':
+            return self.database.cross_product(self.execute(plan['left']), self.execute(plan['right']))
+        elif operator == 'theta_inner_join':
+            equi_join_fields = self.equi_join_fields(plan)
+            if equi_join_fields and plan.get('algorithm') == 'sort_merge':
+                field_left, field_right, conditions = equi_join_fields
+                return self.database.sort_merge_join(self.execute(plan['left']), self.execute(plan['right']), field_left, field_right, conditions, plan['left_sorted'], plan['right_sorted'])
+            if equi_join_fields and plan.get('algorithm') != 'nested_loop':
+                field_left, field_right, conditions = equi_join_fields
+                if plan.get('build') == 'left':
+                    return self.database.hash_join(self.execute(self.unordered(plan['left'])), self.execute(plan['right']), field_left, field_right, True, conditions, 16, 0)
+                return self.database.hash_inner_join(self.execute(plan['left']), self.execute(self.unordered(plan['right'])), field_left, field_right, conditions)
+            return self.database.theta_inner_join(self.execute(plan['left']), self.execute(plan['right']), plan['conditions'])
+        elif operator == 'group_by_and_aggregate':
+            return self.database.group_by_and_aggregate(self.execute(self.unordered(plan['child'])), plan['group_by_fields'], plan['aggregate_field_aggregate_function_pairs'])
+        elif operator == 'project':
+            return self.database.project(self.execute(plan['child']), plan['fields'])
+        elif operator == 'sort_merge':
+            if plan.get('limit') is not None:
+                return self.database.top_n(self.execute(plan['child']), plan['sort_field'], plan['ascending'], plan['limit'])
+            return self.database.sort_merge(self.execute(plan['child']), plan['sort_field'], plan['ascending'], plan['chunk_size'])
+        elif operator == 'limit':
+            return self.database.limit(self.execute(plan['child']), plan['n'])
+
+
+    def unordered(self, plan: Dict) -> Dict:
+        '''
+        Let a select right above a scan generate its records in any order, so that a parallel scan (see Database.parallel_scan)
+        generates the records of each byte range as soon as it is scanned. Used for inputs whose order does not matter to their operator.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            plan_out: Dict, the logical plan with "ordered" set to False on such a select.
+        '''
+        if plan['operator'] == 'select' and plan['child']['operator'] == 'scan' and plan['child'].get('order_by') is None:
+            return {**plan, 'ordered': False}
+        return plan
+
+
+    def run(self, plan: Dict) -> Generator:
+        '''
+        Optimize and execute a logical plan, through the result cache of the database when the plan can be keyed.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            table_out: Generator, which generate the records of the query result.
+        '''
+        key = self.plan_key(plan)
+        if key is None:
+            return self.execute(self.optimize(plan))
+        table_names = [scan['table_name'] for scan in self.scans_of(plan)]
+        limit = plan['n'] if plan['operator'] == 'limit' else None
+        return self.database.cache_table(key, table_names, lambda: self.execute(self.optimize(plan)), limit)
+
+
+#######################   execution end   #########################
+
+
+
+#######################   profiling start   #########################
+
+
+    def profile_details(self, plan: Dict) -> Dict:
+        '''
+        Describe an operator of a logical plan for its profile node, with JSON values only.
+
+        Args:
+            plan: Dict, the logical plan.
+
+        Returns:
+            details: Dict, e.g. the table, conditions, join algorithm, fields or sort field of the operator.
+        '''
+        describe = lambda function: function if isinstance(function, str) else getattr(function, 'text', None) or getattr(function, '__name__', '<function>')
+        operator = plan['operator']
+        if operator == 'scan':
+            return {'table_name': plan['table_name'], 'fields': plan['fields'], 'order_by': plan.get('order_by')}
+        elif operator == 'select':
+            details = {'conditions': [describe(condition) for condition in plan['conditions']]}
+            if plan['child']['operator'] == 'scan' and plan['child'].get('order_by') is None:
+                details.update({'access': 'index_select', 'table_name': plan['child']['table_name'], 'fields': plan['child']['fields'], 'ordered': plan.get('ordered', True)})
+            return details
+        elif operator == 'theta_inner_join':
+            algorithm = plan.get('algorithm') or ('hash_join' if self.equi_join_fields(plan) else 'nested_loop')
+            return {'algorithm': algorithm, 'build': plan.get('build'), 'conditions': [describe(condition) for condition in plan['conditions']]}
+        elif operator == 'group_by_and_aggregate':
+            return {'group_by_fields': plan['group_by_fields'], 'aggregates': {field: describe(function) for field, function in plan['aggregate_field_aggregate_function_pairs'].items()}}
+        elif operator == 'project':
+            return {'fields': plan['fields']}
+        elif operator == 'sort_merge':
+            return {'sort_field': plan['sort_field'], 'ascending': plan['ascending'], 'chunk_size': plan.get('chunk_size'), 'limit': plan.get('limit')}
+        elif operator == 'limit':
+            return {'n': plan['n']}
+        return {}
+
+
+    def add_profile_time(self, profile: Dict, start: float, io_start: Tuple[int, int, int]) -> None:
+        '''
+        Add the time and I/O since a start point to a profile node, including those of its inputs.
+
+        Args:
+            profile: Dict, the profile node.
+            start: float, the time.perf_counter() at the start point.
+            io_start: Tuple[int, int, int], the Database.io_counters() at the start point.
+
+        Returns:
+            None.
+        '''
+        bytes_read, bytes_written, temp_files = self.database.io_counters()
+        profile['seconds'] += time.perf_counter() - start
+        profile['bytes_read'] += bytes_read - io_start[0]
+        profile['bytes_written'] += bytes_written - io_start[1]
+        profile['temp_files'] += temp_files - io_start[2]
+
+
+    def instrument(self, table: Generator, profile: Dict) -> Generator:
+        '''
+        Count the records an operator generates, and the time and I/O spent generating each of them, in its profile node.
+
+        Args:
+            table: Generator, the records of the operator.
+            profile: Dict, the profile node of the operator.
+
+        Returns:
+            table_out: Generator, which generate the same records.
+        '''
+        table = iter(table)
+        clock, io_counters = time.perf_counter, self.database.io_counters
+        try:
+            while True:
+                start, io_start = clock(), io_counters()
+                try:
+                    record = next(table)
+                except StopIteration:
+                    return
+                finally:
+                    self.add_profile_time(profile, start, io_start)
+                profile['rows_out'] += 1
+                yield record
+        finally:
+            if hasattr(table, 'close'):
+                table.close()
+
+
+    def analyze(self, plan: Dict, head_n: Optional[int] = None) -> Dict:
+        '''
+        Optimize and execute a logical plan with every operator instrumented, bypassing the result cache, and profile it
+        (EXPLAIN ANALYZE). Times and I/O include the records that are shown, so the query runs as it would without profiling,
+        except for the cost of the instrumentation itself. I/O done in worker processes only counts as the temp files they write.
+
+        Args:
+            plan: Dict, the logical plan.
+            head_n: Optional[int] = None, the number of records to show (0 for all records), None to generate them without showing.
+
+        Returns:
+            profile: Dict, the profile tree. Every node has "operator", "details", "rows_in" (None for operators that read tables),
+                "rows_out", "seconds" (including its inputs), "self_seconds", "bytes_read", "bytes_written", "temp_files"
+                (the I/O of the operator itself) and "children".
+        '''
+        query = {'children': []}
+        self.profile_stack = [query]
+        try:
+            table = self.execute(self.optimize(plan))
+        finally:
+            self.profile_stack = None
+        profile = query['children'][0]
+        if head_n is None:
+            for _ in table:
+                pass
+        else:
+            profile = {'operator': 'show', 'details': {'head_n': head_n or None}, 'rows_in': None, 'rows_out': 0, 'seconds': 0.0, 'self_seconds': 0.0,
+                       'bytes_read': 0, 'bytes_written': 0, 'temp_files': 0, 'children': [profile]}
+            start, io_start = time.perf_counter(), self.database.io_counters()
+            self.database.show(table, head_n or None)
+            self.add_profile_time(profile, start, io_start)
+            profile['rows_out'] = profile['children'][0]['rows_out']
+        self.finish_profile(profile)
+        return profile
+
+
+    def finish_profile(self, profile: Dict) -> Tuple[float, int, int, int]:
+        '''
+        Turn the totals of a profile tree into the rows read, time and I/O of each operator itself, by subtracting those of its inputs.
+
+        Args:
+            profile: Dict, the profile node, with the time and I/O including its inputs.
+
+        Returns:
+            totals: Tuple[float, int, int, int], the seconds, bytes read, bytes written and temp files of the node including its inputs.
+        '''
+        totals = (profile['seconds'], profile['bytes_read'], profile['bytes_written'], profile['temp_files'])
+        children_totals = [self.finish_profile(child) for child in profile['children']]
+        if profile['children']:
+            profile['rows_in'] = sum(child['rows_out'] for child in profile['children'])
+        profile['self_seconds'] = max(0.0, totals[0] - sum(child_totals[0] for child_totals in children_totals))
+        for i, key in enumerate(['bytes_read', 'bytes_written', 'temp_files'], 1):
+            profile[key] = max(0, totals[i] - sum(child_totals[i] for child_totals in children_totals))
+        return totals
+
+
+    def explain_analyze(self, profile: Dict, depth: int = 0) -> str:
+        '''
+        Format a profile tree from analyze as an indented tree of operators, inputs below the operator that reads them.
+
+        Args:
+            profile: Dict, the profile tree.
+            depth: int = 0, the depth of the node in the tree.
+
+        Returns:
+            text: str, one line per operator.
+        '''
+        details = ', '.join(f'{key}={value}' for key, value in profile['details'].items() if value is not None)
+        line = ' ' * 4 * depth + f"-> {profile['operator']}" + (f' ({details})' if details else '')
+        line += f"  rows_in={profile['rows_in'] if profile['rows_in'] is not None else '-'} rows_out={profile['rows_out']}"
+        line += f"  time={profile['seconds'] * 1000:.3f} ms (self {profile['self_seconds'] * 1000:.3f} ms)"
+        line += f"  read={profile['bytes_read']} B written={profile['bytes_written']} B temp_files={profile['temp_files']}"
+        return '\n'.join([line] + [self.explain_analyze(child, depth + 1) for child in profile['children']])
+
+
+#######################   profiling end   #########################
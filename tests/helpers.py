@@ -0,0 +1,76 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from typing import Callable, Dict, List, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from engine import Engine
+
+
+
+class DatabaseTestCase(unittest.TestCase):
+    '''
+    Run each test in a fresh working directory with empty databases/ and tmp/ directories and a database named "test".
+    '''
+
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        os.mkdir('databases')
+        os.mkdir('tmp')
+        self.engine = Engine()
+        self.engine.create_database('test')
+        self.engine.use_database('test')
+
+
+    def tearDown(self) -> None:
+        if self.engine.current_database is not None:
+            self.engine.current_database.close_pool()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+
+    def use_database(self, **options) -> Database:
+        '''
+        Reopen the test database with the given Database options, e.g. memory_budget.
+        '''
+        if self.engine.current_database is not None:
+            self.engine.current_database.close_pool()
+        self.engine.current_database = Database('test', **options)
+        return self.engine.current_database
+
+
+    def create_table(self, table_name: str, field_data_type_pairs: Dict[str, str], records: List[Dict[str, Union[int, float, bool, str]]]) -> None:
+        '''
+        Create a table in the test database and insert the records into it.
+        '''
+        database = self.engine.current_database
+        database.create_table(table_name, field_data_type_pairs)
+        for record in records:
+            database.insert_record(table_name, record)
+
+
+    def conditions(self, *texts: str) -> List[Callable]:
+        '''
+        Parse conditions the way the engine does.
+        '''
+        return [self.engine.parser_condition(text) for text in texts]
+
+
+    def query(self, statement: str) -> List[Dict[str, Union[int, float, bool, str]]]:
+        '''
+        Run a query of the query language without showing it, and return its records.
+        '''
+        return self.engine.execute_statement(statement)
+
+
+    def temp_files(self) -> List[str]:
+        '''
+        List the files left in tmp/.
+        '''
+        return os.listdir('tmp')
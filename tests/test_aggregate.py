@@ -0,0 +1,47 @@
+import random
+import unittest
+from helpers import DatabaseTestCase
+
+
+
+class AggregateTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        generator = random.Random(7)
+        self.records = [{'g': generator.randint(0, 30), 'v': generator.randint(0, 1000), 'c': generator.randint(0, 9)} for _ in range(500)]
+
+
+    def expected(self) -> dict:
+        groups = {}
+        for record in self.records:
+            groups.setdefault(record['g'], []).append(record)
+        return {g: (sum(r['v'] for r in rs), max(r['v'] for r in rs), len(rs), len({r['c'] for r in rs})) for g, rs in groups.items()}
+
+
+    def test_empty_input_gives_no_rows(self) -> None:
+        database = self.engine.current_database
+        for group_by_fields, pairs in [([], {'v': 'sum', 'c': 'count'}), ([], {'v': 'count_distinct'}), (['g'], {'v': 'sum'})]:
+            with self.subTest(group_by_fields=group_by_fields, pairs=pairs):
+                self.assertEqual(list(database.group_by_and_aggregate(iter([]), group_by_fields, pairs)), [])
+
+
+    def test_hash_aggregation_with_spills_matches(self) -> None:
+        pairs = {'v': 'sum', 'c': 'count_distinct'}
+        expected = self.expected()
+        for memory_budget in (100000, 5, 1):
+            database = self.use_database(memory_budget=memory_budget)
+            with self.subTest(memory_budget=memory_budget):
+                records = list(database.group_by_and_aggregate(iter(self.records), ['g'], pairs, 3))
+                self.assertEqual(sorted((r['g'], r['v'], r['c']) for r in records), sorted((g, e[0], e[3]) for g, e in expected.items()))
+                self.assertEqual(self.temp_files(), [])
+
+
+    def test_aggregation_without_groups(self) -> None:
+        database = self.engine.current_database
+        records = list(database.group_by_and_aggregate(iter(self.records), [], {'v': 'max', 'c': 'avg'}))
+        self.assertEqual(records, [{'v': max(r['v'] for r in self.records), 'c': sum(r['c'] for r in self.records) / len(self.records)}])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+import unittest
+from unittest import mock
+from helpers import DatabaseTestCase
+
+
+
+class BulkInsertTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.database = self.use_database(batch_size=4)
+        self.create_table('A', {'A.id': 'int', 'A.ok': 'bool', 'A.s': 'str'}, [{'A.id': -1, 'A.ok': True, 'A.s': 'x'}])
+        self.table_path = os.path.join('databases', 'test', 'A.jsonl')
+
+
+    def write_records(self, file_path: str, ids: list) -> None:
+        with open(file_path, 'w') as f:
+            for i in ids:
+                f.write(json.dumps({'A.id': i, 'A.ok': i % 3 == 0 if isinstance(i, int) else False, 'A.s': f's{i}'})+'\n')
+
+
+    def test_failed_load_changes_nothing(self) -> None:
+        self.database.create_index('A', 'A.id')
+        self.write_records('bad.jsonl', list(range(10)) + ['oops'])
+        self.write_records('good.jsonl', range(10))
+        with self.assertRaises(ValueError):
+            self.database.load_table('A', 'bad.jsonl')
+        self.assertEqual(len(self.query('FROM A')), 1)
+        self.assertEqual(self.query('FROM A WHERE A.id == 3'), [])
+        self.assertEqual(self.database.load_table('A', 'good.jsonl'), 10)
+        self.assertEqual(self.query('FROM A WHERE A.id == 3'), [{'A.id': 3, 'A.ok': True, 'A.s': 's3'}])
+        self.assertEqual(len(self.query('FROM A')), 11)
+
+
+    def test_failed_load_into_columnar_table_changes_nothing(self) -> None:
+        self.database.convert_table_storage('A', 'columnar')
+        self.write_records('bad.jsonl', list(range(10)) + ['oops'])
+        self.write_records('good.jsonl', range(10))
+        with self.assertRaises(ValueError):
+            self.database.load_table('A', 'bad.jsonl')
+        self.assertEqual(self.query('FROM A'), [{'A.id': -1, 'A.ok': True, 'A.s': 'x'}])
+        self.database.load_table('A', 'good.jsonl')
+        self.assertEqual(self.query('FROM A'), [{'A.id': -1, 'A.ok': True, 'A.s': 'x'}] + [{'A.id': i, 'A.ok': i % 3 == 0, 'A.s': f's{i}'} for i in range(10)])
+
+
+    def test_load_widens_statistics_in_one_write(self) -> None:
+        self.database.analyze_table('A')
+        self.write_records('good.jsonl', [5, -7, 12, 3])
+        with mock.patch.object(self.database, 'write_statistics', wraps=self.database.write_statistics) as write_statistics:
+            self.database.load_table('A', 'good.jsonl')
+        self.assertEqual(write_statistics.call_count, 1)
+        with open(os.path.join('databases', 'test', 'statistics.jsonl')) as f:
+            statistics = json.loads(f.readline())['A']
+        self.assertEqual(statistics['rows'], 5)
+        self.assertEqual((statistics['fields']['A.id']['min'], statistics['fields']['A.id']['max']), (-7, 12))
+        self.assertEqual((statistics['fields']['A.s']['min'], statistics['fields']['A.s']['max']), ('s-7', 'x'))
+
+
+    def test_load_csv(self) -> None:
+        with open('records.csv', 'w') as f:
+            f.write('A.id,A.ok,A.s\n1,False,a\n2,1,b\n')
+        self.assertEqual(self.database.load_table('A', 'records.csv'), 2)
+        self.assertEqual(self.query('FROM A WHERE A.id > 0'), [{'A.id': 1, 'A.ok': False, 'A.s': 'a'}, {'A.id': 2, 'A.ok': True, 'A.s': 'b'}])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
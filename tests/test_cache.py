@@ -0,0 +1,51 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+from helpers import DatabaseTestCase
+from planner import Planner
+
+
+
+class ResultCacheTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_table('K', {'K.id': 'int', 'K.s': 'str'}, [{'K.id': i, 'K.s': f's{i % 3}'} for i in range(30)])
+        self.database = self.engine.current_database
+
+
+    def show(self, statement: str) -> str:
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.engine.execute_statement(statement)
+        return output.getvalue()
+
+
+    def test_head_of_a_query_is_cached(self) -> None:
+        first = self.show('FROM K WHERE K.id > 4 SHOW 3')
+        self.assertEqual(len(self.database.key_result_pairs), 1)
+        with mock.patch.object(Planner, 'execute', side_effect=AssertionError('not cached')):
+            self.assertEqual(self.show('FROM K WHERE K.id > 4 SHOW 3'), first)
+        self.assertIn('3 record(s)', first)
+        self.assertNotEqual(self.show('FROM K WHERE K.id > 4 SHOW 4'), first)
+        self.assertEqual(len(self.database.key_result_pairs), 2)
+
+
+    def test_whole_result_is_cached_and_evicted_by_modifications(self) -> None:
+        self.assertEqual(len(self.query('FROM K WHERE K.s == "s1"')), 10)
+        with mock.patch.object(Planner, 'execute', side_effect=AssertionError('not cached')):
+            self.assertEqual(len(self.query('FROM K WHERE K.s == "s1"')), 10)
+        self.database.insert_record('K', {'K.id': 30, 'K.s': 's1'})
+        self.assertEqual(self.database.key_result_pairs, {})
+        self.assertEqual(len(self.query('FROM K WHERE K.s == "s1"')), 11)
+
+
+    def test_result_read_partially_is_not_cached(self) -> None:
+        table = Planner(self.database).run({'operator': 'scan', 'table_name': 'K', 'fields': None})
+        next(table)
+        table.close()
+        self.assertEqual(self.database.key_result_pairs, {})
+
+
+
+if __name__ == '__main__':
+    unittest.main()
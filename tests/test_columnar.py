@@ -0,0 +1,41 @@
+import os
+import unittest
+from helpers import DatabaseTestCase
+
+
+
+class ColumnarTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.records = [{'A.id': i, 'A.w': i / 4, 'A.ok': i % 3 == 0, 'A.s': f's{i}' * (i % 4)} for i in range(21)]
+        self.create_table('A', {'A.id': 'int', 'A.w': 'float', 'A.ok': 'bool', 'A.s': 'str'}, self.records)
+        self.create_table('K', {'K.id': 'int'}, [{'K.id': i} for i in range(3)])
+        self.database = self.use_database(batch_size=8)
+        self.database.convert_table_storage('A', 'columnar')
+        self.table_path = os.path.join('databases', 'test', 'A.jsonl')
+
+
+    def test_records_round_trip(self) -> None:
+        self.assertEqual(list(self.database.read_table(self.table_path)), self.records)
+        self.assertEqual(list(self.database.read_table(self.table_path, ['A.s', 'A.ok'])), [{'A.s': record['A.s'], 'A.ok': record['A.ok']} for record in self.records])
+
+
+    def test_no_fields_gives_one_empty_record_per_row(self) -> None:
+        self.assertEqual(list(self.database.read_table(self.table_path, [])), [{}] * len(self.records))
+        self.assertEqual(list(self.database.index_select('A', [], [])), [{}] * len(self.records))
+        self.assertEqual(len(self.query('FROM K CROSS A PROJECT K.id')), 3 * len(self.records))
+
+
+    def test_modifications(self) -> None:
+        self.database.insert_record('A', {'A.id': 21, 'A.w': 0.5, 'A.ok': True, 'A.s': 'new'})
+        self.database.update_record('A', {'A.s': 'updated'}, self.conditions('A.id < 2'))
+        self.database.delete_record('A', self.conditions('A.ok == True'))
+        records = [{**record, 'A.s': 'updated'} if record['A.id'] < 2 else record for record in self.records if not record['A.ok']]
+        self.assertEqual(self.query('FROM A'), records)
+        self.database.convert_table_storage('A', 'jsonl')
+        self.assertEqual(self.query('FROM A'), records)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
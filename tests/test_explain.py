@@ -0,0 +1,37 @@
+import contextlib
+import io
+import json
+import unittest
+from helpers import DatabaseTestCase
+
+
+
+class ExplainAnalyzeTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_table('K', {'K.id': 'int', 'K.s': 'str'}, [{'K.id': i, 'K.s': f's{i % 3}'} for i in range(30)])
+
+
+    def show(self, statement: str) -> str:
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.engine.execute_statement(statement)
+        return output.getvalue()
+
+
+    def test_missing_query_is_an_unknown_statement(self) -> None:
+        for statement in ['EXPLAIN ANALYZE', 'EXPLAIN ANALYZE TRACE', 'EXPLAIN ANALYZE TRACE "trace.json"', 'EXPLAIN ANALYZE K', 'EXPLAIN ANALYZE TRACE "trace.json" WHERE K.id > 4']:
+            with self.subTest(statement=statement):
+                with self.assertRaisesRegex(ValueError, 'unknown statement'):
+                    self.engine.execute_statement(statement)
+
+
+    def test_profile_and_trace(self) -> None:
+        output = self.show('EXPLAIN ANALYZE TRACE "trace.json" FROM K WHERE K.id > 4 SHOW 3')
+        self.assertIn('3 record(s)', output)
+        with open('trace.json') as trace_file:
+            self.assertIsInstance(json.load(trace_file), dict)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from helpers import DatabaseTestCase
+
+
+
+class IndexTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_table('A', {'A.id': 'int', 'A.s': 'str'}, [{'A.id': i, 'A.s': f's{i % 4}'} for i in range(20)])
+        self.database = self.engine.current_database
+        self.database.create_index('A', 'A.id')
+        self.database.create_index('A', 'A.s')
+
+
+    def ids(self, conditions: list) -> list:
+        return sorted(record['A.id'] for record in self.database.index_select('A', self.conditions(*conditions)))
+
+
+    def test_constant_of_another_type_falls_back_to_a_scan(self) -> None:
+        self.assertEqual(self.ids(["A.id == '3'"]), [])
+        self.assertEqual(self.ids(['A.s == 3']), [])
+        self.assertEqual(self.ids(["A.id == '3'", 'A.s == "s3"']), [])
+        self.assertEqual(self.ids(['A.id == 3.0']), [3])
+
+
+    def test_columnar_tables_cannot_be_indexed(self) -> None:
+        self.database.convert_table_storage('A', 'columnar')
+        self.assertEqual(self.database.table_name_index_fields_pairs.get('A', []), [])
+        with self.assertRaisesRegex(ValueError, 'only supported on tables in JSONL storage'):
+            self.database.create_index('A', 'A.id')
+        self.assertEqual(self.database.table_name_index_fields_pairs.get('A', []), [])
+        self.assertEqual(self.ids(['A.id == 3']), [3])
+
+
+    def test_ranges_and_point_lookups(self) -> None:
+        self.assertEqual(self.ids(['A.id >= 5', 'A.id < 9']), [5, 6, 7, 8])
+        self.assertEqual(self.ids(['7 < A.id', 'A.s == "s0"']), [8, 12, 16])
+        self.assertEqual(self.ids(['A.id != 3', 'A.id <= 3']), [0, 1, 2])
+
+
+    def test_index_follows_inserts_updates_and_deletes(self) -> None:
+        self.database.insert_record('A', {'A.id': 20, 'A.s': 's9'})
+        self.database.update_record('A', {'A.s': 's9'}, self.conditions('A.id == 2'))
+        self.database.update_record('A', {'A.id': 102}, self.conditions('A.id == 6'))
+        self.database.delete_record('A', self.conditions('A.id == 20'))
+        for database in (self.database, self.use_database()):
+            with self.subTest(reopened=database is not self.database):
+                self.database = database
+                self.assertEqual(self.ids(['A.s == "s9"']), [2])
+                self.assertEqual(self.ids(['A.id == 6']), [])
+                self.assertEqual(self.ids(['A.id == 102']), [102])
+                self.assertEqual([record['A.id'] for record in database.index_scan('A', 'A.id', 100, None, ordered=True)], [102])
+                self.assertEqual([record['A.s'] for record in database.index_scan('A', 'A.s', 's8', ordered=True)], ['s9'])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
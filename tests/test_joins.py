@@ -0,0 +1,67 @@
+import os
+import unittest
+from helpers import DatabaseTestCase
+
+
+
+class JoinTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_table('K', {'K.id': 'int', 'K.s': 'str'}, [{'K.id': i, 'K.s': f's{i % 3}'} for i in range(12)])
+        self.create_table('A', {'A.id': 'int', 'A.w': 'float'}, [{'A.id': i % 15, 'A.w': i / 2} for i in range(40)])
+        self.records_k = [{'K.id': i, 'K.s': f's{i % 3}'} for i in range(12)]
+        self.records_a = [{'A.id': i % 15, 'A.w': i / 2} for i in range(40)]
+
+
+    def expected(self, condition) -> list:
+        return sorted((sorted({**k, **a}.items()) for k in self.records_k for a in self.records_a if condition(k, a)), key=repr)
+
+
+    def normalized(self, records: list) -> list:
+        return sorted((sorted(record.items()) for record in records), key=repr)
+
+
+    def test_join_algorithms_match_a_brute_force_join(self) -> None:
+        expected = self.expected(lambda k, a: k['K.id'] == a['A.id'] and a['A.w'] > 3)
+        conditions = self.conditions('K.id == A.id', 'A.w > 3')
+        for memory_budget in (100000, 4):
+            database = self.use_database(memory_budget=memory_budget)
+            with self.subTest(memory_budget=memory_budget):
+                self.assertEqual(self.normalized(database.theta_inner_join(iter(self.records_k), iter(self.records_a), conditions)), expected)
+                self.assertEqual(self.normalized(database.hash_inner_join(iter(self.records_k), iter(self.records_a), 'K.id', 'A.id', conditions[1:], 4)), expected)
+                self.assertEqual(self.normalized(database.sort_merge_join(iter(self.records_k), iter(self.records_a), 'K.id', 'A.id', conditions[1:])), expected)
+                self.assertEqual(self.normalized(self.query('FROM K JOIN A ON K.id == A.id WHERE A.w > 3')), expected)
+                self.assertEqual(self.temp_files(), [])
+
+
+    def test_sort_merge_join_of_index_scans_after_updates_to_the_same_value(self) -> None:
+        database = self.engine.current_database
+        database.create_index('K', 'K.id')
+        database.create_index('A', 'A.id')
+        database.update_record('A', {'A.id': 3}, self.conditions('A.id == 3'))
+        for value in (7, 8, 7):
+            database.update_record('A', {'A.id': value}, self.conditions('A.w == 1.0'))
+        self.records_a = list(database.read_table(os.path.join('databases', 'test', 'A.jsonl')))
+        self.assertEqual(len(self.records_a), 40)
+        self.assertEqual(sorted(record['A.id'] for record in database.index_scan('A', 'A.id', ordered=True)), sorted(record['A.id'] for record in self.records_a))
+        expected = self.expected(lambda k, a: k['K.id'] == a['A.id'])
+        self.assertEqual(self.normalized(database.sort_merge_join(database.index_scan('K', 'K.id', ordered=True), database.index_scan('A', 'A.id', ordered=True), 'K.id', 'A.id', [])), expected)
+        self.assertEqual(self.normalized(self.query('FROM A JOIN K ON A.id == K.id')), expected)
+
+
+    def test_cross_product_with_every_field_of_a_side_projected_away(self) -> None:
+        for memory_budget in (100000, 4):
+            self.use_database(memory_budget=memory_budget)
+            with self.subTest(memory_budget=memory_budget):
+                records = self.query('FROM K CROSS A PROJECT K.s')
+                self.assertEqual(len(records), len(self.records_k) * len(self.records_a))
+                self.assertEqual(self.normalized(records), self.normalized({'K.s': k['K.s']} for k in self.records_k for _ in self.records_a))
+
+
+    def test_compact_records_without_fields(self) -> None:
+        self.assertEqual(self.engine.current_database.compact_records([{}, {}]), ((), [(), ()]))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
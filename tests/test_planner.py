@@ -0,0 +1,73 @@
+import unittest
+from helpers import DatabaseTestCase
+from planner import Planner
+
+
+
+class PlannerTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_table('K', {'K.id': 'int', 'K.s': 'str'}, [{'K.id': i, 'K.s': f's{i % 3}'} for i in range(12)])
+        self.create_table('A', {'A.id': 'int', 'A.w': 'float'}, [{'A.id': i % 15, 'A.w': i / 2} for i in range(40)])
+        self.create_table('B', {'B.id': 'int', 'B.t': 'str'}, [{'B.id': i, 'B.t': f't{i % 2}'} for i in range(6)])
+        self.database = self.engine.current_database
+        for table_name in ['K', 'A', 'B']:
+            self.database.analyze_table(table_name)
+        self.planner = Planner(self.database)
+
+
+    def scan(self, table_name: str) -> dict:
+        return {'operator': 'scan', 'table_name': table_name, 'fields': None}
+
+
+    def unoptimized(self, plan: dict) -> list:
+        '''
+        Execute a plan as written, with selections and joins done by nested loops.
+        '''
+        operator = plan['operator']
+        if operator == 'scan':
+            return list(self.database.read_table(f"databases/test/{plan['table_name']}.jsonl"))
+        elif operator == 'select':
+            return [record for record in self.unoptimized(plan['child']) if all(condition(record) for condition in plan['conditions'])]
+        elif operator in ['cross_product', 'theta_inner_join']:
+            pairs = [{**l, **r} for l in self.unoptimized(plan['left']) for r in self.unoptimized(plan['right'])]
+            return [record for record in pairs if all(condition(record) for condition in plan.get('conditions', []))]
+        elif operator == 'project':
+            return [{field: record[field] for field in plan['fields']} for record in self.unoptimized(plan['child'])]
+
+
+    def assert_same_records(self, plan: dict) -> None:
+        normalized = lambda records: sorted((list(record.items()) for record in records), key=repr)
+        self.assertEqual(normalized(self.planner.execute(self.planner.optimize(plan))), normalized(self.unoptimized(plan)))
+
+
+    def test_rewrites_keep_the_result(self) -> None:
+        cross = {'operator': 'cross_product', 'left': {'operator': 'cross_product', 'left': self.scan('A'), 'right': self.scan('K')}, 'right': self.scan('B')}
+        plans = [
+            {'operator': 'select', 'conditions': self.conditions('K.id == A.id', 'B.id == K.id', 'A.w > 2', 'K.s != "s1"'), 'child': cross},
+            {'operator': 'project', 'fields': ['B.t', 'A.w'], 'child': {'operator': 'select', 'conditions': self.conditions('B.id == A.id', 'K.id < 2'), 'child': cross}},
+            {'operator': 'project', 'fields': ['K.s'], 'child': {'operator': 'cross_product', 'left': self.scan('K'), 'right': self.scan('B')}},
+        ]
+        for plan in plans:
+            with self.subTest(plan=plan['operator']):
+                self.assert_same_records(plan)
+
+
+    def test_join_condition_on_fields_of_no_input_is_kept(self) -> None:
+        condition = self.engine.parser_condition('Q.q < 0')
+        plan = {'operator': 'theta_inner_join', 'conditions': self.conditions('K.id == A.id', 'B.id == K.id') + [condition],
+                'left': {'operator': 'cross_product', 'left': self.scan('A'), 'right': self.scan('K')}, 'right': self.scan('B')}
+        plan_optimize = self.planner.optimize(plan)
+        conditions = []
+        plans = [plan_optimize]
+        while plans:
+            plan_node = plans.pop()
+            conditions.extend(plan_node.get('conditions', []))
+            plans.extend(plan_node[key] for key in ['left', 'right', 'child'] if key in plan_node)
+        self.assertIn(condition, conditions)
+        self.assertEqual(len(conditions), 3)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest import mock
+from helpers import DatabaseTestCase
+
+
+
+class ScanTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.records = [{'B.id': i, 'B.f': i % 2 == 1, 'B.x': [1.0, 1e16, 2.5][i % 3]} for i in range(30)]
+        self.create_table('B', {'B.id': 'int', 'B.f': 'bool', 'B.x': 'float'}, self.records)
+        self.database = self.engine.current_database
+
+
+    def ids(self, records) -> list:
+        return sorted(record['B.id'] for record in records)
+
+
+    def expected(self, condition) -> list:
+        return self.ids(record for record in self.records if condition(record))
+
+
+    def test_select_constants_of_another_type_than_the_field(self) -> None:
+        for text, condition in [('B.f == 1', lambda r: r['B.f'] == 1), ('0 == B.f', lambda r: r['B.f'] == 0), ('B.x == 1', lambda r: r['B.x'] == 1),
+                                (f'B.x == {10 ** 16}', lambda r: r['B.x'] == 10 ** 16), ('B.id == 3', lambda r: r['B.id'] == 3)]:
+            with self.subTest(condition=text):
+                expected = self.expected(condition)
+                self.assertTrue(expected)
+                self.assertEqual(self.ids(self.query(f'FROM B WHERE {text}')), expected)
+                self.assertEqual(self.ids(self.database.parallel_scan('B', self.conditions(text))), expected)
+
+
+    def test_parallel_scan_in_workers(self) -> None:
+        database = self.use_database(workers=2)
+        try:
+            for text, condition in [('B.f == 1', lambda r: r['B.f'] == 1), (f'B.x == {10 ** 16}', lambda r: r['B.x'] == 10 ** 16)]:
+                with self.subTest(condition=text):
+                    self.assertEqual(self.ids(database.parallel_scan('B', self.conditions(text), min_range_bytes=64)), self.expected(condition))
+        finally:
+            database.close_pool()
+
+
+    def test_unordered_parallel_scan_generates_the_same_records(self) -> None:
+        database = self.use_database(workers=2)
+        try:
+            records = list(database.parallel_scan('B', self.conditions('B.id > 4'), ['B.id', 'B.f'], False, 64))
+            self.assertEqual(sorted(records, key=lambda r: r['B.id']), [{'B.id': r['B.id'], 'B.f': r['B.f']} for r in self.records if r['B.id'] > 4])
+        finally:
+            database.close_pool()
+
+
+    def test_group_by_and_hash_join_build_inputs_are_read_in_any_order(self) -> None:
+        self.create_table('K', {'K.id': 'int'}, [{'K.id': i} for i in range(5)])
+        database = self.use_database(workers=2)
+        try:
+            with mock.patch.object(database, 'parallel_scan', wraps=database.parallel_scan) as parallel_scan:
+                records = self.query('FROM B WHERE B.id > 3 GROUP BY B.f AGGREGATE count B.id')
+                self.assertEqual(sorted((r['B.f'], r['B.id']) for r in records), [(False, 13), (True, 13)])
+                self.assertEqual([call.args[3] for call in parallel_scan.call_args_list], [False])
+                parallel_scan.reset_mock()
+                records = self.query('FROM B JOIN K ON B.id == K.id WHERE B.id > 1 AND K.id < 4')
+                self.assertEqual(sorted(r['B.id'] for r in records), [2, 3])
+                self.assertEqual(sorted(call.args[3] for call in parallel_scan.call_args_list), [False, True])
+                parallel_scan.reset_mock()
+                self.assertEqual(self.ids(self.query('FROM B WHERE B.id > 25')), [26, 27, 28, 29])
+                self.assertEqual([call.args[3] for call in parallel_scan.call_args_list], [True])
+        finally:
+            database.close_pool()
+
+
+    def test_delete_constants_of_another_type_than_the_field(self) -> None:
+        self.database.delete_record('B', self.conditions('B.f == 1'))
+        self.database.delete_record('B', self.conditions('B.x == 1'))
+        self.assertEqual(self.ids(self.query('FROM B')), self.expected(lambda r: r['B.f'] != 1 and r['B.x'] != 1))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
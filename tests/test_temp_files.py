@@ -0,0 +1,65 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+from helpers import DatabaseTestCase
+
+
+
+class TempFileTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_table('K', {'K.id': 'int', 'K.s': 'str'}, [{'K.id': i, 'K.s': f's{i % 3}'} for i in range(30)])
+        self.create_table('A', {'A.id': 'int', 'A.w': 'float'}, [{'A.id': i % 25, 'A.w': i / 2} for i in range(60)])
+        self.database = self.use_database(memory_budget=4)
+        self.records = [{'K.id': i, 'K.g': i % 11} for i in range(50)]
+
+
+    def assert_closed_early_without_temp_files(self, table) -> None:
+        next(table)
+        table.close()
+        self.assertEqual(self.temp_files(), [])
+
+
+    def test_sort_merge_closed_early(self) -> None:
+        self.assert_closed_early_without_temp_files(self.database.sort_merge(iter(self.records), 'K.id', False, 2, max_open_files=3))
+
+
+    def test_hash_join_closed_early(self) -> None:
+        self.assert_closed_early_without_temp_files(self.database.hash_inner_join(iter(self.records), iter(self.records), 'K.id', 'K.id', [], 4))
+
+
+    def test_block_nested_loop_join_closed_early(self) -> None:
+        self.assert_closed_early_without_temp_files(self.database.cross_product(iter(self.records), iter(self.records)))
+
+
+    def test_group_by_spills_closed_early(self) -> None:
+        self.assert_closed_early_without_temp_files(self.database.group_by_and_aggregate(iter(self.records), ['K.g'], {'K.id': 'sum'}, 2))
+
+
+    def test_sort_merge_join_read_to_the_end(self) -> None:
+        table = self.database.sort_merge_join(iter(self.records), iter(self.records[:20]), 'K.id', 'K.id', [])
+        self.assertEqual(len(list(table)), 20)
+        self.assertEqual(self.temp_files(), [])
+
+
+    def test_show_head_of_queries(self) -> None:
+        for statement in ['FROM K JOIN A ON K.id == A.id SORT BY A.w DESC CHUNK 2 SHOW 3',
+                          'FROM K CROSS A SHOW 3',
+                          'FROM K GROUP BY K.s AGGREGATE count K.id SHOW 1']:
+            with self.subTest(statement=statement), contextlib.redirect_stdout(io.StringIO()) as output:
+                self.engine.execute_statement(statement)
+                self.assertIn('record(s)', output.getvalue())
+                self.assertEqual(self.temp_files(), [])
+
+
+    def test_menu_shows_all_records_for_zero(self) -> None:
+        responses = ['K', 'n', 'n', 'n', 'n', 'n', 'n', 'y', '0']
+        with mock.patch('builtins.input', side_effect=responses), contextlib.redirect_stdout(io.StringIO()) as output:
+            self.engine.parser_query()
+        self.assertIn('30 record(s)', output.getvalue())
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import unittest
+from unittest import mock
+from helpers import DatabaseTestCase
+from database import Database
+
+
+
+class WriteAheadLogTest(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.database = self.use_database(memory_budget=5)
+        self.create_table('A', {'A.id': 'int', 'A.v': 'str'}, [{'A.id': i, 'A.v': 'old'} for i in range(20)])
+        self.database.create_index('A', 'A.v')
+        self.table_path = os.path.join('databases', 'test', 'A.jsonl')
+
+
+    def test_update_of_indexed_field_compacted_by_the_same_statement(self) -> None:
+        self.database.delete_record('A', self.conditions('A.id < 3'))
+        self.database.update_record('A', {'A.v': 'new'}, self.conditions('A.id >= 14'))
+        self.assertFalse(os.path.exists(self.database.wal_path(self.table_path)))
+        self.assertEqual([record['A.id'] for record in self.query('FROM A WHERE A.v == "new"')], list(range(14, 20)))
+        self.use_database()
+        self.assertEqual([record['A.id'] for record in self.query('FROM A WHERE A.v == "new"')], list(range(14, 20)))
+        self.assertEqual(len(self.query('FROM A WHERE A.v == "old"')), 11)
+
+
+    def test_index_entries_are_written_before_the_commit(self) -> None:
+        with mock.patch.object(Database, 'append_wal', side_effect=OSError('crash')):
+            with self.assertRaises(OSError):
+                self.database.update_record('A', {'A.v': 'new'}, self.conditions('A.id == 4'))
+        self.use_database()
+        self.assertEqual(self.query('FROM A WHERE A.v == "new"'), [])
+        self.engine.current_database.update_record('A', {'A.v': 'new'}, self.conditions('A.id == 4'))
+        self.use_database()
+        self.assertEqual(self.query('FROM A WHERE A.v == "new"'), [{'A.id': 4, 'A.v': 'new'}])
+
+
+    def test_compaction_interrupted_between_renames_is_finished_on_open(self) -> None:
+        self.database.update_record('A', {'A.v': 'new'}, self.conditions('A.id > 16'))
+        replace = os.replace
+        calls = []
+
+        def crash_after_first_rename(source: str, target: str) -> None:
+            calls.append(target)
+            if len(calls) == 3:
+                raise OSError('crash')
+            replace(source, target)
+
+        with mock.patch('os.replace', side_effect=crash_after_first_rename):
+            with self.assertRaises(OSError):
+                self.database.compact_table('A')
+        self.assertTrue(os.path.exists(os.path.join('databases', 'test', 'A.compact.jsonl')))
+        self.use_database()
+        self.assertFalse(os.path.exists(os.path.join('databases', 'test', 'A.compact.jsonl')))
+        self.assertFalse(os.path.exists(self.engine.current_database.wal_path(self.table_path)))
+        self.assertEqual([record['A.id'] for record in self.query('FROM A WHERE A.v == "new"')], [17, 18, 19])
+        self.assertEqual(len(self.query('FROM A')), 20)
+
+
+    def test_torn_entries_after_the_last_commit_are_dropped(self) -> None:
+        self.database.delete_record('A', self.conditions('A.id == 0'))
+        with open(self.database.wal_path(self.table_path), 'a') as f:
+            f.write('{"txn": 2, "offset": 0, "record": null}\n{"tx')
+        database = self.use_database()
+        self.assertEqual([record['A.id'] for record in database.read_table(self.table_path)], list(range(1, 20)))
+        database.delete_record('A', self.conditions('A.id == 1'))
+        self.assertEqual([record['A.id'] for record in self.use_database().read_table(self.table_path)], list(range(2, 20)))
+
+
+
+if __name__ == '__main__':
+    unittest.main()